@@ -94,6 +94,12 @@
  * @desc If true, writes logs/llm/performance.csv and session_*.json for analysis.
  * @default false
  * 
+ * @param AnalyzerCollectorUrl
+ * @text Analyzer Collector URL
+ * @type string
+ * @desc Optional. Send analyzer logs to a running "python -m llm_analyzer collect" (e.g. http://127.0.0.1:8809) instead of writing files.
+ * @default 
+ * 
  * @param NpcMessageBackground
  * @text NPC Message Background
  * @type select
@@ -290,6 +296,9 @@
     const language = String(params["Language"] || "German").trim();
     const enableAnalyzerLoggingParam = String(params["EnableAnalyzerLogging"] || "false").toLowerCase();
     let analyzerLoggingEnabled = (enableAnalyzerLoggingParam === "true");
+    const analyzerCollectorUrl = String(params["AnalyzerCollectorUrl"] || "").trim().replace(/\/+$/, "");
+    // How long to write log files after the collector could not be reached before trying it again
+    const COLLECTOR_RETRY_MS = 30000;
     // Optional UX parameters
     const enableReplyChoice = String(params["EnableReplyChoice"] || "true").toLowerCase() === "true";
     const replyChoiceLabel = String(params["ReplyChoiceLabel"] || "Antworten…");
@@ -352,9 +361,37 @@
             baseDir: null,
             perfCsv: null,
             perfHeaderWritten: false,
-            session: null // { guid, llmName, startedAtIso, startedAtMs, filePath, interactions: [] }
+            session: null, // { guid, llmName, startedAtIso, startedAtMs, filePath, interactions: [] }
+            // After a failed post, files are written until this time (ms), then the collector is tried again
+            collectorDownUntil: 0
         };
 
+        function collectorAvailable() {
+            return !!analyzerCollectorUrl && typeof fetch === "function" && Date.now() >= state.collectorDownUntil;
+        }
+
+        // Fire-and-forget POST to the analyzer collector. A text body needs no
+        // CORS preflight, and the collector allows any origin, so its status is
+        // readable: on a network error or a status other than 2xx (e.g. 503 when
+        // it is behind) onFailure writes the payload to the log files instead.
+        function postToCollector(route, payload, onFailure) {
+            if (!collectorAvailable()) return false;
+            fetch(analyzerCollectorUrl + route, {
+                method: "POST",
+                headers: { "Content-Type": "text/plain" },
+                body: JSON.stringify(payload)
+            }).then(response => {
+                if (!response.ok) throw new Error("collector answered " + response.status);
+            }).catch(() => {
+                if (Date.now() >= state.collectorDownUntil) {
+                    log("lifecycle", "warn", "[AICharacter] Analyzer collector unreachable or busy, writing log files for the next " + (COLLECTOR_RETRY_MS / 1000) + " s");
+                }
+                state.collectorDownUntil = Date.now() + COLLECTOR_RETRY_MS;
+                if (onFailure) onFailure();
+            });
+            return true;
+        }
+
         function ensureBaseDir() {
             if (!fs || !path) return null;
             if (state.baseDir && safeExists(state.baseDir)) return state.baseDir;
@@ -397,13 +434,15 @@
         function appendPerfRow(llmName, durationMs, whenIso) {
             try {
                 if (!analyzerLoggingEnabled) return;
-                const file = ensurePerfCsv();
-                if (!file) return;
                 const name = String(llmName || "").trim();
                 const ms = Math.max(1, Math.floor(Number(durationMs || 0)));
                 const ts = whenIso || new Date().toISOString();
-                const row = `${name},${ms},${ts}\n`;
-                safeAppend(file, row);
+                const writeRow = () => {
+                    const file = ensurePerfCsv();
+                    if (file) safeAppend(file, `${name},${ms},${ts}\n`);
+                };
+                if (postToCollector("/calls", { llm_name: name, duration_ms: ms, call_timestamp: ts }, writeRow)) return;
+                writeRow();
             } catch (_) { }
         }
 
@@ -419,23 +458,25 @@
                     startedAtIso: now.toISOString(),
                     startedAtMs: now.getTime(),
                     filePath: null,
-                    interactions: []
+                    interactions: [],
+                    // Written to its file instead of the collector (see recordInteraction)
+                    viaFile: !collectorAvailable()
                 };
                 state.session.filePath = path.join(dir, `session_${state.session.guid}.json`);
-                // write initial skeleton
-                persistSession();
+                // write initial skeleton (the collector learns of the session with its first interaction)
+                if (state.session.viaFile) persistSession();
             }
         }
 
-        function persistSession() {
-            if (!state.session || !fs) return;
+        function persistSession(session = state.session) {
+            if (!session || !fs) return;
             const payload = {
-                llm_name: state.session.llmName,
-                session_guid: state.session.guid,
-                started_at: state.session.startedAtIso,
-                interactions: state.session.interactions
+                llm_name: session.llmName,
+                session_guid: session.guid,
+                started_at: session.startedAtIso,
+                interactions: session.interactions
             };
-            try { safeWrite(state.session.filePath, JSON.stringify(payload, null, 2)); } catch (_) { }
+            try { safeWrite(session.filePath, JSON.stringify(payload, null, 2)); } catch (_) { }
         }
 
         function recordInteraction(llmName, situationId, prompt, response) {
@@ -445,14 +486,31 @@
                 if (!state.session) return;
                 const nowMs = Date.now();
                 const t = Math.max(0, nowMs - (state.session.startedAtMs || nowMs));
-                state.session.interactions.push({
+                const item = {
                     t_ms: t,
                     situation_id: String(situationId || "").trim() || "unknown",
                     prompt: String(prompt == null ? "" : prompt),
                     response: String(response == null ? "" : response)
+                };
+                const session = state.session;
+                session.interactions.push(item);
+                // Once a post failed, the session stays with its file: the analyzer imports
+                // the interactions after the last one it has, so gaps must not reach the collector.
+                // The collector is used again from the next session on.
+                const sent = !session.viaFile && postToCollector("/interactions", Object.assign({
+                    session_guid: session.guid,
+                    llm_name: session.llmName,
+                    started_at: session.startedAtIso,
+                    index: session.interactions.length - 1
+                }, item), () => {
+                    session.viaFile = true;
+                    persistSession(session);
                 });
-                // rewrite file on each interaction for simplicity
-                persistSession();
+                // Without a collector, rewrite file on each interaction for simplicity
+                if (!sent) {
+                    session.viaFile = true;
+                    persistSession(session);
+                }
             } catch (_) { }
         }
 
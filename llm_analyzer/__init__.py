@@ -1,3 +1,5 @@
+import importlib
+
 __all__ = [
 	"config",
 	"utils",
@@ -5,3 +7,11 @@ __all__ = [
 	"importers",
 	"gui",
 ]
+
+
+def __getattr__(name):
+	# Submodules are loaded on first access so that importing the package
+	# does not pull in tkinter (via gui) unless the GUI is actually used.
+	if name in __all__:
+		return importlib.import_module(f".{name}", __name__)
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,21 +1,365 @@
+import argparse
+import json
 import logging
+import os
 from pathlib import Path
+from typing import List, Optional
 
-from . import db
-from .config import get_app_paths
-from .gui import AnalyzerApp
+from . import db, logformats, maintenance, matching, reports, tokens, watch
+from .config import get_app_paths, load_config
 
 
-def main() -> None:
-	paths = get_app_paths()
-	# Ensure database exists and schema is initialized
+def _or_default(value, default):
+	"""Option value, or ``default`` when it was not given."""
+	return default if value is None else value
+
+
+def _open_db(paths):
 	conn = db.get_connection(paths["db_path"])  # noqa: SIM115
 	db.initialize_schema(conn)
-	conn.close()
+	return conn
+
+
+def _cmd_gui(args, paths) -> None:
+	# Ensure database exists and schema is initialized
+	_open_db(paths).close()
+
+	# Imported here so tkinter is only loaded when the GUI actually starts
+	from .gui import AnalyzerApp
 
 	app = AnalyzerApp(paths)
 	app.mainloop()
 
 
+def _cmd_compact_text(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		size_before = paths["db_path"].stat().st_size
+		migrated = db.migrate_interaction_text_to_blobs(
+			conn,
+			progress=lambda n: logging.info("Moved %d interactions into the blob store", n),
+		)
+		if args.vacuum:
+			conn.execute("VACUUM")
+		stats = db.fetch_blob_storage_stats(conn)
+	finally:
+		conn.close()
+	stats["migrated_rows"] = migrated
+	stats["db_bytes_before"] = size_before
+	stats["db_bytes_after"] = paths["db_path"].stat().st_size
+	stats["text_saved_bytes"] = stats["logical_bytes"] - stats["stored_bytes"]
+	print(json.dumps(stats, indent=2))
+
+
+def _cmd_backfill(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		# These only touch rows that lack the derived data, so re-running is cheap
+		with db.transaction(conn):
+			for name in ("prompt_sections", "token_counts", "response_actions"):
+				db.schedule_backfill(conn, name)
+		visited = db.run_backfills(conn, progress=logging.info)
+		with db.transaction(conn):
+			linked = db.link_interactions_to_calls(conn, tolerance_ms=args.tolerance_ms)
+		clustered = db.cluster_responses(
+			conn,
+			progress=lambda n: logging.info("Clustered %d responses", n),
+		)
+	finally:
+		conn.close()
+	print(json.dumps({
+		"backfills": visited,
+		"llm_call_links": linked,
+		"response_clusters": clustered,
+	}, indent=2))
+
+
+def _cmd_cluster(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		if args.rebuild:
+			db.rebuild_response_clusters(conn, prompt_context=args.prompt_context)
+		clustered = db.cluster_responses(
+			conn,
+			progress=lambda n: logging.info("Clustered %d responses", n),
+		)
+		clusters = conn.execute("SELECT COUNT(*) FROM response_clusters").fetchone()[0]
+	finally:
+		conn.close()
+	print(json.dumps({"clustered": clustered, "clusters": clusters}, indent=2))
+
+
+def _cmd_replay_server(args, paths) -> None:
+	# Imported here so asyncio is only loaded for the servers
+	from . import replay
+
+	conn = _open_db(paths)
+	try:
+		index = replay.ReplayIndex.load(conn, seed=args.seed)
+	finally:
+		conn.close()
+	replay.serve(index, _or_default(args.host, replay.DEFAULT_HOST), _or_default(args.port, replay.DEFAULT_PORT), args.latency_scale)
+
+
+def _cmd_loadtest(args, paths) -> None:
+	# Imported here so asyncio and ssl are only loaded for load tests
+	import asyncio
+
+	from . import loadtest
+
+	conn = _open_db(paths)
+	try:
+		result = asyncio.run(loadtest.run(
+			conn,
+			args.url,
+			args.model,
+			provider=args.provider,
+			api_key=args.api_key or os.environ.get("LLM_API_KEY"),
+			requests=args.requests,
+			concurrency=args.concurrency,
+			rate=args.rate,
+			label=args.label,
+			timeout_s=_or_default(args.timeout, loadtest.DEFAULT_TIMEOUT_S),
+			seed=args.seed,
+		))
+	finally:
+		conn.close()
+	print(json.dumps(result, indent=2))
+
+
+def _cmd_collect(args, paths) -> None:
+	# Imported here so asyncio is only loaded for the servers
+	from . import collector
+
+	_open_db(paths).close()
+	collector.serve(paths["db_path"], _or_default(args.host, collector.DEFAULT_HOST), _or_default(args.port, collector.DEFAULT_PORT), args.unix)
+
+
+def _cmd_watch(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		watch.watch(conn, args.directory, interval_s=args.interval)
+	finally:
+		conn.close()
+
+
+def _cmd_report_prompts(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		report = reports.prompt_attribution(conn)
+	finally:
+		conn.close()
+	print(json.dumps(report, indent=2))
+
+
+def _cmd_report_cache(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		report = reports.prefix_cache_simulation(conn)
+	finally:
+		conn.close()
+	print(json.dumps(report, indent=2))
+
+
+def _cmd_report_actions(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		report = reports.action_summary(conn)
+	finally:
+		conn.close()
+	print(json.dumps(report, indent=2))
+
+
+def _cmd_compare(args, paths) -> None:
+	# Imported here so NumPy is only loaded for this command
+	from . import compare
+
+	conn = _open_db(paths)
+	try:
+		report = compare.compare_llms(
+			conn, args.llm_a, args.llm_b, args.situation,
+			resamples=_or_default(args.resamples, compare.DEFAULT_RESAMPLES),
+			confidence=_or_default(args.confidence, compare.DEFAULT_CONFIDENCE),
+			seed=args.seed,
+		)
+	except (RuntimeError, ValueError) as e:
+		raise SystemExit(str(e))
+	finally:
+		conn.close()
+	print(json.dumps(report, indent=2))
+
+
+def _cmd_report_concurrency(args, paths) -> None:
+	# Imported here so NumPy is only loaded for this command
+	from . import concurrency
+
+	conn = _open_db(paths)
+	try:
+		report = concurrency.analyze(conn, args.llm, bucket_s=_or_default(args.bucket_s, concurrency.DEFAULT_BUCKET_S))
+	except (RuntimeError, ValueError) as e:
+		raise SystemExit(str(e))
+	finally:
+		conn.close()
+	if args.no_timeline and report["overall"] is not None:
+		del report["overall"]["timeline"]
+	print(json.dumps(report, indent=2))
+
+
+def _cmd_report_storage(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		report = maintenance.size_report(conn, columns=not args.no_columns)
+	finally:
+		conn.close()
+	print(json.dumps(report, indent=2))
+
+
+def _cmd_prune(args, paths) -> None:
+	policy = maintenance.RetentionPolicy.from_config(load_config(paths))
+	if args.raw_line_days is not None:
+		policy.raw_line_days = args.raw_line_days
+	if args.archive_days is not None:
+		policy.archive_days = args.archive_days
+	if args.archive_dir is not None:
+		policy.archive_dir = args.archive_dir
+	policy.archive_dir = policy.archive_dir or paths["app_dir"] / maintenance.ARCHIVE_DIR_NAME
+	conn = _open_db(paths)
+	try:
+		result = maintenance.apply_retention(conn, policy, vacuum=args.vacuum, progress=logging.info)
+	finally:
+		conn.close()
+	print(json.dumps(result, indent=2))
+
+
+def _cmd_imports(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		batches = [dict(r) for r in db.fetch_import_batches(conn)]
+	finally:
+		conn.close()
+	print(json.dumps(batches, indent=2))
+
+
+def _cmd_rollback(args, paths) -> None:
+	conn = _open_db(paths)
+	try:
+		if conn.execute("SELECT 1 FROM import_batches WHERE id = ?", (args.batch_id,)).fetchone() is None:
+			raise SystemExit(f"No import {args.batch_id}; `imports` lists them")
+		result = maintenance.rollback_import(conn, args.batch_id, progress=logging.info)
+	finally:
+		conn.close()
+	print(json.dumps(result, indent=2))
+
+
+def _cmd_merge(args, paths) -> None:
+	conn = _open_db(paths)
+	results = []
+	try:
+		for source in args.databases:
+			logging.info("Merging %s", source)
+			try:
+				results.append(dict(db.merge_database(conn, source, progress=logging.info), source=str(source)))
+			except (FileNotFoundError, ValueError) as e:
+				# Files merged before this one stay merged
+				raise SystemExit(f"Cannot merge {source}: {e}")
+		clustered = db.cluster_responses(
+			conn,
+			progress=lambda n: logging.info("Clustered %d responses", n),
+		)
+	finally:
+		conn.close()
+	print(json.dumps({"merged": results, "response_clusters": clustered}, indent=2))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(prog="python -m llm_analyzer", description="LLM Analyzer")
+	sub = parser.add_subparsers(dest="command")
+	sub.add_parser("gui", help="start the analyzer window (default)")
+	p = sub.add_parser("compact-text", help="move prompt/response text into the compressed blob store and report the space saved")
+	p.add_argument("--vacuum", action="store_true", help="VACUUM afterwards so the file actually shrinks")
+	p = sub.add_parser("backfill", help="compute derived data (prompt sections, perf log links, search index, ...) for interactions imported by older versions")
+	p.add_argument("--tolerance-ms", type=int, default=matching.DEFAULT_TOLERANCE_MS, help="max time between an interaction and its perf log row")
+	p = sub.add_parser("cluster", help="group near-duplicate responses for the Review tab")
+	p.add_argument("--rebuild", action="store_true", help="drop all groups and cluster every response again")
+	p.add_argument("--prompt-context", action="store_true", help="with --rebuild: only group responses to similar events (last history entry)")
+	p = sub.add_parser("replay-server", help="serve recorded responses as an OpenAI/Anthropic-compatible LLM endpoint")
+	p.add_argument("--host", help="default 127.0.0.1")
+	p.add_argument("--port", type=int, help="default 8808")
+	p.add_argument("--latency-scale", type=float, default=1.0, help="multiply recorded call durations (0 answers immediately)")
+	p.add_argument("--seed", type=int, help="make response and latency choices repeatable")
+	p = sub.add_parser("loadtest", help="replay recorded prompts against an LLM endpoint and record the calls in the performance data")
+	p.add_argument("--url", required=True, help="chat completions or messages endpoint")
+	p.add_argument("--model", required=True)
+	p.add_argument("--provider", choices=("openai", "anthropic"), default="openai", help="request shape")
+	p.add_argument("--api-key", help="defaults to the LLM_API_KEY environment variable")
+	p.add_argument("--requests", type=int, default=100)
+	p.add_argument("--concurrency", type=int, default=8, help="requests in flight (with --rate: max open connections)")
+	p.add_argument("--rate", type=float, help="open loop: Poisson arrivals per second instead of fixed concurrency")
+	p.add_argument("--label", help="LLM name the calls are recorded under (default loadtest:<model>)")
+	p.add_argument("--timeout", type=float, help="seconds per request (default 60)")
+	p.add_argument("--seed", type=int)
+	p = sub.add_parser("collect", help="receive calls and interactions from the plugin over HTTP and store them directly")
+	p.add_argument("--host", help="default 127.0.0.1")
+	p.add_argument("--port", type=int, help="default 8809")
+	p.add_argument("--unix", type=Path, help="listen on this Unix socket instead of TCP")
+	p = sub.add_parser("watch", help="import new performance rows and session interactions from the game's log folder as they are written")
+	p.add_argument("directory", type=Path, help="the game's logs/llm folder")
+	p.add_argument("--interval", type=float, default=watch.POLL_INTERVAL_S, help="seconds between polls")
+	sub.add_parser("report-prompts", help="prompt bytes and tokens per section, per LLM and NPC, against call duration")
+	sub.add_parser("report-cache", help="simulate provider prompt-prefix caching under the current and alternative section orders")
+	sub.add_parser("report-actions", help="action types, goal outcomes and invalid-JSON rates per LLM and NPC")
+	p = sub.add_parser("compare", help="P50/P90 latency and OK score of two LLMs with bootstrap confidence intervals of the differences")
+	p.add_argument("llm_a")
+	p.add_argument("llm_b")
+	p.add_argument("--situation", help="only this NPC (situation_id)")
+	p.add_argument("--resamples", type=int, help="bootstrap resamples (default 10000)")
+	p.add_argument("--confidence", type=float, help="confidence level of the intervals (default 0.95)")
+	p.add_argument("--seed", type=int, help="make the intervals repeatable")
+	p = sub.add_parser("report-concurrency", help="calls in flight over time, peak calls per minute and latency by calls in flight, per LLM")
+	p.add_argument("--llm", help="only LLMs whose name contains this")
+	p.add_argument("--bucket-s", type=int, help="seconds per timeline entry (default 60)")
+	p.add_argument("--no-timeline", action="store_true", help="leave out the timeline, which has an entry per active bucket")
+	p = sub.add_parser("report-storage", help="file, table, index and column sizes of the database")
+	p.add_argument("--no-columns", action="store_true", help="skip the per-column sizes, which read every row")
+	sub.add_parser("imports", help="list imports with their row counts, duration and throughput")
+	p = sub.add_parser("rollback", help="delete everything one import added")
+	p.add_argument("batch_id", help="id from `imports`")
+	p = sub.add_parser("merge", help="copy the sessions, interactions and calls of other analyzer databases (e.g. other testers') into this one")
+	p.add_argument("databases", type=Path, nargs="+", help="llm_analyzer.sqlite files to merge, in order")
+	p = sub.add_parser("prune", help="apply the retention policy from config.json (or the options) and shrink the file")
+	p.add_argument("--raw-line-days", type=int, help="drop the stored log line of calls older than this")
+	p.add_argument("--archive-days", type=int, help="move unrated, uncommented interactions older than this to a compressed NDJSON archive")
+	p.add_argument("--archive-dir", type=Path, help="where archives go (default ~/.llm_analyzer/archive)")
+	p.add_argument("--vacuum", action="store_true", help="rebuild the file once with VACUUM and switch to incremental vacuum for later runs")
+	args = parser.parse_args(argv)
+
+	paths = get_app_paths()
+	cfg = load_config(paths)
+	tokens.configure(cfg.get("tokenizer"))
+	logformats.configure(cfg.get("log_formats"))
+	commands = {
+		None: _cmd_gui,
+		"gui": _cmd_gui,
+		"compact-text": _cmd_compact_text,
+		"backfill": _cmd_backfill,
+		"cluster": _cmd_cluster,
+		"replay-server": _cmd_replay_server,
+		"loadtest": _cmd_loadtest,
+		"watch": _cmd_watch,
+		"collect": _cmd_collect,
+		"report-prompts": _cmd_report_prompts,
+		"report-cache": _cmd_report_cache,
+		"report-actions": _cmd_report_actions,
+		"compare": _cmd_compare,
+		"report-concurrency": _cmd_report_concurrency,
+		"report-storage": _cmd_report_storage,
+		"prune": _cmd_prune,
+		"imports": _cmd_imports,
+		"rollback": _cmd_rollback,
+		"merge": _cmd_merge,
+	}
+	commands[args.command](args, paths)
+
+
 if __name__ == "__main__":
 	main()
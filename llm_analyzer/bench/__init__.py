@@ -0,0 +1 @@
+"""Benchmarks for the analyzer. Run a module with ``python -m llm_analyzer.bench.<name>``."""
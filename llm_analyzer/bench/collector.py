@@ -0,0 +1,154 @@
+"""Collector ingest benchmark.
+
+Runs the collector in a child process on a fresh database and sends it the
+calls and interactions of a synthetic playtest as the plugin does: one
+event per POST, over keep-alive connections. Reports acknowledged events
+per second (what the game sees) and committed events per second (until the
+last one is in the database), plus the commits the writer needed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .. import collector, db, loadtest
+from ..utils import nearest_rank_percentile
+from . import synth
+
+
+def _events(data_dir: Path, summary: Dict[str, object]) -> List[Tuple[str, bytes]]:
+	"""(route, body) of every call and interaction, alternating like in a game."""
+	calls: List[bytes] = []
+	with (data_dir / "performance.csv").open(encoding="utf-8", newline="") as f:
+		for row in csv.DictReader(f):
+			calls.append(json.dumps({"llm_name": row["llm_name"], "duration_ms": int(row["duration_ms"]), "call_timestamp": row["call_timestamp"]}).encode("utf-8"))
+	interactions: List[bytes] = []
+	for name in summary["session_files"]:
+		session = json.loads((data_dir / name).read_text(encoding="utf-8"))
+		for index, item in enumerate(session["interactions"]):
+			event = dict(item, session_guid=session["session_guid"], llm_name=session["llm_name"], started_at=session["started_at"], index=index)
+			interactions.append(json.dumps(event).encode("utf-8"))
+	events: List[Tuple[str, bytes]] = []
+	for i in range(max(len(calls), len(interactions))):
+		if i < len(calls):
+			events.append(("/calls", calls[i]))
+		if i < len(interactions):
+			events.append(("/interactions", interactions[i]))
+	return events
+
+
+def _serve(db_path: str, ready, stop) -> None:
+	"""Child process: collect on an ephemeral port until ``stop`` is set."""
+	c = collector.Collector(Path(db_path), source="collector:bench")
+	c.start()
+
+	async def main() -> None:
+		server = await collector.start_server(c, "127.0.0.1", 0)
+		ready.put(server.sockets[0].getsockname()[1])
+		async with server:
+			while not stop.is_set():
+				await asyncio.sleep(0.05)
+
+	asyncio.run(main())
+	c.stop()
+
+
+async def _send(url: str, events: List[Tuple[str, bytes]], concurrency: int) -> List[float]:
+	pools = {route: loadtest.ConnectionPool(url + route, concurrency) for route in ("/calls", "/interactions")}
+	headers = {"Content-Type": "application/json"}
+	latencies: List[float] = []
+	work = iter(events)
+
+	async def worker() -> None:
+		for route, body in work:
+			t0 = time.perf_counter()
+			status, _ = await pools[route].post(body, headers)
+			if status != 202:
+				raise RuntimeError(f"collector answered {status}")
+			latencies.append((time.perf_counter() - t0) * 1000.0)
+
+	try:
+		await asyncio.gather(*(worker() for _ in range(concurrency)))
+	finally:
+		for pool in pools.values():
+			pool.close()
+	return latencies
+
+
+def _stats(url: str) -> Dict[str, object]:
+	with urllib.request.urlopen(url + "/stats", timeout=10) as r:
+		return json.loads(r.read())
+
+
+def run(work_dir: Path, *, interactions: int, concurrency: int = 8, seed: int = 1) -> Dict[str, object]:
+	work_dir = Path(work_dir)
+	data_dir = work_dir / "input"
+	summary = synth.generate(data_dir, calls=interactions, interactions=interactions, seed=seed)
+	events = _events(data_dir, summary)
+	db_path = work_dir / "collector.sqlite"
+	conn = db.get_connection(db_path)
+	db.initialize_schema(conn)
+	conn.close()
+
+	ctx = multiprocessing.get_context("spawn")
+	ready = ctx.Queue()
+	stop = ctx.Event()
+	child = ctx.Process(target=_serve, args=(str(db_path), ready, stop))
+	child.start()
+	try:
+		url = f"http://127.0.0.1:{ready.get(timeout=60)}"
+		t0 = time.perf_counter()
+		latencies = asyncio.run(_send(url, events, concurrency))
+		acked_s = time.perf_counter() - t0
+		while True:
+			stats = _stats(url)
+			if stats["written_calls"] + stats["written_interactions"] + stats["failed"] + stats["invalid"] >= len(events) or not child.is_alive():
+				break
+			time.sleep(0.01)
+		committed_s = time.perf_counter() - t0
+	finally:
+		stop.set()
+		child.join(60)
+	return {
+		"events": len(events),
+		"calls": stats["written_calls"],
+		"interactions": stats["written_interactions"],
+		"failed": stats["failed"],
+		"concurrency": concurrency,
+		"acked_s": acked_s,
+		"acked_per_s": len(events) / acked_s,
+		"committed_s": committed_s,
+		"committed_per_s": len(events) / committed_s,
+		"commits": stats["commits"],
+		"events_per_commit": len(events) / stats["commits"] if stats["commits"] else None,
+		"ack_p50_ms": nearest_rank_percentile([int(x * 1000) for x in latencies], 0.50) / 1000.0,
+		"ack_p99_ms": nearest_rank_percentile([int(x * 1000) for x in latencies], 0.99) / 1000.0,
+	}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Benchmark the analyzer event collector")
+	parser.add_argument("--interactions", type=int, default=20_000, help="calls and interactions to send (each)")
+	parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--work-dir", type=Path, help="keep generated data and database here instead of a temp dir")
+	args = parser.parse_args(argv)
+	if args.work_dir:
+		args.work_dir.mkdir(parents=True, exist_ok=True)
+		result = run(args.work_dir, interactions=args.interactions, concurrency=args.concurrency, seed=args.seed)
+	else:
+		with tempfile.TemporaryDirectory() as tmp:
+			result = run(Path(tmp), interactions=args.interactions, concurrency=args.concurrency, seed=args.seed)
+	print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,119 @@
+"""Database merge benchmark.
+
+Builds one database per tester from synthetic playtests (all testers share
+the performance log, as when they copied each other's logs), merges them
+into a fresh database, then merges the first one again, which finds
+nothing new. Reports rows copied per second and how long the repeat took,
+which is the cost of the duplicate checks alone.
+
+Some calls have no timestamp, as when a log line lacked one, and share
+their durations; every distinct log line must still end up merged.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .. import db, importers
+from . import synth
+
+UNTIMED_CALLS = 200
+
+
+def _write_untimed_log(path: Path) -> Path:
+	"""Performance log whose rows have no timestamp and only a few durations."""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	models = list(synth.MODELS)
+	with path.open("w", encoding="utf-8", newline="") as f:
+		f.write("llm_name,duration_ms,call_timestamp\n")
+		for i in range(UNTIMED_CALLS):
+			f.write(f"{models[i % len(models)]},{1000 * (1 + i % 3)},\n")
+	return path
+
+
+def _log_lines(path: Path) -> Set[Tuple[str, int]]:
+	conn = db.get_connection(path)
+	try:
+		return {(r[0], r[1]) for r in conn.execute("SELECT source_file, source_line_no FROM llm_calls")}
+	finally:
+		conn.close()
+
+
+def _tester_db(work_dir: Path, index: int, calls: int, interactions: int) -> Path:
+	data_dir = work_dir / f"tester{index}"
+	summary = synth.generate(data_dir, calls=calls, interactions=interactions, seed=index + 1)
+	path = work_dir / f"tester{index}.sqlite"
+	conn = db.get_connection(path)
+	try:
+		db.initialize_schema(conn)
+		importers.import_performance_log_file(conn, work_dir / "shared" / "performance.csv", store_raw_line=False)
+		importers.import_performance_log_file(conn, data_dir / "performance.csv", store_raw_line=False)
+		importers.import_performance_log_file(conn, work_dir / "shared" / "untimed.csv", store_raw_line=False)
+		importers.import_performance_log_file(conn, _write_untimed_log(data_dir / "untimed.csv"), store_raw_line=False)
+		for name in summary["session_files"]:
+			importers.import_session_json_file(conn, data_dir / name)
+	finally:
+		conn.close()
+	return path
+
+
+def run(work_dir: Path, *, testers: int, calls: int, interactions: int) -> Dict[str, object]:
+	work_dir = Path(work_dir)
+	synth.generate(work_dir / "shared", calls=calls, interactions=0, seed=0)
+	_write_untimed_log(work_dir / "shared" / "untimed.csv")
+	sources = [_tester_db(work_dir, i, calls, interactions) for i in range(testers)]
+	# Each log line is one call, whichever testers imported it
+	expected_calls = len(set().union(*(_log_lines(source) for source in sources)))
+	conn = db.get_connection(work_dir / "merged.sqlite")
+	try:
+		db.initialize_schema(conn)
+		merges: List[Dict[str, object]] = []
+		t0 = time.perf_counter()
+		for source in sources:
+			t = time.perf_counter()
+			result = db.merge_database(conn, source)
+			seconds = time.perf_counter() - t
+			rows = result["calls"] + result["sessions"] + result["interactions"]
+			merges.append(dict(result, seconds=seconds, rows_per_s=rows / seconds))
+		total_s = time.perf_counter() - t0
+		t = time.perf_counter()
+		repeat = db.merge_database(conn, sources[0])
+		repeat_s = time.perf_counter() - t
+		merged_calls = conn.execute("SELECT COUNT(*) FROM llm_calls").fetchone()[0]
+		if merged_calls != expected_calls:
+			raise RuntimeError(f"Merged {merged_calls} calls, expected {expected_calls}")
+		return {
+			"testers": testers,
+			"merges": merges,
+			"total_s": total_s,
+			"rows": sum(m["calls"] + m["sessions"] + m["interactions"] for m in merges),
+			"calls": merged_calls,
+			"repeat_s": repeat_s,
+			"repeat_rows": repeat["calls"] + repeat["sessions"] + repeat["interactions"],
+		}
+	finally:
+		conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Benchmark merging analyzer databases")
+	parser.add_argument("--testers", type=int, default=4, help="databases to merge")
+	parser.add_argument("--calls", type=int, default=250_000, help="calls per tester, plus as many shared by all")
+	parser.add_argument("--interactions", type=int, default=5_000, help="interactions per tester")
+	parser.add_argument("--work-dir", type=Path, help="keep generated data and databases here instead of a temp dir")
+	args = parser.parse_args(argv)
+	if args.work_dir:
+		args.work_dir.mkdir(parents=True, exist_ok=True)
+		result = run(args.work_dir, testers=args.testers, calls=args.calls, interactions=args.interactions)
+	else:
+		with tempfile.TemporaryDirectory() as tmp:
+			result = run(Path(tmp), testers=args.testers, calls=args.calls, interactions=args.interactions)
+	print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,103 @@
+"""Import rollback benchmark.
+
+Imports a synthetic performance log and playtest into a fresh database,
+then rolls back the performance log import (and one session import) while
+another connection keeps reading, as the GUI does. Reports rows deleted
+per second and how long the reader had to wait at most, which is what
+decides whether the window freezes.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .. import db, importers
+from ..utils import nearest_rank_percentile
+from . import synth
+
+
+def _probe(db_path: Path, stop: threading.Event, waits_us: List[int]) -> None:
+	"""Read a little every 10 ms and record how long each read took."""
+	conn = db.get_connection(db_path)
+	try:
+		while not stop.is_set():
+			t0 = time.perf_counter()
+			conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+			waits_us.append(int((time.perf_counter() - t0) * 1_000_000))
+			stop.wait(0.01)
+	finally:
+		conn.close()
+
+
+def _timed_rollback(db_path: Path, conn: sqlite3.Connection, batch_id: str) -> Dict[str, object]:
+	waits_us: List[int] = []
+	stop = threading.Event()
+	probe = threading.Thread(target=_probe, args=(db_path, stop, waits_us), daemon=True)
+	probe.start()
+	t0 = time.perf_counter()
+	try:
+		result = db.rollback_import_batch(conn, batch_id)
+	finally:
+		seconds = time.perf_counter() - t0
+		stop.set()
+		probe.join()
+	rows = result["calls"] + result["interactions"]
+	return dict(
+		result,
+		seconds=seconds,
+		rows_per_s=rows / seconds if seconds > 0 else None,
+		reads=len(waits_us),
+		read_p99_ms=nearest_rank_percentile(waits_us, 0.99) / 1000.0 if waits_us else None,
+		read_max_ms=max(waits_us) / 1000.0 if waits_us else None,
+	)
+
+
+def run(work_dir: Path, *, calls: int, interactions: int, seed: int = 1) -> Dict[str, object]:
+	work_dir = Path(work_dir)
+	data_dir = work_dir / "input"
+	summary = synth.generate(data_dir, calls=calls, interactions=interactions, seed=seed)
+	db_path = work_dir / "rollback.sqlite"
+	conn = db.get_connection(db_path)
+	try:
+		db.initialize_schema(conn)
+		t0 = time.perf_counter()
+		perf = importers.import_performance_log_file(conn, data_dir / "performance.csv", store_raw_line=False)
+		import_s = time.perf_counter() - t0
+		session_batches = []
+		for name in summary["session_files"]:
+			importers.import_session_json_file(conn, data_dir / name)
+			session_batches.append(db.fetch_import_batches(conn)[0]["id"])
+		return {
+			"calls": perf["inserted"],
+			"call_import_s": import_s,
+			"performance_log": _timed_rollback(db_path, conn, perf["import_batch_id"]),
+			"session": _timed_rollback(db_path, conn, session_batches[0]) if session_batches else None,
+		}
+	finally:
+		conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Benchmark rolling back an import")
+	parser.add_argument("--calls", type=int, default=1_000_000, help="rows in the performance log import")
+	parser.add_argument("--interactions", type=int, default=5_000)
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--work-dir", type=Path, help="keep generated data and database here instead of a temp dir")
+	args = parser.parse_args(argv)
+	if args.work_dir:
+		args.work_dir.mkdir(parents=True, exist_ok=True)
+		result = run(args.work_dir, calls=args.calls, interactions=args.interactions, seed=args.seed)
+	else:
+		with tempfile.TemporaryDirectory() as tmp:
+			result = run(Path(tmp), calls=args.calls, interactions=args.interactions, seed=args.seed)
+	print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+	main()
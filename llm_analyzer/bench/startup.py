@@ -0,0 +1,139 @@
+"""Startup-time benchmark.
+
+Measures, each in a fresh interpreter so module caches do not leak between
+runs:
+
+* import time of the core modules (config, utils, db, importers) and whether
+  importing them pulls in tkinter,
+* time to open the database and run ``initialize_schema`` on a cold (new) and
+  a warm (already initialized) database,
+* time to first window: building ``AnalyzerApp`` and processing its first
+  round of idle tasks, cold and warm. Skipped when no display is available.
+
+Results are printed as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CORE_MODULES = ("llm_analyzer.config", "llm_analyzer.utils", "llm_analyzer.db", "llm_analyzer.importers")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+	__import__(name)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"import_s": elapsed, "tkinter_loaded": "tkinter" in sys.modules}}))
+"""
+
+_SCHEMA_SCRIPT = """
+import json, time
+from pathlib import Path
+from llm_analyzer import db
+t0 = time.perf_counter()
+conn = db.get_connection(Path({db_path!r}))
+db.initialize_schema(conn)
+conn.close()
+print(json.dumps({{"schema_s": time.perf_counter() - t0}}))
+"""
+
+_WINDOW_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from pathlib import Path
+from llm_analyzer import db
+app_dir = Path({app_dir!r})
+paths = {{
+	"app_dir": app_dir,
+	"db_path": app_dir / "llm_analyzer.sqlite",
+	"log_path": app_dir / "app.log",
+	"config_path": app_dir / "config.json",
+}}
+conn = db.get_connection(paths["db_path"])
+db.initialize_schema(conn)
+conn.close()
+try:
+	from llm_analyzer.gui import AnalyzerApp
+	app = AnalyzerApp(paths)
+except Exception as e:
+	print(json.dumps({{"error": str(e)}}))
+	raise SystemExit(0)
+app.update_idletasks()
+first_window = time.perf_counter() - t0
+app.update()
+first_idle = time.perf_counter() - t0
+app.on_close()
+print(json.dumps({{"first_window_s": first_window, "first_idle_s": first_idle}}))
+"""
+
+
+def _run(script: str, cwd: Path) -> Dict[str, object]:
+	out = subprocess.run(
+		[sys.executable, "-c", script],
+		cwd=str(cwd),
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+	return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _median(values: List[float]) -> Optional[float]:
+	if not values:
+		return None
+	data = sorted(values)
+	return data[len(data) // 2]
+
+
+def run_startup_benchmark(repeat: int = 5, include_gui: bool = True) -> Dict[str, object]:
+	pkg_root = Path(__file__).resolve().parents[2]
+	results: Dict[str, object] = {"repeat": repeat}
+
+	imports = [_run(_IMPORT_SCRIPT.format(modules=CORE_MODULES), pkg_root) for _ in range(repeat)]
+	results["core_import_s"] = _median([float(r["import_s"]) for r in imports])
+	results["core_import_loads_tkinter"] = any(bool(r["tkinter_loaded"]) for r in imports)
+
+	cold: List[float] = []
+	warm: List[float] = []
+	for _ in range(repeat):
+		with tempfile.TemporaryDirectory() as tmp:
+			db_path = Path(tmp) / "llm_analyzer.sqlite"
+			cold.append(float(_run(_SCHEMA_SCRIPT.format(db_path=str(db_path)), pkg_root)["schema_s"]))
+			warm.append(float(_run(_SCHEMA_SCRIPT.format(db_path=str(db_path)), pkg_root)["schema_s"]))
+	results["schema_cold_s"] = _median(cold)
+	results["schema_warm_s"] = _median(warm)
+
+	if include_gui:
+		cold_win: List[float] = []
+		warm_win: List[float] = []
+		for _ in range(repeat):
+			with tempfile.TemporaryDirectory() as tmp:
+				first = _run(_WINDOW_SCRIPT.format(app_dir=tmp), pkg_root)
+				if "error" in first:
+					results["gui_skipped"] = first["error"]
+					break
+				second = _run(_WINDOW_SCRIPT.format(app_dir=tmp), pkg_root)
+				cold_win.append(float(first["first_window_s"]))
+				warm_win.append(float(second["first_window_s"]))
+		results["first_window_cold_s"] = _median(cold_win)
+		results["first_window_warm_s"] = _median(warm_win)
+	return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Measure analyzer startup time")
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--no-gui", action="store_true", help="Skip the time-to-first-window measurement")
+	args = parser.parse_args(argv)
+	print(json.dumps(run_startup_benchmark(args.repeat, include_gui=not args.no_gui), indent=2))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,233 @@
+"""End-to-end analyzer benchmark on synthetic data.
+
+Generates input with :mod:`llm_analyzer.bench.synth`, imports it into a fresh
+database and times every ``importers`` function, every ``db.fetch_*`` query
+and the query side of each GUI tab refresh (no display needed). Results are
+written as JSON so runs of different versions can be compared.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import inspect
+import json
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .. import db, importers, maintenance
+from . import synth
+
+
+def _count(result: object) -> Optional[int]:
+	if isinstance(result, tuple):
+		# fetch_review-style (okay, not_okay, rows) or (llms, situations)
+		return sum(len(r) for r in result if isinstance(r, (list, dict)))
+	if isinstance(result, (list, dict)):
+		return len(result)
+	return None
+
+
+def _time_case(name: str, fn: Callable[[], object], repeat: int, conn: Optional[sqlite3.Connection] = None) -> Dict[str, object]:
+	"""Median of ``repeat`` runs; with ``conn``, each run starts with an empty query cache."""
+	times: List[float] = []
+	result: object = None
+	cache = getattr(conn, "query_cache", None)
+	for _ in range(repeat):
+		if cache is not None:
+			cache.clear()
+		t0 = time.perf_counter()
+		result = fn()
+		times.append(time.perf_counter() - t0)
+	return {
+		"name": name,
+		"seconds": statistics.median(times),
+		"min_seconds": min(times),
+		"repeat": repeat,
+		"rows": _count(result),
+	}
+
+
+def _fetch_cases(conn: sqlite3.Connection) -> Dict[str, Callable[[], object]]:
+	biggest = conn.execute(
+		"SELECT session_id FROM interactions GROUP BY session_id ORDER BY COUNT(*) DESC LIMIT 1"
+	).fetchone()
+	some_llm = conn.execute("SELECT llm_name FROM interactions LIMIT 1").fetchone()
+	some_sit = conn.execute("SELECT situation_id FROM interactions LIMIT 1").fetchone()
+	session_id = int(biggest[0]) if biggest else 0
+	llm = some_llm[0] if some_llm else None
+	sit = some_sit[0] if some_sit else None
+
+	explicit: Dict[str, Callable[[], object]] = {
+		"db.fetch_interactions_for_session": lambda: db.fetch_interactions_for_session(conn, session_id),
+		"db.fetch_review": lambda: db.fetch_review(conn, None, None, None),
+		"db.fetch_review[llm+situation]": lambda: db.fetch_review(conn, llm, sit, None),
+		"db.fetch_review[search]": lambda: db.fetch_review(conn, None, None, None, search="sword", limit=500),
+		"db.fetch_duration_counts": lambda: db.fetch_duration_counts(conn, llm),
+		"db.fetch_duration_counts[situation]": lambda: db.fetch_duration_counts(conn, llm, sit),
+		"db.fetch_rating_counts": lambda: db.fetch_rating_counts(conn, llm, sit),
+	}
+	cases: Dict[str, Callable[[], object]] = {}
+	for name, fn in sorted(vars(db).items()):
+		if not name.startswith("fetch_") or not callable(fn):
+			continue
+		key = f"db.{name}"
+		if any(k == key or k.startswith(key + "[") for k in explicit):
+			continue
+		params = list(inspect.signature(fn).parameters.values())[1:]
+		if all(p.default is not inspect.Parameter.empty for p in params):
+			cases[key] = (lambda f=fn: f(conn))
+	cases.update(explicit)
+	return dict(sorted(cases.items()))
+
+
+def _gui_cases(conn: sqlite3.Connection) -> Dict[str, Callable[[], object]]:
+	try:
+		from .. import gui
+	except ImportError:
+		return {}
+	return {
+		"gui.PerformanceTab.refresh": lambda: gui.build_performance_rows(conn),
+		"gui.SessionTab.refresh_sessions": lambda: gui.build_session_rows(conn),
+		"gui.ReviewTab.refresh": lambda: gui.build_review_rows(conn, None, None, None),
+		"gui.ReviewTab.refresh[search]": lambda: gui.build_review_rows(conn, None, None, None, "sword"),
+		"gui.ReviewTab.refresh[grouped]": lambda: gui.build_review_rows(conn, None, None, None, None, True),
+		"gui.PromptSizeTab.refresh": lambda: gui.build_prompt_size_rows(conn),
+		"gui.PromptCacheTab.refresh": lambda: gui.build_prompt_cache_rows(conn)[1],
+		"gui.ActionsTab.refresh": lambda: gui.build_action_rows(conn),
+		"gui.ImportsTab.refresh": lambda: gui.build_import_rows(conn),
+		"gui.StorageTab.refresh": lambda: gui.build_storage_rows(maintenance.size_report(conn)),
+	}
+
+
+def run_suite(
+	work_dir: Path,
+	*,
+	calls: int,
+	interactions: int,
+	interactions_per_session: int = 500,
+	repeat: int = 3,
+	seed: int = 1,
+	label: str = "",
+) -> Dict[str, object]:
+	work_dir = Path(work_dir)
+	data_dir = work_dir / "input"
+	results: List[Dict[str, object]] = []
+
+	t0 = time.perf_counter()
+	summary = synth.generate(
+		data_dir,
+		calls=calls,
+		interactions=interactions,
+		interactions_per_session=interactions_per_session,
+		perf_formats=("csv", "jsonl"),
+		seed=seed,
+	)
+	results.append({"name": "synth.generate", "seconds": time.perf_counter() - t0, "rows": calls + summary["interactions"]})
+
+	conn = db.get_connection(work_dir / "bench.sqlite")
+	try:
+		t0 = time.perf_counter()
+		db.initialize_schema(conn)
+		results.append({"name": "db.initialize_schema", "seconds": time.perf_counter() - t0, "rows": None})
+
+		for fmt in ("csv", "jsonl"):
+			path = data_dir / f"performance.{fmt}"
+			t0 = time.perf_counter()
+			res = importers.import_performance_log_file(conn, path, format_hint=f".{fmt}")
+			elapsed = time.perf_counter() - t0
+			results.append({
+				"name": f"importers.import_performance_log_file[{fmt}]",
+				"seconds": elapsed,
+				"rows": res["inserted"],
+				"rows_per_s": res["inserted"] / elapsed if elapsed else None,
+				"bytes": path.stat().st_size,
+			})
+
+		t0 = time.perf_counter()
+		inserted = 0
+		total_bytes = 0
+		for name in summary["session_files"]:
+			path = data_dir / name
+			total_bytes += path.stat().st_size
+			inserted += importers.import_session_json_file(conn, path)["inserted_interactions"]
+		elapsed = time.perf_counter() - t0
+		results.append({
+			"name": "importers.import_session_json_file",
+			"seconds": elapsed,
+			"rows": inserted,
+			"rows_per_s": inserted / elapsed if elapsed else None,
+			"files": len(summary["session_files"]),
+			"bytes": total_bytes,
+		})
+
+		for name, fn in _fetch_cases(conn).items():
+			results.append(_time_case(name, fn, repeat, conn))
+		for name, fn in _gui_cases(conn).items():
+			results.append(_time_case(name, fn, repeat, conn))
+		# Revisiting a tab with unchanged data is served by the query cache
+		for name, fn in _gui_cases(conn).items():
+			fn()
+			results.append(_time_case(name + "[cached]", fn, repeat))
+	finally:
+		conn.close()
+
+	return {
+		"label": label,
+		"created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+		"python": platform.python_version(),
+		"sqlite": sqlite3.sqlite_version,
+		"platform": platform.platform(),
+		"params": {
+			"calls": calls,
+			"interactions": summary["interactions"],
+			"sessions": summary["sessions"],
+			"avg_prompt_bytes": summary["avg_prompt_bytes"],
+			"repeat": repeat,
+			"seed": seed,
+		},
+		"results": results,
+	}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Benchmark analyzer import, queries and tab refreshes on synthetic data")
+	parser.add_argument("--calls", type=int, default=100_000, help="perf rows to generate (up to 10M)")
+	parser.add_argument("--interactions", type=int, default=10_000, help="interactions to generate (up to 1M)")
+	parser.add_argument("--per-session", type=int, default=500)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--label", default="", help="free-form tag stored with the results, e.g. a version")
+	parser.add_argument("--work-dir", type=Path, help="keep generated data and database here instead of a temp dir")
+	parser.add_argument("--out", type=Path, help="write results JSON to this file")
+	args = parser.parse_args(argv)
+
+	def run(work_dir: Path) -> Dict[str, object]:
+		return run_suite(
+			work_dir,
+			calls=args.calls,
+			interactions=args.interactions,
+			interactions_per_session=args.per_session,
+			repeat=args.repeat,
+			seed=args.seed,
+			label=args.label,
+		)
+
+	if args.work_dir:
+		args.work_dir.mkdir(parents=True, exist_ok=True)
+		report = run(args.work_dir)
+	else:
+		with tempfile.TemporaryDirectory() as tmp:
+			report = run(Path(tmp))
+	text = json.dumps(report, indent=2)
+	if args.out:
+		args.out.write_text(text, encoding="utf-8")
+	print(text)
+
+
+if __name__ == "__main__":
+	main()
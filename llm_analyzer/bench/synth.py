@@ -0,0 +1,282 @@
+"""Synthetic analyzer input in the formats written by the AICharacter plugin.
+
+``LLM_ANALYZER.appendPerfRow`` appends ``llm_name,duration_ms,call_timestamp``
+rows to ``performance.csv`` and ``LLM_ANALYZER.persistSession`` writes one
+``session_<guid>.json`` per play session (``JSON.stringify(payload, null, 2)``).
+Prompts follow ``callLlmForAction``/``callLlmForGoal``: optional recent history,
+NPC description, goal and switch policy blocks, then the pretty-printed
+environment JSON.
+
+Output is streamed, so the generator scales to millions of rows with
+bounded memory (one session is held at a time).
+"""
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import math
+import random
+import time
+import uuid
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+MODELS = {
+	# model name -> median latency in ms for a ~4 KB prompt
+	"gpt-4o-mini": 1400,
+	"claude-3-5-haiku-latest": 1700,
+	"deepseek-chat": 2600,
+	"mistral-small-latest": 1200,
+	"qwen2.5-7b-instruct": 900,
+}
+
+NPCS = {
+	"Blacksmith": "A gruff dwarf who forges weapons. He distrusts strangers but loves talking about steel.",
+	"Innkeeper": "A cheerful woman who runs the Golden Goose inn. She knows every rumour in town.",
+	"Guard": "A bored city guard at the north gate. He follows orders and checks papers.",
+	"Merchant": "A travelling merchant selling potions and trinkets. Always looking for a bargain.",
+	"Priestess": "A calm priestess of the moon temple. She heals the wounded for a small donation.",
+	"Farmer": "An old farmer worried about wolves taking his sheep. Speaks slowly.",
+	"Thief": "A nervous young thief hiding in the alley. Will trade information for coins.",
+	"Bard": "A flamboyant bard who sings about local heroes and asks everyone for stories.",
+}
+
+GOALS = [
+	"Convince the player to bring you three wolf pelts.",
+	"Sell the player a healing potion for at least 20 coins.",
+	"Find out whether the player has seen the missing child.",
+	"Escort the player to the temple.",
+]
+
+SPEECH = [
+	"Hallo, Reisender!",
+	"What brings you to our town?",
+	"I have a fine sword for sale, forged this very morning.",
+	"Leave me be, I am busy.",
+	"The wolves came again last night.",
+	"Bring me three pelts and I will pay you well.",
+	"May the moon guide your steps.",
+]
+
+
+def _iso_from_ms(epoch_ms: int) -> str:
+	# Matches Date.prototype.toISOString(): millisecond precision, 'Z' suffix
+	sec, ms = divmod(int(epoch_ms), 1000)
+	return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)) + f".{ms:03d}Z"
+
+
+def _build_env(rng: random.Random, npc_name: str, npc_id: int, map_id: int, npc_names: List[str]) -> Dict[str, object]:
+	nx, ny = rng.randint(0, 39), rng.randint(0, 29)
+	px, py = nx + rng.randint(-6, 6), ny + rng.randint(-6, 6)
+	pdist = abs(px - nx) + abs(py - ny)
+	others = []
+	for i, other in enumerate(npc_names):
+		if other == npc_name:
+			continue
+		ox, oy = rng.randint(0, 39), rng.randint(0, 29)
+		dist = abs(ox - nx) + abs(oy - ny)
+		others.append({"id": i + 1, "name": other, "x": ox, "y": oy, "distance": dist, "isAdjacent": dist == 1})
+	equipment = [{"id": 0, "name": "$coins$", "qty": rng.randint(0, 200)}]
+	for item_id in range(1, rng.randint(1, 5)):
+		equipment.append({"id": item_id, "name": f"Item {item_id}", "qty": rng.randint(1, 3)})
+	return {
+		"npc": {"id": npc_id, "name": npc_name, "x": nx, "y": ny, "description": "This is you.", "equipment": equipment},
+		"player": {"x": px, "y": py, "distance": pdist, "isAdjacent": pdist == 1},
+		"others": others,
+		"map": {"id": map_id, "width": 40, "height": 30, "displayName": f"Map {map_id}"},
+		"time": 0,
+	}
+
+
+def _build_prompt(
+	history: Deque[str],
+	npc_name: str,
+	env: Dict[str, object],
+	goal: Optional[str],
+	switch_policy: Optional[str],
+) -> str:
+	history_block = ("Recent history (latest last):\n" + "\n".join(history) + "\n\n") if history else ""
+	desc_block = "NPC Description:\n" + NPCS[npc_name] + "\n\n"
+	env_text = json.dumps(env, indent=2, ensure_ascii=False)
+	if goal is None:
+		return history_block + desc_block + "Environment:\n" + env_text + "\nChoose the next action."
+	goal_block = "Goal:\n" + goal + "\n\n"
+	policy_block = ("Switch Policy (allowed and when to use):\n" + switch_policy + "\n\n") if switch_policy else ""
+	return history_block + desc_block + goal_block + policy_block + "Environment:\n" + env_text + "\nReturn only JSON with {action,goal}."
+
+
+def _build_action(rng: random.Random) -> Dict[str, object]:
+	kind = rng.choices(["move", "speak", "give", "wait", "giveCoins"], weights=[30, 35, 5, 25, 5])[0]
+	if kind == "move":
+		return {"type": "move", "targetX": rng.randint(0, 39), "targetY": rng.randint(0, 29)}
+	if kind == "speak":
+		return {"type": "speak", "text": rng.choice(SPEECH)}
+	if kind == "give":
+		return {"type": "give", "itemId": rng.randint(1, 4), "text": "Nimm dies."}
+	if kind == "giveCoins":
+		return {"type": "giveCoins", "coins": rng.randint(1, 20)}
+	return {"type": "wait", "ms": rng.choice([200, 500, 800, 1000])}
+
+
+def _build_response(rng: random.Random, action: Dict[str, object], goal: Optional[str]) -> str:
+	obj: Dict[str, object] = action
+	if goal is not None:
+		status = rng.choices(["continue", "achieved", "failed"], weights=[85, 10, 5])[0]
+		obj = {"action": action, "goal": {"status": status, "why": "Konversation beginnen."}}
+	text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+	roll = rng.random()
+	if roll < 0.03:
+		return "```json\n" + text + "\n```"
+	if roll < 0.05:
+		return "I think the NPC should " + str(action.get("type")) + " now."
+	return text
+
+
+def _history_line(npc_name: str, action: Dict[str, object]) -> str:
+	kind = action.get("type")
+	if kind == "move":
+		return f"{npc_name} moves toward ({action['targetX']},{action['targetY']})"
+	if kind == "speak":
+		return f"{npc_name} says: \"{action['text']}\""
+	if kind == "wait":
+		return f"{npc_name} waits {action['ms']}ms"
+	if kind == "giveCoins":
+		return f"{npc_name} gives player {action['coins']} gold"
+	return f"{npc_name} gives player item {action.get('itemId')}"
+
+
+def _duration_ms(rng: random.Random, model: str, prompt_bytes: int) -> int:
+	base = MODELS[model] * (0.6 + prompt_bytes / 10000.0)
+	return max(1, int(base * math.exp(rng.gauss(0.0, 0.35))))
+
+
+def generate(
+	out_dir: Path,
+	*,
+	calls: int = 100_000,
+	interactions: int = 10_000,
+	interactions_per_session: int = 500,
+	perf_formats: tuple = ("csv",),
+	seed: int = 1,
+	start_epoch_ms: int = 1735689600000,
+) -> Dict[str, object]:
+	"""Write performance logs and session files to ``out_dir``.
+
+	``calls`` perf rows are written; ``interactions`` of them (spread evenly)
+	also get a recorded interaction, as in the plugin where failed calls only
+	produce a perf row.
+	"""
+	out_dir = Path(out_dir)
+	out_dir.mkdir(parents=True, exist_ok=True)
+	rng = random.Random(seed)
+	interactions = min(interactions, calls)
+	model_names = list(MODELS)
+	npc_names = list(NPCS)
+
+	perf_files = {}
+	if "csv" in perf_formats:
+		perf_files["csv"] = (out_dir / "performance.csv").open("w", encoding="utf-8", newline="")
+		perf_files["csv"].write("llm_name,duration_ms,call_timestamp\n")
+	if "jsonl" in perf_formats:
+		perf_files["jsonl"] = (out_dir / "performance.jsonl").open("w", encoding="utf-8", newline="")
+
+	session: Optional[Dict[str, object]] = None
+	session_files: List[str] = []
+	histories: Dict[int, Deque[str]] = {}
+	now_ms = start_epoch_ms
+	session_start_ms = now_ms
+	model = rng.choice(model_names)
+	written_interactions = 0
+	prompt_bytes_total = 0
+
+	def flush_session() -> None:
+		if session is None:
+			return
+		path = out_dir / f"session_{session['session_guid']}.json"
+		path.write_text(json.dumps(session, indent=2, ensure_ascii=False), encoding="utf-8")
+		session_files.append(path.name)
+
+	try:
+		for i in range(calls):
+			now_ms += rng.randint(200, 3000)
+			records = (i + 1) * interactions // calls > i * interactions // calls
+			if records:
+				if session is None or len(session["interactions"]) >= interactions_per_session:
+					flush_session()
+					model = rng.choice(model_names)
+					session = {
+						"llm_name": model.strip().lower(),
+						"session_guid": str(uuid.UUID(int=rng.getrandbits(128))),
+						"started_at": _iso_from_ms(now_ms),
+						"interactions": [],
+					}
+					session_start_ms = now_ms
+				npc_idx = rng.randrange(len(npc_names))
+				npc_name = npc_names[npc_idx]
+				map_id = 1 + npc_idx % 3
+				history = histories.setdefault(map_id, collections.deque(maxlen=100))
+				goal = rng.choice(GOALS) if rng.random() < 0.3 else None
+				policy = "Switch 12 opens the gate once the player has paid." if goal and rng.random() < 0.3 else None
+				env = _build_env(rng, npc_name, npc_idx + 1, map_id, npc_names)
+				env["time"] = now_ms
+				prompt = _build_prompt(history, npc_name, env, goal, policy)
+				action = _build_action(rng)
+				response = _build_response(rng, action, goal)
+				history.append(_history_line(npc_name, action))
+				prompt_bytes = len(prompt.encode("utf-8"))
+				prompt_bytes_total += prompt_bytes
+				duration = _duration_ms(rng, model, prompt_bytes)
+				session["interactions"].append({
+					"t_ms": now_ms - session_start_ms,
+					"situation_id": npc_name,
+					"prompt": prompt,
+					"response": response,
+				})
+				written_interactions += 1
+			else:
+				duration = _duration_ms(rng, model, 4000)
+			ts = _iso_from_ms(now_ms)
+			if "csv" in perf_files:
+				perf_files["csv"].write(f"{model},{duration},{ts}\n")
+			if "jsonl" in perf_files:
+				perf_files["jsonl"].write(json.dumps({"llm_name": model, "duration_ms": duration, "call_timestamp": ts}) + "\n")
+		flush_session()
+	finally:
+		for f in perf_files.values():
+			f.close()
+
+	return {
+		"calls": calls,
+		"interactions": written_interactions,
+		"sessions": len(session_files),
+		"avg_prompt_bytes": (prompt_bytes_total / written_interactions) if written_interactions else 0,
+		"perf_files": sorted(f"performance.{k}" for k in perf_files),
+		"session_files": session_files,
+	}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Generate synthetic analyzer input files")
+	parser.add_argument("out_dir", type=Path)
+	parser.add_argument("--calls", type=int, default=100_000)
+	parser.add_argument("--interactions", type=int, default=10_000)
+	parser.add_argument("--per-session", type=int, default=500)
+	parser.add_argument("--perf-format", choices=["csv", "jsonl", "both"], default="csv")
+	parser.add_argument("--seed", type=int, default=1)
+	args = parser.parse_args(argv)
+	formats = ("csv", "jsonl") if args.perf_format == "both" else (args.perf_format,)
+	summary = generate(
+		args.out_dir,
+		calls=args.calls,
+		interactions=args.interactions,
+		interactions_per_session=args.per_session,
+		perf_formats=formats,
+		seed=args.seed,
+	)
+	summary.pop("session_files")
+	print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import zlib
+from typing import Optional, Tuple
+
+try:
+	import zstandard
+except ImportError:  # optional; zlib is always available
+	zstandard = None
+
+# Texts shorter than this are stored uncompressed; compressing them would
+# not pay for the codec overhead.
+MIN_COMPRESS_BYTES = 64
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+# Preset dictionaries are cut to this size; zlib's window is 32 KB and the
+# dictionary and the text being compressed have to share it.
+MAX_DICT_BYTES = 16 * 1024
+
+_zstd_compressor = None
+_zstd_decompressor = None
+# dictionary bytes -> (compressor, decompressor); digesting a dictionary is
+# far more expensive than compressing one prompt with it
+_zstd_dict_codecs: dict = {}
+
+
+def default_codec() -> str:
+	return "zstd" if zstandard is not None else "zlib"
+
+
+def text_hash(data: bytes) -> bytes:
+	"""Content address of an encoded text (16-byte truncated SHA-256)."""
+	return hashlib.sha256(data).digest()[:16]
+
+
+def make_dictionary(sample: str) -> bytes:
+	"""Preset dictionary built from a representative text.
+
+	Prompts for the same NPC share most of their structure (description,
+	environment keys, history lines), so compressing against an earlier
+	prompt of that NPC is far more effective than compressing each alone.
+	"""
+	return sample.encode("utf-8")[:MAX_DICT_BYTES]
+
+
+def _zstd_dict_codec(zdict: bytes):
+	codecs = _zstd_dict_codecs.get(zdict)
+	if codecs is None:
+		if len(_zstd_dict_codecs) > 256:
+			_zstd_dict_codecs.clear()
+		d = zstandard.ZstdCompressionDict(zdict, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+		codecs = _zstd_dict_codecs[zdict] = (
+			zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=d),
+			zstandard.ZstdDecompressor(dict_data=d),
+		)
+	return codecs
+
+
+def encode(text: str, codec: Optional[str] = None, zdict: Optional[bytes] = None) -> Tuple[bytes, str, bytes, int]:
+	"""Return ``(hash, codec, payload, size)`` for storing ``text``.
+
+	The hash covers the text only, so identical texts dedupe regardless of
+	the dictionary used to compress them.
+	"""
+	global _zstd_compressor
+	raw = text.encode("utf-8")
+	digest = text_hash(raw)
+	codec = codec or default_codec()
+	if len(raw) < MIN_COMPRESS_BYTES:
+		return digest, "raw", raw, len(raw)
+	if codec == "zstd":
+		if zdict:
+			payload = _zstd_dict_codec(zdict)[0].compress(raw)
+		else:
+			if _zstd_compressor is None:
+				_zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+			payload = _zstd_compressor.compress(raw)
+	else:
+		codec = "zlib"
+		if zdict:
+			c = zlib.compressobj(ZLIB_LEVEL, zdict=zdict)
+			payload = c.compress(raw) + c.flush()
+		else:
+			payload = zlib.compress(raw, ZLIB_LEVEL)
+	if len(payload) >= len(raw):
+		return digest, "raw", raw, len(raw)
+	return digest, codec, payload, len(raw)
+
+
+def decode(codec: Optional[str], payload: Optional[bytes], zdict: Optional[bytes] = None) -> Optional[str]:
+	"""SQLite function ``blob_decode(codec, data, dict)``; NULL in, NULL out."""
+	global _zstd_decompressor
+	if payload is None:
+		return None
+	if codec == "zlib":
+		if zdict:
+			d = zlib.decompressobj(zdict=zdict)
+			return (d.decompress(payload) + d.flush()).decode("utf-8")
+		return zlib.decompress(payload).decode("utf-8")
+	if codec == "zstd":
+		if zstandard is None:
+			raise RuntimeError("Database contains zstd-compressed text; install the 'zstandard' package")
+		if zdict:
+			return _zstd_dict_codec(zdict)[1].decompress(payload).decode("utf-8")
+		if _zstd_decompressor is None:
+			_zstd_decompressor = zstandard.ZstdDecompressor()
+		return _zstd_decompressor.decompress(payload).decode("utf-8")
+	return bytes(payload).decode("utf-8")
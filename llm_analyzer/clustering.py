@@ -0,0 +1,145 @@
+"""Near-duplicate clustering of responses.
+
+NPCs repeat themselves: the same greeting, ``wait 500`` with a different
+number, a move one tile over. Responses are turned into MinHash signatures
+and grouped with locality-sensitive hashing, so similar responses can be
+reviewed and rated once.
+
+Signatures use one-permutation hashing: every character shingle is hashed
+once and kept as the minimum of one of :data:`NUM_HASHES` bins, so the
+cost is linear in the text length rather than in text length times the
+number of hash functions. Empty bins (short texts) borrow the value of the
+next filled bin, which keeps estimates of equal-length texts comparable.
+
+Bands of :data:`ROWS_PER_BAND` bin values are hashed into buckets; texts
+sharing a bucket are candidates and join a cluster when their estimated
+Jaccard similarity with its first response reaches :data:`THRESHOLD`.
+Everything is deterministic (crc32 rather than Python's salted ``hash``)
+because buckets are stored in the database.
+"""
+from __future__ import annotations
+
+import operator
+import re
+import struct
+import zlib
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+from . import prompts
+
+NUM_HASHES = 64
+ROWS_PER_BAND = 4
+# 16 bands of 4 rows: texts at 0.8 similarity share a bucket with
+# probability > 0.999, texts at 0.3 with probability < 0.13.
+BANDS = NUM_HASHES // ROWS_PER_BAND
+THRESHOLD = 0.8
+# Candidates must share this many buckets. Pairs at THRESHOLD still do with
+# probability 0.997; unrelated texts at 0.4 similarity only 6% of the time.
+MIN_SHARED_BANDS = 2
+# Clusters kept per bucket. Texts from a small vocabulary share band values
+# with many clusters that are still too different to join; without a cap
+# such buckets grow with the data and clustering turns quadratic.
+BUCKET_CAPACITY = 8
+SHINGLE_CHARS = 5
+
+_MASK64 = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15
+_EMPTY = _MASK64
+_BIN_BITS = NUM_HASHES.bit_length() - 1
+_SPACE = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+_BAND = struct.Struct(f"<{ROWS_PER_BAND}Q")
+
+
+def normalize(text: Optional[str]) -> str:
+	"""Lower-case, collapse whitespace and replace numbers with ``#``.
+
+	Coordinates, item ids and wait times rarely change how a response is
+	rated, and a few digits make up a large share of a short response.
+	"""
+	return _DIGITS.sub("#", _SPACE.sub(" ", str(text or "")).strip().lower())
+
+
+def _shingle_hashes(text: str) -> List[int]:
+	if len(text) <= SHINGLE_CHARS:
+		pieces = [text]
+	else:
+		pieces = [text[i:i + SHINGLE_CHARS] for i in range(len(text) - SHINGLE_CHARS + 1)]
+	# crc32 alone is linear; the multiply spreads it over 64 bits
+	return [(zlib.crc32(p.encode("utf-8")) * _MIX) & _MASK64 for p in set(pieces)]
+
+
+def signature(text: str) -> Tuple[int, ...]:
+	"""MinHash signature of ``text`` (already normalized)."""
+	return minhash(_shingle_hashes(text))
+
+
+def line_signature(text: str) -> Tuple[int, ...]:
+	"""MinHash signature over the set of lines of ``text``.
+
+	Cheaper than :func:`signature` for long texts such as prompts, where
+	similarity is better judged by whole lines anyway.
+	"""
+	return minhash([(zlib.crc32(line.encode("utf-8")) * _MIX) & _MASK64 for line in set(text.splitlines())])
+
+
+def minhash(hashes: Sequence[int]) -> Tuple[int, ...]:
+	"""One-permutation MinHash of 64-bit feature hashes."""
+	sig = [_EMPTY] * NUM_HASHES
+	shift = 64 - _BIN_BITS
+	for h in hashes:
+		b = h >> shift
+		v = h & ((1 << shift) - 1)
+		if v < sig[b]:
+			sig[b] = v
+	if _EMPTY in sig and any(v != _EMPTY for v in sig):
+		# Densify: an empty bin takes the next filled bin's value, offset by
+		# the distance so borrowed values differ from genuine ones
+		filled = list(sig)
+		for i in range(NUM_HASHES):
+			if filled[i] != _EMPTY:
+				continue
+			k = 1
+			while filled[(i + k) % NUM_HASHES] == _EMPTY:
+				k += 1
+			sig[i] = (filled[(i + k) % NUM_HASHES] + k * _MIX) & _MASK64
+	return tuple(sig)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+	"""Estimated Jaccard similarity of the texts behind two signatures."""
+	return sum(map(operator.eq, a, b)) / NUM_HASHES
+
+
+def band_buckets(sig: Sequence[int], scope: str) -> List[int]:
+	"""One bucket key per band; ``scope`` keeps clusters of different NPCs apart."""
+	prefix = scope.encode("utf-8")
+	keys = []
+	for band in range(BANDS):
+		rows = _BAND.pack(*sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+		# Band number in the key, so one lookup covers all bands
+		keys.append(zlib.crc32(rows, zlib.crc32(prefix + bytes((band,)))))
+	return keys
+
+
+def pack(sig: Sequence[int]) -> bytes:
+	return array("Q", sig).tobytes()
+
+
+def unpack(data: bytes) -> Tuple[int, ...]:
+	return tuple(array("Q", data))
+
+
+def clustering_text(response: Optional[str], prompt: Optional[str] = None) -> str:
+	"""Text a response is clustered by.
+
+	With a prompt, the last history entry (what the NPC is reacting to) is
+	prepended, so the same reply to different events stays apart.
+	"""
+	text = normalize(response)
+	if prompt is None:
+		return text
+	history = "".join(part for name, part in prompts.split_sections(prompt) if name == "history")
+	lines = [line for line in history.splitlines()[1:] if line.strip()]
+	return (normalize(lines[-1]) + " | " if lines else "") + text
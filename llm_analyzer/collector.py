@@ -0,0 +1,406 @@
+"""Local collector for the plugin's analyzer events.
+
+With a collector URL set, the plugin POSTs every call and interaction here
+instead of appending to ``performance.csv`` and rewriting the whole
+``session_<guid>.json`` after each interaction. Events are acknowledged as
+soon as they are parsed; one writer thread stores them with group commit,
+putting everything that arrived within :data:`COMMIT_INTERVAL_S` into one
+transaction. The GUI sees them without an import step.
+
+Requests carry one JSON object or an array of them:
+
+* ``POST /calls``: ``{llm_name, duration_ms, call_timestamp}``, like a row
+  of ``performance.csv``
+* ``POST /interactions``: ``{session_guid, llm_name, started_at, index,
+  t_ms, situation_id, prompt, response}``, where ``index`` is the position
+  in the session (so a session file imported later only adds the others)
+* ``GET /stats``: counters
+
+Accepted events get 202. Any other status (400 for a body that is not
+JSON, 503 while too many events are unwritten) tells the plugin to write
+the event to its log files instead; responses allow any origin so the
+plugin can read the status.
+
+An acknowledged event is lost if the collector is killed before the next
+commit, at most :data:`COMMIT_INTERVAL_S` of events. If a batch cannot be
+written, its events are written one at a time, and those that still fail
+are appended to :data:`DEAD_LETTER_NAME` next to the database.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import db, importers
+from .httputil import BadRequest, http_response, read_http_request
+from .utils import normalize_llm_name, parse_iso_datetime_to_utc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8809
+COMMIT_INTERVAL_S = 0.05
+# Events per transaction at most, so one commit never stalls for long
+MAX_BATCH = 5000
+# Beyond this many unwritten events requests get 503 instead of piling up
+MAX_PENDING = 200_000
+DEAD_LETTER_NAME = "collector_failed.jsonl"
+
+_ROUTES = {"/calls": "call", "/interactions": "interaction"}
+# The game posts from its own origin; allowing it lets the plugin read the
+# status and fall back to the log files when an event is not accepted
+_CORS_HEADERS = {
+	"Access-Control-Allow-Origin": "*",
+	"Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+	"Access-Control-Allow-Headers": "Content-Type",
+}
+
+
+def _epoch_ms(iso: Optional[str]) -> Optional[int]:
+	return int(parse_iso_datetime_to_utc(iso).timestamp() * 1000) if iso else None
+
+
+class Collector:
+	"""Accepts events and writes them from a background thread."""
+
+	def __init__(
+		self,
+		db_path: Path,
+		source: str = "collector",
+		commit_interval_s: float = COMMIT_INTERVAL_S,
+		dead_letter_path: Optional[Path] = None,
+	) -> None:
+		self.db_path = Path(db_path)
+		self.source = source
+		# Events that could not be written even on their own, one JSON object per line
+		self.dead_letter_path = Path(dead_letter_path) if dead_letter_path is not None else self.db_path.with_name(DEAD_LETTER_NAME)
+		# Everything one collector writes is one import
+		self.batch = db.ImportBatch("collector", source)
+		self.commit_interval_s = commit_interval_s
+		self.pending: "queue.Queue[Tuple[str, Dict[str, object]]]" = queue.Queue()
+		# session guid -> session id
+		self.sessions: Dict[str, int] = {}
+		self.stats = {
+			"received": 0,
+			"rejected": 0,
+			# Interactions that passed the first check but could not be parsed
+			"invalid": 0,
+			# Interactions whose index the session already has
+			"duplicates": 0,
+			"written_calls": 0,
+			"written_interactions": 0,
+			# Events written to the dead-letter file
+			"failed": 0,
+			"commits": 0,
+			"last_commit_ms": 0.0,
+		}
+		self._seq = 0
+		self._stopping = threading.Event()
+		self._thread = threading.Thread(target=self._write_loop, name="collector-writer", daemon=True)
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def stop(self) -> None:
+		"""Write what is still queued, then end the writer thread."""
+		self._stopping.set()
+		self._thread.join()
+
+	def snapshot(self) -> Dict[str, object]:
+		return dict(self.stats, pending=self.pending.qsize())
+
+	def submit(self, kind: str, items: List[object]) -> Tuple[int, int]:
+		"""Queue valid events; returns (accepted, rejected)."""
+		accepted = rejected = 0
+		for item in items:
+			event = self._parse(kind, item) if isinstance(item, dict) else None
+			if event is None:
+				rejected += 1
+				continue
+			self.pending.put((kind, event))
+			accepted += 1
+		self.stats["received"] += accepted
+		self.stats["rejected"] += rejected
+		return accepted, rejected
+
+	def _parse(self, kind: str, item: Dict[str, object]) -> Optional[Dict[str, object]]:
+		if kind == "call":
+			self._seq += 1
+			# Batch id and import time are set when the batch is written
+			return importers.call_row(item, self.source, self._seq, None, "", "")
+		# Interactions are only checked here; parsing them is left to the writer
+		if not item.get("session_guid") or not item.get("llm_name"):
+			return None
+		return item
+
+	# Writer thread
+
+	def _write_loop(self) -> None:
+		conn = db.get_connection(self.db_path)
+		try:
+			# Readers (the GUI) are not blocked by commits, and commits do not
+			# wait for the disk
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			while True:
+				batch = self._next_batch()
+				if batch:
+					self._write_batch(conn, batch)
+				elif self._stopping.is_set():
+					break
+				else:
+					# Nothing arrived: group stored responses until something does
+					while self.pending.empty() and not self._stopping.is_set() and self._cluster_step(conn):
+						pass
+		finally:
+			conn.close()
+
+	def _next_batch(self) -> List[Tuple[str, Dict[str, object]]]:
+		try:
+			batch = [self.pending.get(timeout=0.2)]
+		except queue.Empty:
+			return []
+		# Group commit: collect what arrives within the interval
+		deadline = time.monotonic() + self.commit_interval_s
+		while len(batch) < MAX_BATCH:
+			remaining = deadline - time.monotonic()
+			try:
+				batch.append(self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait())
+			except queue.Empty:
+				break
+		return batch
+
+	def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple[str, Dict[str, object]]]) -> None:
+		"""Write a batch in one transaction; if that fails, each event in its own.
+
+		Every event was acknowledged already, so one bad row must not cost the
+		others. Events that fail on their own go to the dead-letter file.
+		"""
+		try:
+			self._store(conn, batch)
+		except Exception:
+			if len(batch) == 1:
+				self._dead_letter(batch[0])
+				return
+			logger.exception("Writing %d collected events failed; writing them one at a time", len(batch))
+			for item in batch:
+				try:
+					self._store(conn, [item])
+				except Exception:
+					self._dead_letter(item)
+
+	def _cluster_step(self, conn: sqlite3.Connection) -> int:
+		try:
+			return db.backfill_step(conn, "clusters", db.CLUSTER_STEP_ROWS)
+		except Exception:
+			logger.exception("Grouping collected responses failed")
+			return 0
+
+	def _dead_letter(self, item: Tuple[str, Dict[str, object]]) -> None:
+		kind, event = item
+		logger.exception("Could not write a collected %s; keeping it in %s", kind, self.dead_letter_path)
+		self.stats["failed"] += 1
+		try:
+			with self.dead_letter_path.open("a", encoding="utf-8") as f:
+				f.write(json.dumps({"kind": kind, "event": event, "failed_at": db.utc_now_iso()}, default=str) + "\n")
+		except OSError:
+			logger.exception("Writing %s failed", self.dead_letter_path)
+
+	def _store(self, conn: sqlite3.Connection, batch: List[Tuple[str, Dict[str, object]]]) -> None:
+		"""Write events in one transaction."""
+		t0 = time.perf_counter()
+		batch_id = self.batch.id
+		imported_at = db.utc_now_iso()
+		calls: List[Dict[str, object]] = []
+		by_session: Dict[str, List[Dict[str, object]]] = {}
+		for kind, event in batch:
+			if kind == "call":
+				calls.append(dict(event, imported_at=imported_at, import_batch_id=batch_id))
+			else:
+				by_session.setdefault(str(event["session_guid"]), []).append(event)
+		# (llm_name -> [first ms, last ms]) of the new rows, for linking
+		spans: Dict[str, List[int]] = {}
+		for row in calls:
+			self._extend_span(spans, row["llm_name"], _epoch_ms(row["call_timestamp"]))
+		sessions: Dict[str, int] = {}
+		# Counted only once the transaction commits
+		skipped = {"invalid": 0, "duplicates": 0}
+		new_sessions = written = 0
+		with db.transaction(conn):
+			if calls:
+				db.insert_llm_calls(conn, calls)
+			for guid, events in by_session.items():
+				rows, created = self._write_session(conn, guid, events, imported_at, batch_id, sessions, skipped)
+				new_sessions += created
+				for row in rows:
+					self._extend_span(spans, row["llm_name"], _epoch_ms(row["interaction_timestamp"]))
+				written += len(rows)
+			db.link_interactions_to_calls(conn, scopes=[(name, lo, hi) for name, (lo, hi) in spans.items()])
+			if written:
+				db.schedule_clustering(conn)
+			db.record_import_batch(
+				conn, self.batch, (time.perf_counter() - t0) * 1000.0,
+				calls=len(calls), sessions=new_sessions, interactions=written,
+			)
+		self.sessions.update(sessions)
+		for key, n in skipped.items():
+			self.stats[key] += n
+		self.stats["written_calls"] += len(calls)
+		self.stats["written_interactions"] += written
+		self.stats["commits"] += 1
+		self.stats["last_commit_ms"] = (time.perf_counter() - t0) * 1000.0
+
+	@staticmethod
+	def _extend_span(spans: Dict[str, List[int]], llm_name: str, ms: Optional[int]) -> None:
+		if ms is None:
+			return
+		span = spans.get(llm_name)
+		if span is None:
+			spans[llm_name] = [ms, ms]
+		else:
+			span[0] = min(span[0], ms)
+			span[1] = max(span[1], ms)
+
+	def _write_session(
+		self,
+		conn: sqlite3.Connection,
+		guid: str,
+		events: List[Dict[str, object]],
+		imported_at: str,
+		batch_id: str,
+		sessions: Dict[str, int],
+		skipped: Dict[str, int],
+	) -> Tuple[List[Dict[str, object]], bool]:
+		"""Insert a batch's interactions of one session.
+
+		Returns the rows written and whether the session was new; interactions
+		left out are counted in ``skipped``.
+		"""
+		known = sessions.get(guid) or self.sessions.get(guid)
+		if known is None:
+			row = db.fetch_session_by_guid(conn, guid)
+			if row is not None:
+				known = int(row["id"])
+		# Posts are not ordered, so an index may arrive after later ones; only
+		# the indexes the session already has are skipped
+		stored = db.fetch_session_indexes(conn, known) if known is not None else set()
+		next_index = max(stored, default=-1) + 1
+		first = events[0]
+		llm_name = normalize_llm_name(str(first["llm_name"]))
+		started_at = first.get("started_at")
+		rows: List[Dict[str, object]] = []
+		for event in sorted(events, key=lambda e: e.get("index") if isinstance(e.get("index"), int) else float("inf")):
+			index = event.get("index")
+			if not isinstance(index, int):
+				index = next_index
+			if index in stored:
+				# Resent after a timeout, or already imported from the session file
+				skipped["duplicates"] += 1
+				continue
+			row = importers.interaction_row(event, index, str(started_at) if started_at else None, llm_name)
+			if row is None:
+				skipped["invalid"] += 1
+				continue
+			rows.append(row)
+			stored.add(index)
+			next_index = max(next_index, index + 1)
+		if known is None:
+			session_id = db.insert_session_with_interactions(
+				conn,
+				{
+					"session_guid": guid,
+					"session_timestamp": parse_iso_datetime_to_utc(str(started_at)).isoformat() if started_at else None,
+					"llm_name": llm_name,
+					"source_file": self.source,
+					"imported_at": imported_at,
+					"import_batch_id": batch_id,
+					"checksum": db.session_checksum({"session_guid": guid, "source": self.source}),
+				},
+				rows,
+			)
+		else:
+			session_id = known
+			if rows:
+				db.append_session_interactions(conn, session_id, rows, batch_id)
+		sessions[guid] = session_id
+		return rows, known is None
+
+	# HTTP
+
+	async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		try:
+			while True:
+				try:
+					request = await read_http_request(reader)
+				except BadRequest as e:
+					writer.write(http_response(e.status, {"error": str(e)}, False, _CORS_HEADERS))
+					break
+				if request is None:
+					break
+				method, path, headers, body = request
+				keep_alive = headers.get("connection", "").lower() != "close"
+				status, payload = self.respond(method, path, body)
+				writer.write(http_response(status, payload, keep_alive, _CORS_HEADERS))
+				await writer.drain()
+				if not keep_alive:
+					break
+		except (asyncio.IncompleteReadError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+	def respond(self, method: str, path: str, body: bytes) -> Tuple[int, object]:
+		route = path.split("?", 1)[0].rstrip("/")
+		if method == "OPTIONS":
+			# CORS preflight
+			return 204, None
+		if method == "GET" and route == "/stats":
+			return 200, self.snapshot()
+		kind = _ROUTES.get(route)
+		if kind is None:
+			return 404, {"error": "POST to /calls or /interactions"}
+		if method != "POST":
+			return 405, {"error": "POST a JSON object or array"}
+		try:
+			payload = json.loads(body or b"null")
+		except ValueError:
+			return 400, {"error": "body is not JSON"}
+		items = payload if isinstance(payload, list) else [payload]
+		if self.pending.qsize() > MAX_PENDING:
+			return 503, {"error": "collector is behind; retry later"}
+		accepted, rejected = self.submit(kind, items)
+		return 202, {"accepted": accepted, "rejected": rejected}
+
+
+async def start_server(collector: Collector, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[Path] = None) -> asyncio.AbstractServer:
+	if unix_path is not None:
+		return await asyncio.start_unix_server(collector.handle, str(unix_path))
+	return await asyncio.start_server(collector.handle, host, port, backlog=1024)
+
+
+def serve(db_path: Path, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[Path] = None) -> None:
+	"""Collect until interrupted; queued events are written before returning."""
+	where = str(unix_path) if unix_path is not None else f"http://{host}:{port}"
+	collector = Collector(db_path, source=f"collector:{where}")
+	collector.start()
+
+	async def main() -> None:
+		server = await start_server(collector, host, port, unix_path)
+		logger.info("Collecting analyzer events on %s", where)
+		async with server:
+			await server.serve_forever()
+
+	try:
+		asyncio.run(main())
+	except KeyboardInterrupt:
+		pass
+	finally:
+		collector.stop()
+		logger.info("Collector stopped: %s", collector.snapshot())
@@ -0,0 +1,158 @@
+"""Comparing two LLMs with bootstrap confidence intervals.
+
+Averages hide how sure a difference is. :func:`compare_llms` reports the
+P50 and P90 latency and the OK score (okay / rated) of two LLMs, their
+difference and a bootstrap confidence interval for it.
+
+Resampling works on counts rather than rows, so millions of calls cost no
+more than thousands: durations come from SQL as (value, count) pairs, and a
+resample of n calls is a multinomial draw of counts over those values. A
+percentile only needs the position of the k-th smallest draw, which each
+resample finds by bisecting the value range: the draws in the lower half of
+the current range are binomial given those in the whole range. That takes
+log2(distinct durations) binomial draws per resample, all resamples at
+once. Resampled OK scores are binomial draws of the rated interactions.
+
+Needs NumPy.
+"""
+from __future__ import annotations
+
+import math
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+	import numpy as np
+except ImportError:  # optional; only needed for comparisons
+	np = None
+
+from . import db
+
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_CONFIDENCE = 0.95
+PERCENTILES = (("p50_ms", 0.50), ("p90_ms", 0.90))
+
+
+def _require_numpy() -> None:
+	if np is None:
+		raise RuntimeError("Comparing LLMs needs NumPy; install it with pip install numpy")
+
+
+def _rank(p: float, n: int) -> int:
+	"""1-based nearest rank of the p-th percentile, as in utils.nearest_rank_percentile."""
+	return max(1, int(math.ceil(p * n)))
+
+
+def percentile(counts: Sequence[Tuple[int, int]], p: float) -> Optional[float]:
+	"""Nearest-rank percentile of (value, count) pairs sorted by value."""
+	if not counts:
+		return None
+	k = _rank(p, sum(c for _, c in counts))
+	seen = 0
+	for value, c in counts:
+		seen += c
+		if seen >= k:
+			return float(value)
+	return float(counts[-1][0])
+
+
+def bootstrap_percentile(counts: Sequence[Tuple[int, int]], p: float, resamples: int, rng) -> "np.ndarray":
+	"""Nearest-rank percentile of each of ``resamples`` bootstrap resamples."""
+	values = np.array([v for v, _ in counts], dtype=np.float64)
+	cum = np.concatenate(([0], np.cumsum([c for _, c in counts], dtype=np.int64)))
+	n = int(cum[-1])
+	# Per resample: the range [lo, hi) of value indexes holding its k-th
+	# smallest draw, and how many of its n draws fall in that range
+	lo = np.zeros(resamples, dtype=np.int64)
+	hi = np.full(resamples, len(values), dtype=np.int64)
+	inside = np.full(resamples, n, dtype=np.int64)
+	k = np.full(resamples, _rank(p, n), dtype=np.int64)
+	while True:
+		open_ = hi - lo > 1
+		if not open_.any():
+			break
+		mid = np.where(open_, (lo + hi) // 2, hi)
+		below = rng.binomial(inside, (cum[mid] - cum[lo]) / (cum[hi] - cum[lo]))
+		left = open_ & (below >= k)
+		right = open_ & ~left
+		hi = np.where(left, mid, hi)
+		lo = np.where(right, mid, lo)
+		k = np.where(right, k - below, k)
+		inside = np.where(left, below, np.where(right, inside - below, inside))
+	return values[lo]
+
+
+def bootstrap_share(hits: int, total: int, resamples: int, rng) -> "np.ndarray":
+	"""Share of hits in each of ``resamples`` bootstrap resamples of ``total`` yes/no values."""
+	return rng.binomial(total, hits / total, size=resamples) / total
+
+
+def _interval(samples: "np.ndarray", confidence: float) -> Tuple[float, float]:
+	tail = (1.0 - confidence) / 2.0
+	low, high = np.quantile(samples, [tail, 1.0 - tail], method="inverted_cdf")
+	return float(low), float(high)
+
+
+def _metric(name: str, a: Optional[float], b: Optional[float], diffs: Optional["np.ndarray"], confidence: float) -> Dict[str, object]:
+	row: Dict[str, object] = {"metric": name, "a": a, "b": b, "difference": None, "ci_low": None, "ci_high": None, "significant": None}
+	if diffs is not None:
+		row["difference"] = b - a
+		row["ci_low"], row["ci_high"] = _interval(diffs, confidence)
+		# The interval excludes "no difference"
+		row["significant"] = row["ci_low"] > 0 or row["ci_high"] < 0
+	return row
+
+
+def compare_llms(
+	conn: sqlite3.Connection,
+	llm_a: str,
+	llm_b: str,
+	situation_id: Optional[str] = None,
+	resamples: int = DEFAULT_RESAMPLES,
+	confidence: float = DEFAULT_CONFIDENCE,
+	seed: Optional[int] = None,
+) -> Dict[str, object]:
+	"""Latency percentiles and OK score of ``llm_b`` against ``llm_a``.
+
+	Differences are b - a, so a negative latency difference means b is
+	faster. With ``situation_id`` only that NPC's interactions and the calls
+	linked to them count. A metric one of the LLMs has no data for has no
+	difference.
+	"""
+	_require_numpy()
+	if resamples < 1:
+		raise ValueError("At least one resample is needed")
+	if not 0.0 < confidence < 1.0:
+		raise ValueError("The confidence level must be between 0 and 1")
+	rng = np.random.default_rng(seed)
+	durations = {side: db.fetch_duration_counts(conn, name, situation_id) for side, name in (("a", llm_a), ("b", llm_b))}
+	ratings = {side: db.fetch_rating_counts(conn, name, situation_id) for side, name in (("a", llm_a), ("b", llm_b))}
+
+	metrics: List[Dict[str, object]] = []
+	for name, p in PERCENTILES:
+		a = percentile(durations["a"], p)
+		b = percentile(durations["b"], p)
+		diffs = None
+		if a is not None and b is not None:
+			diffs = bootstrap_percentile(durations["b"], p, resamples, rng) - bootstrap_percentile(durations["a"], p, resamples, rng)
+		metrics.append(_metric(name, a, b, diffs, confidence))
+
+	(ok_a, not_a), (ok_b, not_b) = ratings["a"], ratings["b"]
+	rated_a, rated_b = ok_a + not_a, ok_b + not_b
+	score_a = ok_a / rated_a if rated_a else None
+	score_b = ok_b / rated_b if rated_b else None
+	diffs = None
+	if rated_a and rated_b:
+		diffs = bootstrap_share(ok_b, rated_b, resamples, rng) - bootstrap_share(ok_a, rated_a, resamples, rng)
+	metrics.append(_metric("ok_score", score_a, score_b, diffs, confidence))
+
+	return {
+		"llm_a": llm_a,
+		"llm_b": llm_b,
+		"situation_id": situation_id,
+		"resamples": resamples,
+		"confidence": confidence,
+		"calls": {"a": sum(c for _, c in durations["a"]), "b": sum(c for _, c in durations["b"])},
+		"rated": {"a": rated_a, "b": rated_b},
+		"metrics": metrics,
+	}
@@ -0,0 +1,165 @@
+"""Calls in flight over time, for rate limits and NPC throttling.
+
+The performance log records when each call ended and how long it took, so
+it started ``duration_ms`` earlier. Sorting the start (+1) and end (-1)
+events once and summing along them gives the number of calls in flight at
+every event, in O(n log n). From that :func:`analyze` derives the peak, a
+timeline per bucket, the calls started per minute and how latency grows
+with the calls already in flight.
+
+Needs NumPy.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+try:
+	import numpy as np
+except ImportError:  # optional; only needed for this analysis
+	np = None
+
+from . import db
+
+DEFAULT_BUCKET_S = 60
+# Providers state rate limits per minute
+RATE_WINDOW_MS = 60_000
+
+
+def _require_numpy() -> None:
+	if np is None:
+		raise RuntimeError("The concurrency analysis needs NumPy; install it with pip install numpy")
+
+
+def _iso(epoch_ms: int) -> str:
+	return datetime.fromtimestamp(int(epoch_ms) / 1000.0, timezone.utc).isoformat()
+
+
+def _nearest_rank(sorted_values: "np.ndarray", p: float) -> float:
+	return float(sorted_values[max(0, int(np.ceil(p * len(sorted_values))) - 1)])
+
+
+def sweep(starts: "np.ndarray", ends: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+	"""(event times, calls in flight after each event, in flight when each call started).
+
+	The last counts the call itself. Ends sort before starts of the same
+	millisecond, so back-to-back calls do not overlap.
+	"""
+	n = len(starts)
+	times = np.concatenate((starts, ends))
+	deltas = np.concatenate((np.ones(n, dtype=np.int64), np.full(n, -1, dtype=np.int64)))
+	order = np.lexsort((deltas, times))
+	levels = np.cumsum(deltas[order])
+	after = np.empty(2 * n, dtype=np.int64)
+	after[order] = levels
+	return times[order], levels, after[:n]
+
+
+def timeline(times: "np.ndarray", levels: "np.ndarray", starts: "np.ndarray", bucket_ms: int) -> List[Dict[str, object]]:
+	"""Calls started, most and average calls in flight per bucket; idle buckets are left out."""
+	first = int(times[0]) // bucket_ms * bucket_ms
+	count = int(times[-1] - first) // bucket_ms + 1
+	bounds = first + bucket_ms * np.arange(count + 1, dtype=np.int64)
+	# In flight at each bucket boundary: the level after every event up to it,
+	# so calls ending exactly on the boundary are no longer counted
+	before = np.searchsorted(times, bounds, side="right") - 1
+	carried = np.where(before >= 0, levels[np.maximum(before, 0)], 0)
+	peak = carried[:-1].copy()
+	np.maximum.at(peak, (times - first) // bucket_ms, levels)
+	# Integral of the level over time, at each event and then at each boundary
+	area = np.concatenate(([0], np.cumsum(levels[:-1] * np.diff(times))))
+	last = np.searchsorted(times, bounds, side="right") - 1
+	at_bounds = np.where(last >= 0, area[np.maximum(last, 0)] + levels[np.maximum(last, 0)] * (bounds - times[np.maximum(last, 0)]), 0)
+	average = np.diff(at_bounds) / bucket_ms
+	started = np.bincount((starts - first) // bucket_ms, minlength=count)
+	return [
+		{"start": _iso(bounds[i]), "calls": int(started[i]), "max_in_flight": int(peak[i]), "avg_in_flight": round(float(average[i]), 3)}
+		for i in np.flatnonzero((started > 0) | (peak > 0))
+	]
+
+
+def call_rate(starts: "np.ndarray") -> Dict[str, object]:
+	"""Calls started per minute: the busiest sliding minute and percentiles of the active minutes."""
+	starts = np.sort(starts)
+	in_window = np.searchsorted(starts, starts + RATE_WINDOW_MS, side="left") - np.arange(len(starts))
+	busiest = int(np.argmax(in_window))
+	per_minute = np.bincount((starts - starts[0]) // RATE_WINDOW_MS)
+	active = np.sort(per_minute[per_minute > 0])
+	return {
+		"peak": int(in_window[busiest]),
+		"peak_from": _iso(starts[busiest]),
+		"p50": _nearest_rank(active, 0.50),
+		"p90": _nearest_rank(active, 0.90),
+		"p99": _nearest_rank(active, 0.99),
+	}
+
+
+def latency_by_in_flight(in_flight: "np.ndarray", durations: "np.ndarray") -> List[Dict[str, object]]:
+	"""Duration percentiles of the calls grouped by how many were in flight when they started."""
+	order = np.lexsort((durations, in_flight))
+	levels = in_flight[order]
+	ordered = durations[order]
+	cuts = np.flatnonzero(np.diff(levels)) + 1
+	rows: List[Dict[str, object]] = []
+	for lo, hi in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(levels)]))):
+		group = ordered[lo:hi]
+		rows.append({
+			"in_flight": int(levels[lo]),
+			"calls": int(hi - lo),
+			"p50_ms": _nearest_rank(group, 0.50),
+			"p90_ms": _nearest_rank(group, 0.90),
+			"avg_ms": float(group.mean()),
+		})
+	return rows
+
+
+def _summary(ends: "np.ndarray", durations: "np.ndarray") -> Tuple[Dict[str, object], Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]]:
+	starts = ends - durations
+	times, levels, in_flight = sweep(starts, ends)
+	top = int(np.argmax(levels))
+	summary = {
+		"calls": len(ends),
+		"peak_in_flight": int(levels[top]),
+		"peak_at": _iso(times[top]),
+		"calls_per_minute": call_rate(starts),
+	}
+	return summary, (starts, times, levels, in_flight)
+
+
+def analyze(
+	conn: sqlite3.Connection,
+	llm_filter: Optional[str] = None,
+	date_from_iso: Optional[str] = None,
+	date_to_iso: Optional[str] = None,
+	bucket_s: int = DEFAULT_BUCKET_S,
+) -> Dict[str, object]:
+	"""Concurrency of all calls together and of each LLM.
+
+	``overall`` counts every call in flight, which is what NPC throttling
+	limits; ``by_llm`` counts only the calls of that LLM, which is what its
+	provider's limits see, and relates them to the LLM's latency. Calls
+	without a timestamp are left out.
+	"""
+	_require_numpy()
+	if bucket_s < 1:
+		raise ValueError("Buckets must be at least one second long")
+	spans = db.fetch_call_spans(conn, llm_filter, date_from_iso, date_to_iso)
+	report: Dict[str, object] = {"bucket_s": bucket_s, "overall": None, "by_llm": []}
+	if not spans:
+		return report
+	columns = {
+		# A call takes at least a millisecond, so it never ends before it starts
+		name: (np.array(ends, dtype=np.int64), np.maximum(np.array(durations, dtype=np.int64), 1))
+		for name, (ends, durations) in spans.items()
+	}
+	all_ends = np.concatenate([ends for ends, _ in columns.values()])
+	all_durations = np.concatenate([durations for _, durations in columns.values()])
+	overall, (starts, times, levels, _) = _summary(all_ends, all_durations)
+	overall["timeline"] = timeline(times, levels, starts, bucket_s * 1000)
+	report["overall"] = overall
+	for name in sorted(columns):
+		ends, durations = columns[name]
+		summary, (_, _, _, in_flight) = _summary(ends, durations)
+		report["by_llm"].append(dict({"llm_name": name}, **summary, latency_by_in_flight=latency_by_in_flight(in_flight, durations)))
+	return report
@@ -1,26 +1,190 @@
 from __future__ import annotations
 
+import functools
 import hashlib
 import json
+import logging
 import sqlite3
+import tempfile
+import time
 import uuid
+from collections import OrderedDict
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from dataclasses import fields as dataclass_fields
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-SCHEMA_VERSION = 1
+from . import blobstore, clustering, matching, prompts, responses, tokens
+from .instrument import instrumented
+
+logger = logging.getLogger(__name__)
+
+# Databases older than this get every missing table, column and index at
+# once (see _create_baseline_schema); later changes are in MIGRATIONS
+BASELINE_VERSION = 11
+SCHEMA_VERSION = 12
+
+
+class QueryCache:
+	"""LRU cache of query results for one connection.
+
+	Entries are valid for one database version: ``PRAGMA data_version``
+	(bumped by commits of other connections) together with the
+	connection's own ``total_changes`` counter. Checking both reads two
+	counters and touches no table, so a repeated query with unchanged data
+	costs no real SQL. Size is bounded by entries and by result rows.
+	"""
+
+	def __init__(self, max_entries: int = 64, max_rows: int = 200_000) -> None:
+		self.max_entries = max_entries
+		self.max_rows = max_rows
+		self.entries: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+		self.rows = 0
+		self.version: Optional[Tuple[int, int]] = None
+		self.hits = 0
+		self.misses = 0
+
+	def clear(self) -> None:
+		self.entries.clear()
+		self.rows = 0
+
+	def validate(self, conn: sqlite3.Connection) -> None:
+		version = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+		if version != self.version:
+			self.clear()
+			self.version = version
+
+	def get(self, key: tuple) -> Tuple[bool, object]:
+		entry = self.entries.get(key)
+		if entry is None:
+			self.misses += 1
+			return False, None
+		self.entries.move_to_end(key)
+		self.hits += 1
+		return True, entry[0]
+
+	def put(self, key: tuple, result: object) -> None:
+		weight = _result_rows(result)
+		if weight > self.max_rows:
+			return
+		self.entries[key] = (result, weight)
+		self.rows += weight
+		while len(self.entries) > self.max_entries or self.rows > self.max_rows:
+			_, (_, w) = self.entries.popitem(last=False)
+			self.rows -= w
+
+
+def _result_rows(result: object) -> int:
+	if isinstance(result, (list, dict)):
+		return len(result)
+	if isinstance(result, tuple):
+		return sum(_result_rows(item) for item in result if isinstance(item, (list, dict))) or 1
+	return 1
+
+
+class Connection(sqlite3.Connection):
+	"""sqlite3 connection carrying a :class:`QueryCache`."""
+
+	def __init__(self, *args, **kwargs) -> None:
+		super().__init__(*args, **kwargs)
+		self.query_cache = QueryCache()
+
+
+def cached_query(fn):
+	"""Serve ``fn(conn, ...)`` from the connection's query cache.
+
+	Results are shared between callers and must not be modified. Place it
+	above ``@instrumented`` so hits, which run no SQL, are not recorded as
+	queries. Plain sqlite3 connections (not from get_connection) are not
+	cached.
+	"""
+
+	@functools.wraps(fn)
+	def wrapper(conn, *args, **kwargs):
+		cache = getattr(conn, "query_cache", None)
+		if cache is None:
+			return fn(conn, *args, **kwargs)
+		cache.validate(conn)
+		key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+		found, result = cache.get(key)
+		if not found:
+			result = fn(conn, *args, **kwargs)
+			cache.put(key, result)
+		return result
+
+	return wrapper
 
 
 def get_connection(db_path: Path) -> sqlite3.Connection:
-	conn = sqlite3.connect(str(db_path))
+	conn = sqlite3.connect(str(db_path), factory=Connection)
 	conn.row_factory = sqlite3.Row
 	conn.execute("PRAGMA foreign_keys = ON;")
+	conn.create_function("blob_decode", 3, blobstore.decode, deterministic=True)
 	return conn
 
 
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+	"""Add a column to an existing table if an older schema lacks it."""
+	existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+	if column not in existing:
+		conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+@instrumented
+def get_schema_version(conn: sqlite3.Connection) -> Optional[int]:
+	"""Return the stored schema version, or None for a fresh database."""
+	try:
+		row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+	except sqlite3.OperationalError:
+		return None
+	if row is None:
+		return None
+	try:
+		return int(row[0])
+	except (TypeError, ValueError):
+		return None
+
+
+@instrumented
 def initialize_schema(conn: sqlite3.Connection) -> None:
+	"""Create the schema, or bring an older database up to date.
+
+	Each migration newer than the stored version runs in its own
+	transaction and is recorded in meta. Changes to existing rows are not
+	made here: migrations schedule backfills, which :func:`run_backfills`
+	works through later in short batches, so opening a large database
+	stays quick.
+	"""
+	# Skip the DDL entirely when the database is already at the current version
+	version = get_schema_version(conn)
+	if version == SCHEMA_VERSION:
+		return
+	if version is None or version < BASELINE_VERSION:
+		_create_baseline_schema(conn, version)
+		version = BASELINE_VERSION
+	for migration in MIGRATIONS:
+		if migration.version <= version:
+			continue
+		with transaction(conn):
+			migration.apply(conn)
+			conn.executemany(
+				"INSERT OR REPLACE INTO meta(key, value) VALUES(?, ?)",
+				[
+					(f"migration_{migration.version}", f"{utc_now_iso()} {migration.name}"),
+					("schema_version", str(migration.version)),
+				],
+			)
+		logger.info("Applied migration %d: %s", migration.version, migration.name)
+
+
+def _create_baseline_schema(conn: sqlite3.Connection, version: Optional[int]) -> None:
+	"""Create what is missing of the schema at BASELINE_VERSION; idempotent."""
+	if version is None:
+		# Only takes effect before the first table is created; lets retention
+		# shrink the file without a full VACUUM
+		conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
 	cur = conn.cursor()
 	cur.execute(
 		"""
@@ -60,6 +224,16 @@ def initialize_schema(conn: sqlite3.Connection) -> None:
 		CREATE INDEX IF NOT EXISTS idx_llm_calls_duration ON llm_calls(duration_ms);
 		"""
 	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_llm_calls_source ON llm_calls(source_file, source_line_no);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_llm_calls_batch ON llm_calls(import_batch_id);
+		"""
+	)
 
 	cur.execute(
 		"""
@@ -85,6 +259,11 @@ def initialize_schema(conn: sqlite3.Connection) -> None:
 		CREATE INDEX IF NOT EXISTS idx_sessions_llm ON sessions(llm_name);
 		"""
 	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_sessions_batch ON sessions(import_batch_id);
+		"""
+	)
 
 	cur.execute(
 		"""
@@ -100,10 +279,22 @@ def initialize_schema(conn: sqlite3.Connection) -> None:
 			rating TEXT CHECK (rating IN ('okay','not_okay')),
 			llm_name TEXT,
 			index_in_session INTEGER,
-			extra TEXT
+			extra TEXT,
+			prompt_blob_id INTEGER REFERENCES blobs(id),
+			response_blob_id INTEGER REFERENCES blobs(id),
+			llm_call_id INTEGER REFERENCES llm_calls(id) ON DELETE SET NULL,
+			prompt_tokens INTEGER,
+			response_tokens INTEGER,
+			import_batch_id TEXT
 		);
 		"""
 	)
+	_ensure_column(conn, "interactions", "prompt_blob_id", "INTEGER REFERENCES blobs(id)")
+	_ensure_column(conn, "interactions", "response_blob_id", "INTEGER REFERENCES blobs(id)")
+	_ensure_column(conn, "interactions", "llm_call_id", "INTEGER REFERENCES llm_calls(id) ON DELETE SET NULL")
+	_ensure_column(conn, "interactions", "prompt_tokens", "INTEGER")
+	_ensure_column(conn, "interactions", "response_tokens", "INTEGER")
+	_ensure_column(conn, "interactions", "import_batch_id", "TEXT")
 	cur.execute(
 		"""
 		CREATE INDEX IF NOT EXISTS idx_interactions_session ON interactions(session_id);
@@ -134,10 +325,181 @@ def initialize_schema(conn: sqlite3.Connection) -> None:
 		CREATE INDEX IF NOT EXISTS idx_interactions_llm ON interactions(llm_name);
 		"""
 	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_interactions_llm_call ON interactions(llm_call_id);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_interactions_batch ON interactions(import_batch_id);
+		"""
+	)
+
+	# Deduplicated, compressed prompt/response text keyed by content hash.
+	# Interactions that reference a blob keep '' in their prompt/response
+	# columns; rows imported before blobs existed still hold their text there.
+	# Prompts are compressed against a per-situation preset dictionary.
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS blob_dicts (
+			id INTEGER PRIMARY KEY,
+			name TEXT NOT NULL UNIQUE,
+			data BLOB NOT NULL
+		);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS blobs (
+			id INTEGER PRIMARY KEY,
+			hash BLOB NOT NULL UNIQUE,
+			codec TEXT NOT NULL,
+			size INTEGER NOT NULL,
+			data BLOB NOT NULL,
+			dict_id INTEGER REFERENCES blob_dicts(id)
+		);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_interactions_prompt_blob ON interactions(prompt_blob_id);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_interactions_response_blob ON interactions(response_blob_id);
+		"""
+	)
+
+	# Per-section sizes and indexed environment fields of each prompt,
+	# filled by the importer (see prompts.decompose)
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS prompt_sections (
+			interaction_id INTEGER PRIMARY KEY REFERENCES interactions(id) ON DELETE CASCADE,
+			prompt_kind TEXT,
+			total_bytes INTEGER NOT NULL,
+			history_bytes INTEGER NOT NULL,
+			history_lines INTEGER NOT NULL,
+			description_bytes INTEGER NOT NULL,
+			description_lines INTEGER NOT NULL,
+			goal_bytes INTEGER NOT NULL,
+			goal_lines INTEGER NOT NULL,
+			policy_bytes INTEGER NOT NULL,
+			policy_lines INTEGER NOT NULL,
+			env_bytes INTEGER NOT NULL,
+			env_lines INTEGER NOT NULL,
+			env_min_bytes INTEGER,
+			other_bytes INTEGER NOT NULL,
+			map_id INTEGER,
+			npc_x INTEGER,
+			npc_y INTEGER,
+			player_distance INTEGER,
+			player_adjacent INTEGER,
+			others_count INTEGER,
+			others_adjacent INTEGER
+		);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_prompt_sections_map ON prompt_sections(map_id);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_prompt_sections_player ON prompt_sections(player_adjacent, player_distance);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_prompt_sections_distance ON prompt_sections(player_distance);
+		"""
+	)
+
+	# Each response parsed like the plugin does (see responses.parse)
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS response_actions (
+			interaction_id INTEGER PRIMARY KEY REFERENCES interactions(id) ON DELETE CASCADE,
+			action_type TEXT,
+			goal_status TEXT,
+			parse_error INTEGER NOT NULL,
+			lenient INTEGER NOT NULL,
+			target_x INTEGER,
+			target_y INTEGER,
+			item_id INTEGER,
+			coins INTEGER,
+			wait_ms INTEGER,
+			switch_id INTEGER
+		);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_response_actions_type ON response_actions(action_type);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_response_actions_goal ON response_actions(goal_status);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_response_actions_error ON response_actions(parse_error);
+		"""
+	)
+
+	_create_search_index(conn)
+
+	# Near-duplicate response clusters (see clustering and cluster_responses).
+	# A cluster keeps the signature of its first response; buckets are its
+	# LSH band keys.
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS response_clusters (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			situation_id TEXT,
+			signature BLOB NOT NULL
+		);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS cluster_members (
+			interaction_id INTEGER PRIMARY KEY REFERENCES interactions(id) ON DELETE CASCADE,
+			cluster_id INTEGER NOT NULL REFERENCES response_clusters(id) ON DELETE CASCADE
+		);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_cluster_members_cluster ON cluster_members(cluster_id);
+		"""
+	)
+	cur.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS cluster_buckets (
+			bucket INTEGER NOT NULL,
+			cluster_id INTEGER NOT NULL REFERENCES response_clusters(id) ON DELETE CASCADE,
+			PRIMARY KEY (bucket, cluster_id)
+		) WITHOUT ROWID;
+		"""
+	)
+	# Deleting a group cascades to its buckets
+	cur.execute(
+		"""
+		CREATE INDEX IF NOT EXISTS idx_cluster_buckets_cluster ON cluster_buckets(cluster_id);
+		"""
+	)
+
+	_create_import_batches(conn)
 
 	cur.execute(
 		"INSERT OR REPLACE INTO meta(key,value) VALUES('schema_version', ?);",
-		(str(SCHEMA_VERSION),),
+		(str(BASELINE_VERSION),),
 	)
 	conn.commit()
 
@@ -168,8 +530,112 @@ def session_checksum(payload: dict) -> str:
 	return hashlib.sha256(blob).hexdigest()
 
 
+@dataclass
+class ImportBatch:
+	"""One import, recorded in import_batches.
+
+	Imports that go on for a while (watching a folder, the collector) keep
+	one batch and add to its counts each time they write.
+	"""
+	kind: str
+	source: str
+	id: str = field(default_factory=new_import_batch_id)
+	started_at: str = field(default_factory=utc_now_iso)
+
+
+def _create_import_batches(conn: sqlite3.Connection) -> None:
+	exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'import_batches'").fetchone()
+	conn.execute(
+		"""
+		CREATE TABLE IF NOT EXISTS import_batches (
+			id TEXT PRIMARY KEY,
+			kind TEXT NOT NULL,
+			source TEXT,
+			started_at TEXT NOT NULL,
+			duration_ms REAL,
+			bytes_read INTEGER NOT NULL DEFAULT 0,
+			calls INTEGER NOT NULL DEFAULT 0,
+			sessions INTEGER NOT NULL DEFAULT 0,
+			interactions INTEGER NOT NULL DEFAULT 0,
+			skipped INTEGER NOT NULL DEFAULT 0
+		)
+		"""
+	)
+	conn.execute("CREATE INDEX IF NOT EXISTS idx_import_batches_started ON import_batches(started_at)")
+	if not exists:
+		for name in ("interaction_batches", "import_batch_calls", "import_batch_sessions"):
+			schedule_backfill(conn, name)
+
+
+@instrumented
+def record_import_batch(
+	conn: sqlite3.Connection,
+	batch: ImportBatch,
+	duration_ms: float,
+	*,
+	bytes_read: int = 0,
+	calls: int = 0,
+	sessions: int = 0,
+	interactions: int = 0,
+	skipped: int = 0,
+) -> None:
+	"""Add one write of ``batch`` to import_batches; call in its transaction."""
+	if not (calls or sessions or interactions or skipped):
+		return
+	conn.execute(
+		"""
+		INSERT INTO import_batches(id, kind, source, started_at, duration_ms, bytes_read, calls, sessions, interactions, skipped)
+		VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+		ON CONFLICT(id) DO UPDATE SET
+			duration_ms = COALESCE(duration_ms, 0) + excluded.duration_ms,
+			bytes_read = bytes_read + excluded.bytes_read,
+			calls = calls + excluded.calls,
+			sessions = sessions + excluded.sessions,
+			interactions = interactions + excluded.interactions,
+			skipped = skipped + excluded.skipped
+		""",
+		(batch.id, batch.kind, batch.source, batch.started_at, duration_ms, bytes_read, calls, sessions, interactions, skipped),
+	)
+
+
+@cached_query
+@instrumented
+def fetch_import_batches(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+	return conn.execute("SELECT * FROM import_batches ORDER BY started_at DESC").fetchall()
+
+
+def fetch_session_by_guid(conn: sqlite3.Connection, session_guid: str) -> Optional[sqlite3.Row]:
+	"""Latest session with ``session_guid`` and the index of its last interaction."""
+	return conn.execute(
+		"""
+		SELECT id, import_batch_id,
+			(SELECT MAX(index_in_session) FROM interactions WHERE session_id = sessions.id) AS last_index
+		FROM sessions
+		WHERE session_guid = ?
+		ORDER BY id DESC
+		LIMIT 1
+		""",
+		(session_guid,),
+	).fetchone()
+
+
+def fetch_session_indexes(conn: sqlite3.Connection, session_id: int) -> Set[int]:
+	"""Indexes of the interactions stored for a session."""
+	return {
+		int(r[0])
+		for r in conn.execute("SELECT index_in_session FROM interactions WHERE session_id = ? AND index_in_session IS NOT NULL", (session_id,))
+	}
+
+
+def fetch_last_source_line(conn: sqlite3.Connection, source_file: str) -> int:
+	"""Highest line number imported from ``source_file`` into llm_calls (0 if none)."""
+	row = conn.execute("SELECT MAX(source_line_no) FROM llm_calls WHERE source_file = ?", (source_file,)).fetchone()
+	return int(row[0] or 0)
+
+
 # Inserts
 
+@instrumented
 def insert_llm_calls(
 	conn: sqlite3.Connection,
 	rows: Iterable[Dict[str, object]],
@@ -184,6 +650,7 @@ def insert_llm_calls(
 	)
 
 
+@instrumented
 def insert_session_with_interactions(
 	conn: sqlite3.Connection,
 	session_row: Dict[str, object],
@@ -198,29 +665,145 @@ def insert_session_with_interactions(
 		session_row,
 	)
 	session_id = int(cur.lastrowid)
+	_insert_interactions(conn, session_id, interactions_rows, str(session_row["import_batch_id"]))
+	return session_id
+
+
+@instrumented
+def append_session_interactions(
+	conn: sqlite3.Connection,
+	session_id: int,
+	interactions_rows: Iterable[Dict[str, object]],
+	import_batch_id: str,
+	checksum: Optional[str] = None,
+) -> None:
+	"""Add interactions to an imported session whose file has grown.
+
+	``checksum`` is that of the grown file, so importing it again is
+	recognized as a duplicate.
+	"""
+	if checksum is not None:
+		conn.execute("UPDATE sessions SET checksum = ? WHERE id = ?", (checksum, session_id))
+	_insert_interactions(conn, session_id, interactions_rows, import_batch_id)
+
+
+def _insert_interactions(
+	conn: sqlite3.Connection,
+	session_id: int,
+	interactions_rows: Iterable[Dict[str, object]],
+	import_batch_id: str,
+) -> None:
+	cur = conn.cursor()
 	rows = []
+	sections: List[Optional[Dict[str, object]]] = []
+	actions: List[Optional[Dict[str, object]]] = []
+	cache = _BlobCache()
 	for r in interactions_rows:
 		r = dict(r)
+		sections.append(r.pop("sections", None))
+		actions.append(r.pop("action", None))
 		r["session_id"] = session_id
+		r["import_batch_id"] = import_batch_id
+		r.setdefault("prompt_tokens", None)
+		r.setdefault("response_tokens", None)
+		r["prompt_blob_id"] = _store_text_blob(conn, str(r["prompt"]), cache, f"prompt:{r['situation_id']}")
+		r["response_blob_id"] = _store_text_blob(conn, str(r["response"]), cache)
+		r["prompt"] = ""
+		r["response"] = ""
 		rows.append(r)
+	last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM interactions").fetchone()[0]
 	cur.executemany(
 		"""
-		INSERT INTO interactions(session_id, interaction_timestamp, offset_ms, situation_id, prompt, response, comment, rating, llm_name, index_in_session, extra)
-		VALUES(:session_id, :interaction_timestamp, :offset_ms, :situation_id, :prompt, :response, :comment, :rating, :llm_name, :index_in_session, :extra)
+		INSERT INTO interactions(session_id, interaction_timestamp, offset_ms, situation_id, prompt, response, comment, rating, llm_name, index_in_session, extra, prompt_blob_id, response_blob_id, prompt_tokens, response_tokens, import_batch_id)
+		VALUES(:session_id, :interaction_timestamp, :offset_ms, :situation_id, :prompt, :response, :comment, :rating, :llm_name, :index_in_session, :extra, :prompt_blob_id, :response_blob_id, :prompt_tokens, :response_tokens, :import_batch_id)
 		""",
 		rows,
 	)
-	return session_id
+	# New rowids are above every existing one and follow insertion order
+	ids = [r[0] for r in conn.execute("SELECT id FROM interactions WHERE session_id = ? AND id > ? ORDER BY id", (session_id, last_id))]
+	_insert_prompt_sections(conn, [(i, s) for i, s in zip(ids, sections) if s is not None])
+	_insert_response_actions(conn, [(i, a) for i, a in zip(ids, actions) if a is not None])
+
+
+# Per-interaction derived tables: their columns mirror a dataclass
+_PROMPT_SECTION_COLUMNS = [f.name for f in dataclass_fields(prompts.PromptSections)]
+_RESPONSE_ACTION_COLUMNS = [f.name for f in dataclass_fields(responses.ParsedResponse)]
+
+
+def _insert_derived(conn: sqlite3.Connection, table: str, columns: List[str], items: List[Tuple[int, Dict[str, object]]]) -> None:
+	if not items:
+		return
+	cols = ", ".join(columns)
+	params = ", ".join(f":{c}" for c in columns)
+	conn.executemany(
+		f"INSERT OR REPLACE INTO {table}(interaction_id, {cols}) VALUES(:interaction_id, {params})",
+		[dict(values, interaction_id=interaction_id) for interaction_id, values in items],
+	)
+
+
+def _insert_prompt_sections(conn: sqlite3.Connection, items: List[Tuple[int, Dict[str, object]]]) -> None:
+	_insert_derived(conn, "prompt_sections", _PROMPT_SECTION_COLUMNS, items)
+
+
+def _insert_response_actions(conn: sqlite3.Connection, items: List[Tuple[int, Dict[str, object]]]) -> None:
+	_insert_derived(conn, "response_actions", _RESPONSE_ACTION_COLUMNS, items)
+
+
+@dataclass
+class _BlobCache:
+	"""Per-batch lookups so repeated texts skip hashing and compression."""
+	texts: Dict[str, int] = field(default_factory=dict)
+	dicts: Dict[str, Tuple[int, bytes]] = field(default_factory=dict)
+
+	def trim(self, limit: int = 50_000) -> None:
+		if len(self.texts) > limit:
+			self.texts.clear()
+
+
+def _text_dictionary(conn: sqlite3.Connection, name: str, sample: str, cache: _BlobCache) -> Tuple[int, bytes]:
+	"""Return the preset dictionary called ``name``, creating it from ``sample``."""
+	found = cache.dicts.get(name)
+	if found is not None:
+		return found
+	row = conn.execute("SELECT id, data FROM blob_dicts WHERE name = ?", (name,)).fetchone()
+	if row is None:
+		data = blobstore.make_dictionary(sample)
+		cur = conn.execute("INSERT INTO blob_dicts(name, data) VALUES(?, ?)", (name, data))
+		found = (int(cur.lastrowid), data)
+	else:
+		found = (int(row[0]), bytes(row[1]))
+	cache.dicts[name] = found
+	return found
+
+
+def _store_text_blob(conn: sqlite3.Connection, text: str, cache: _BlobCache, dict_name: Optional[str] = None) -> int:
+	"""Return the blob id for ``text``, compressing and inserting it if new."""
+	blob_id = cache.texts.get(text)
+	if blob_id is not None:
+		return blob_id
+	raw = text.encode("utf-8")
+	row = conn.execute("SELECT id FROM blobs WHERE hash = ?", (blobstore.text_hash(raw),)).fetchone()
+	if row is not None:
+		blob_id = int(row[0])
+	else:
+		dict_id, zdict = _text_dictionary(conn, dict_name, text, cache) if dict_name else (None, None)
+		digest, codec, payload, size = blobstore.encode(text, zdict=zdict)
+		cur = conn.execute(
+			"INSERT INTO blobs(hash, codec, size, data, dict_id) VALUES(?, ?, ?, ?, ?)",
+			(digest, codec, size, payload, dict_id if codec != "raw" else None),
+		)
+		blob_id = int(cur.lastrowid)
+	cache.texts[text] = blob_id
+	return blob_id
 
 
 # Queries for UI
 
-def fetch_performance_overview(
-	conn: sqlite3.Connection,
-	llm_filter: Optional[str] = None,
-	date_from_iso: Optional[str] = None,
-	date_to_iso: Optional[str] = None,
-) -> List[sqlite3.Row]:
+def _llm_calls_where(
+	llm_filter: Optional[str],
+	date_from_iso: Optional[str],
+	date_to_iso: Optional[str],
+) -> Tuple[str, List[object]]:
 	conds = []
 	args: List[object] = []
 	if llm_filter:
@@ -233,6 +816,136 @@ def fetch_performance_overview(
 		conds.append("COALESCE(call_timestamp, imported_at) <= ?")
 		args.append(date_to_iso)
 	where = f"WHERE {' AND '.join(conds)}" if conds else ""
+	return where, args
+
+
+def _review_where(
+	llm_name: Optional[str],
+	situation_id: Optional[str],
+	session_timestamp: Optional[str],
+	search: Optional[str] = None,
+	ranked: bool = True,
+) -> Tuple[str, List[object]]:
+	conds = []
+	args: List[object] = []
+	if search:
+		conds.append("interactions_fts MATCH ?" if ranked else "interactions.id IN (SELECT rowid FROM interactions_fts WHERE interactions_fts MATCH ?)")
+		args.append(fts_query(search))
+	if llm_name:
+		conds.append("interactions.llm_name = ?")
+		args.append(llm_name)
+	if situation_id:
+		conds.append("interactions.situation_id = ?")
+		args.append(situation_id)
+	if session_timestamp:
+		conds.append("sessions.session_timestamp = ?")
+		args.append(session_timestamp)
+	where = f"WHERE {' AND '.join(conds)}" if conds else ""
+	return where, args
+
+
+# Prompt/response text resolved from the blob store (needs the joins below)
+_PROMPT_TEXT = "COALESCE(blob_decode(prompt_blob.codec, prompt_blob.data, prompt_dict.data), interactions.prompt)"
+_RESPONSE_TEXT = "COALESCE(blob_decode(response_blob.codec, response_blob.data, response_dict.data), interactions.response)"
+
+# Interaction columns with prompt/response resolved from the blob store and
+# the duration of the linked perf log row. Use this instead of
+# interactions.* wherever rows reach the UI.
+_INTERACTION_COLUMNS = f"""
+	interactions.id, interactions.session_id, interactions.interaction_timestamp,
+	interactions.offset_ms, interactions.situation_id,
+	{_PROMPT_TEXT} AS prompt,
+	{_RESPONSE_TEXT} AS response,
+	interactions.comment, interactions.rating, interactions.llm_name,
+	interactions.index_in_session, interactions.extra,
+	interactions.llm_call_id, llm_calls.duration_ms AS call_duration_ms,
+	interactions.prompt_tokens, interactions.response_tokens,
+	response_actions.action_type, response_actions.goal_status, response_actions.parse_error
+"""
+
+_TEXT_JOINS = """
+	LEFT JOIN blobs AS prompt_blob ON prompt_blob.id = interactions.prompt_blob_id
+	LEFT JOIN blobs AS response_blob ON response_blob.id = interactions.response_blob_id
+	LEFT JOIN blob_dicts AS prompt_dict ON prompt_dict.id = prompt_blob.dict_id
+	LEFT JOIN blob_dicts AS response_dict ON response_dict.id = response_blob.dict_id
+"""
+
+_INTERACTION_JOINS = _TEXT_JOINS + """
+	LEFT JOIN llm_calls ON llm_calls.id = interactions.llm_call_id
+	LEFT JOIN response_actions ON response_actions.interaction_id = interactions.id
+"""
+
+_REVIEW_SQL = f"""
+	SELECT {_INTERACTION_COLUMNS}, sessions.session_timestamp
+	FROM interactions
+	JOIN sessions ON sessions.id = interactions.session_id
+	{_INTERACTION_JOINS}
+	{{where}}
+	ORDER BY COALESCE(interactions.interaction_timestamp, interactions.offset_ms) ASC
+"""
+
+# Full-text variant, best matches first. Matches are ranked on ids alone so
+# only the rows that survive the LIMIT get their text decoded.
+_REVIEW_SEARCH_SQL = f"""
+	WITH hits AS (
+		SELECT interactions_fts.rowid AS id, interactions_fts.rank AS rank
+		FROM interactions_fts
+		JOIN interactions ON interactions.id = interactions_fts.rowid
+		JOIN sessions ON sessions.id = interactions.session_id
+		{{where}}
+		ORDER BY interactions_fts.rank
+		{{limit}}
+	)
+	SELECT {_INTERACTION_COLUMNS}, sessions.session_timestamp
+	FROM hits
+	JOIN interactions ON interactions.id = hits.id
+	JOIN sessions ON sessions.id = interactions.session_id
+	{_INTERACTION_JOINS}
+	ORDER BY hits.rank
+"""
+
+
+# One row per response cluster: its first interaction within the filters,
+# with the cluster's size and ratings there. Unclustered rows stand alone.
+_REVIEW_GROUPED_SQL = f"""
+	WITH reps AS (
+		SELECT MIN(interactions.id) AS id,
+			cluster_members.cluster_id AS cluster_id,
+			COUNT(*) AS cluster_size,
+			SUM(interactions.rating = 'okay') AS cluster_okay,
+			SUM(interactions.rating = 'not_okay') AS cluster_not_okay
+		FROM interactions
+		JOIN sessions ON sessions.id = interactions.session_id
+		LEFT JOIN cluster_members ON cluster_members.interaction_id = interactions.id
+		{{where}}
+		GROUP BY COALESCE(cluster_members.cluster_id, -interactions.id)
+	)
+	SELECT {_INTERACTION_COLUMNS}, sessions.session_timestamp,
+		reps.cluster_id, reps.cluster_size, reps.cluster_okay, reps.cluster_not_okay
+	FROM reps
+	JOIN interactions ON interactions.id = reps.id
+	JOIN sessions ON sessions.id = interactions.session_id
+	{_INTERACTION_JOINS}
+	ORDER BY reps.cluster_size DESC, COALESCE(interactions.interaction_timestamp, interactions.offset_ms) ASC
+"""
+
+
+def _review_sql(where: str, search: Optional[str], limit: Optional[int]) -> str:
+	if search:
+		return _REVIEW_SEARCH_SQL.format(where=where, limit=f"LIMIT {int(limit)}" if limit else "")
+	sql = _REVIEW_SQL.format(where=where)
+	return sql + (f" LIMIT {int(limit)}" if limit else "")
+
+
+@cached_query
+@instrumented
+def fetch_performance_overview(
+	conn: sqlite3.Connection,
+	llm_filter: Optional[str] = None,
+	date_from_iso: Optional[str] = None,
+	date_to_iso: Optional[str] = None,
+) -> List[sqlite3.Row]:
+	where, args = _llm_calls_where(llm_filter, date_from_iso, date_to_iso)
 	return list(
 		conn.execute(
 			f"""
@@ -251,11 +964,14 @@ def fetch_performance_overview(
 	)
 
 
+@cached_query
+@instrumented
 def fetch_sessions(conn: sqlite3.Connection) -> List[sqlite3.Row]:
 	return list(
 		conn.execute(
 			"""
-			SELECT id, session_guid, session_timestamp, llm_name, source_file, imported_at
+			SELECT id, session_guid, session_timestamp, llm_name, source_file, imported_at,
+				(SELECT COUNT(*) FROM interactions i WHERE i.session_id = sessions.id) AS interaction_count
 			FROM sessions
 			ORDER BY COALESCE(session_timestamp, imported_at) DESC
 			"""
@@ -263,20 +979,24 @@ def fetch_sessions(conn: sqlite3.Connection) -> List[sqlite3.Row]:
 	)
 
 
+@cached_query
+@instrumented
 def fetch_interactions_for_session(conn: sqlite3.Connection, session_id: int) -> List[sqlite3.Row]:
 	return list(
 		conn.execute(
-			"""
-			SELECT *
+			f"""
+			SELECT {_INTERACTION_COLUMNS}
 			FROM interactions
-			WHERE session_id = ?
-			ORDER BY offset_ms ASC, COALESCE(index_in_session, 0) ASC
+			{_INTERACTION_JOINS}
+			WHERE interactions.session_id = ?
+			ORDER BY interactions.offset_ms ASC, COALESCE(interactions.index_in_session, 0) ASC
 			""",
 			(session_id,),
 		)
 	)
 
 
+@instrumented
 def update_interaction_annotation(
 	conn: sqlite3.Connection,
 	interaction_id: int,
@@ -290,6 +1010,19 @@ def update_interaction_annotation(
     conn.commit()
 
 
+@instrumented
+def update_cluster_rating(conn: sqlite3.Connection, cluster_id: int, rating: Optional[str]) -> int:
+	"""Set the rating of every interaction in a response cluster; returns how many."""
+	cur = conn.execute(
+		"UPDATE interactions SET rating = ? WHERE id IN (SELECT interaction_id FROM cluster_members WHERE cluster_id = ?)",
+		(rating, cluster_id),
+	)
+	conn.commit()
+	return cur.rowcount
+
+
+@cached_query
+@instrumented
 def fetch_llm_and_situations(conn: sqlite3.Connection) -> Tuple[List[str], List[str]]:
 	llms = [r[0] for r in conn.execute("SELECT DISTINCT llm_name FROM sessions ORDER BY llm_name")] + [
 			r[0] for r in conn.execute("SELECT DISTINCT llm_name FROM interactions WHERE llm_name IS NOT NULL ORDER BY llm_name")
@@ -305,65 +1038,54 @@ def fetch_llm_and_situations(conn: sqlite3.Connection) -> Tuple[List[str], List[
 	return unique_llms, situations
 
 
+@cached_query
+@instrumented
 def fetch_review(
 	conn: sqlite3.Connection,
 	llm_name: Optional[str],
 	situation_id: Optional[str],
 	session_timestamp: Optional[str] = None,
+	search: Optional[str] = None,
+	limit: Optional[int] = None,
+	grouped: bool = False,
 ) -> Tuple[int, int, List[sqlite3.Row]]:
-	conds = []
-	args: List[object] = []
-	if llm_name:
-		conds.append("interactions.llm_name = ?")
-		args.append(llm_name)
-	if situation_id:
-		conds.append("interactions.situation_id = ?")
-		args.append(situation_id)
-	if session_timestamp:
-		conds.append("sessions.session_timestamp = ?")
-		args.append(session_timestamp)
-	where = f"WHERE {' AND '.join(conds)}" if conds else ""
-	rows = list(
-		conn.execute(
-			f"""
-			SELECT interactions.*, sessions.session_timestamp
-			FROM interactions
-			JOIN sessions ON sessions.id = interactions.session_id
-			{where}
-			ORDER BY COALESCE(interactions.interaction_timestamp, interactions.offset_ms) ASC
-			""",
-			args,
-		)
-	)
+	"""Interactions matching the filters; with ``search``, full-text matches ranked best first.
+
+	``grouped`` returns one representative per response cluster, largest
+	first, with cluster_id/cluster_size columns; the okay/not_okay counts
+	then cover all members.
+	"""
+	if grouped:
+		where, args = _review_where(llm_name, situation_id, session_timestamp, search, ranked=False)
+		sql = _REVIEW_GROUPED_SQL.format(where=where) + (f" LIMIT {int(limit)}" if limit else "")
+		rows = list(conn.execute(sql, args))
+		okay = sum(int(r["cluster_okay"] or 0) for r in rows)
+		not_okay = sum(int(r["cluster_not_okay"] or 0) for r in rows)
+		return okay, not_okay, rows
+	where, args = _review_where(llm_name, situation_id, session_timestamp, search)
+	rows = list(conn.execute(_review_sql(where, search, limit), args))
 	okay = sum(1 for r in rows if r["rating"] == "okay")
 	not_okay = sum(1 for r in rows if r["rating"] == "not_okay")
 	return okay, not_okay, rows
 
 
+@cached_query
+@instrumented
 def fetch_session_timestamps(conn: sqlite3.Connection) -> List[str]:
 	"""Get all distinct session timestamps."""
 	rows = list(conn.execute("SELECT DISTINCT session_timestamp FROM sessions WHERE session_timestamp IS NOT NULL ORDER BY session_timestamp DESC"))
 	return [r[0] for r in rows]
 
 
+@cached_query
+@instrumented
 def fetch_durations_grouped(
 	conn: sqlite3.Connection,
 	llm_filter: Optional[str] = None,
 	date_from_iso: Optional[str] = None,
 	date_to_iso: Optional[str] = None,
 ) -> Dict[str, List[int]]:
-	conds = []
-	args: List[object] = []
-	if llm_filter:
-		conds.append("llm_name LIKE ?")
-		args.append(f"%{llm_filter}%")
-	if date_from_iso:
-		conds.append("COALESCE(call_timestamp, imported_at) >= ?")
-		args.append(date_from_iso)
-	if date_to_iso:
-		conds.append("COALESCE(call_timestamp, imported_at) <= ?")
-		args.append(date_to_iso)
-	where = f"WHERE {' AND '.join(conds)}" if conds else ""
+	where, args = _llm_calls_where(llm_filter, date_from_iso, date_to_iso)
 	rows = conn.execute(
 		f"SELECT llm_name, duration_ms FROM llm_calls {where} ORDER BY llm_name",
 		args,
@@ -376,3 +1098,1570 @@ def fetch_durations_grouped(
 			continue
 		result.setdefault(name, []).append(d)
 	return result
+
+
+@cached_query
+@instrumented
+def fetch_call_spans(
+	conn: sqlite3.Connection,
+	llm_filter: Optional[str] = None,
+	date_from_iso: Optional[str] = None,
+	date_to_iso: Optional[str] = None,
+) -> Dict[str, Tuple[List[int], List[int]]]:
+	"""llm_name -> (end epoch ms, duration_ms) of each call with a timestamp."""
+	where, args = _llm_calls_where(llm_filter, date_from_iso, date_to_iso)
+	where = f"{where} AND" if where else "WHERE"
+	rows = conn.execute(
+		f"""
+		SELECT llm_name, {_epoch_ms_sql("call_timestamp")}, duration_ms
+		FROM llm_calls
+		{where} call_timestamp IS NOT NULL AND duration_ms IS NOT NULL
+		""",
+		args,
+	)
+	result: Dict[str, Tuple[List[int], List[int]]] = {}
+	for name, end_ms, duration_ms in rows:
+		if end_ms is None:
+			continue
+		ends, durations = result.setdefault(name, ([], []))
+		ends.append(end_ms)
+		durations.append(duration_ms)
+	return result
+
+
+@cached_query
+@instrumented
+def fetch_duration_counts(conn: sqlite3.Connection, llm_name: str, situation_id: Optional[str] = None) -> List[Tuple[int, int]]:
+	"""(duration_ms, calls) of one LLM by ascending duration.
+
+	With ``situation_id`` only calls linked to that NPC's interactions count.
+	"""
+	if situation_id:
+		rows = conn.execute(
+			"""
+			SELECT llm_calls.duration_ms, COUNT(*)
+			FROM interactions JOIN llm_calls ON llm_calls.id = interactions.llm_call_id
+			WHERE interactions.situation_id = ? AND llm_calls.llm_name = ? AND llm_calls.duration_ms IS NOT NULL
+			GROUP BY llm_calls.duration_ms
+			ORDER BY llm_calls.duration_ms
+			""",
+			(situation_id, llm_name),
+		)
+	else:
+		rows = conn.execute(
+			"SELECT duration_ms, COUNT(*) FROM llm_calls WHERE llm_name = ? AND duration_ms IS NOT NULL GROUP BY duration_ms ORDER BY duration_ms",
+			(llm_name,),
+		)
+	return [(int(r[0]), int(r[1])) for r in rows]
+
+
+@cached_query
+@instrumented
+def fetch_rating_counts(conn: sqlite3.Connection, llm_name: str, situation_id: Optional[str] = None) -> Tuple[int, int]:
+	"""(okay, not_okay) ratings of one LLM's interactions, optionally of one NPC."""
+	where, args = _review_where(llm_name, situation_id, None)
+	row = conn.execute(
+		f"SELECT COALESCE(SUM(rating = 'okay'), 0), COALESCE(SUM(rating = 'not_okay'), 0) FROM interactions {where}",
+		args,
+	).fetchone()
+	return int(row[0]), int(row[1])
+
+
+# Streaming queries. These yield lists of at most batch_size rows straight
+# from the cursor so callers never hold the full result in memory.
+
+def _iter_batches(cur: sqlite3.Cursor, batch_size: int) -> Iterator[List[sqlite3.Row]]:
+	while True:
+		batch = cur.fetchmany(batch_size)
+		if not batch:
+			return
+		yield batch
+
+
+def iter_review(
+	conn: sqlite3.Connection,
+	llm_name: Optional[str],
+	situation_id: Optional[str],
+	session_timestamp: Optional[str] = None,
+	batch_size: int = 1000,
+	search: Optional[str] = None,
+) -> Iterator[List[sqlite3.Row]]:
+	where, args = _review_where(llm_name, situation_id, session_timestamp, search)
+	return _iter_batches(conn.execute(_review_sql(where, search, None), args), batch_size)
+
+
+def iter_llm_calls(
+	conn: sqlite3.Connection,
+	llm_filter: Optional[str] = None,
+	date_from_iso: Optional[str] = None,
+	date_to_iso: Optional[str] = None,
+	batch_size: int = 1000,
+) -> Iterator[List[sqlite3.Row]]:
+	where, args = _llm_calls_where(llm_filter, date_from_iso, date_to_iso)
+	cur = conn.execute(
+		f"""
+		SELECT id, llm_name, call_timestamp, duration_ms, source_file, source_line_no, imported_at, import_batch_id
+		FROM llm_calls
+		{where}
+		ORDER BY id
+		""",
+		args,
+	)
+	return _iter_batches(cur, batch_size)
+
+
+def iter_prompts_in_session_order(conn: sqlite3.Connection, batch_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+	"""Prompts grouped by session and NPC, each group in the order they were sent."""
+	cur = conn.execute(
+		f"""
+		SELECT interactions.id, interactions.session_id, interactions.llm_name, interactions.situation_id,
+			interactions.prompt_tokens, {_PROMPT_TEXT} AS prompt
+		FROM interactions
+		{_INTERACTION_JOINS}
+		ORDER BY interactions.session_id, interactions.situation_id, interactions.offset_ms,
+			COALESCE(interactions.index_in_session, 0)
+		"""
+	)
+	return _iter_batches(cur, batch_size)
+
+
+def iter_prompt_responses(conn: sqlite3.Connection, batch_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+	"""Every recorded prompt with its response, oldest first."""
+	cur = conn.execute(
+		f"""
+		SELECT interactions.id, interactions.llm_name, interactions.situation_id,
+			{_PROMPT_TEXT} AS prompt, {_RESPONSE_TEXT} AS response
+		FROM interactions
+		{_TEXT_JOINS}
+		ORDER BY interactions.id
+		"""
+	)
+	return _iter_batches(cur, batch_size)
+
+
+def database_path(conn: sqlite3.Connection) -> Optional[Path]:
+	"""File backing the connection's main database, None for in-memory."""
+	for row in conn.execute("PRAGMA database_list"):
+		if row[1] == "main":
+			return Path(row[2]) if row[2] else None
+	return None
+
+
+# Blob storage maintenance
+
+@instrumented
+def migrate_interaction_text_to_blobs(
+	conn: sqlite3.Connection,
+	batch_size: int = 2000,
+	progress=None,
+) -> int:
+	"""Move inline prompt/response text of older rows into the blob store.
+
+	Works in id order and commits after every batch, so an interrupted run
+	resumes where it stopped. Returns the number of rows migrated.
+	"""
+	migrated = 0
+	last_id = 0
+	cache = _BlobCache()
+	while True:
+		rows = conn.execute(
+			"""
+			SELECT id, situation_id, prompt, response FROM interactions
+			WHERE id > ? AND prompt_blob_id IS NULL
+			ORDER BY id LIMIT ?
+			""",
+			(last_id, batch_size),
+		).fetchall()
+		if not rows:
+			break
+		with transaction(conn):
+			updates = []
+			for r in rows:
+				updates.append((
+					_store_text_blob(conn, r["prompt"], cache, f"prompt:{r['situation_id']}"),
+					_store_text_blob(conn, r["response"], cache),
+					r["id"],
+				))
+			conn.executemany(
+				"UPDATE interactions SET prompt_blob_id = ?, response_blob_id = ?, prompt = '', response = '' WHERE id = ?",
+				updates,
+			)
+		last_id = int(rows[-1]["id"])
+		migrated += len(rows)
+		cache.trim()
+		if progress is not None:
+			progress(migrated)
+	return migrated
+
+
+@instrumented
+def fetch_blob_storage_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+	"""Logical vs. stored size of interaction text.
+
+	``logical_bytes`` is what the text would take stored inline per
+	interaction, ``stored_bytes`` what blobs plus any remaining inline text
+	actually take.
+	"""
+	row = conn.execute(
+		"""
+		SELECT
+			COUNT(*) AS interactions,
+			COALESCE(SUM(COALESCE(p.size, LENGTH(CAST(i.prompt AS BLOB)))), 0)
+				+ COALESCE(SUM(COALESCE(r.size, LENGTH(CAST(i.response AS BLOB)))), 0) AS logical_bytes,
+			COALESCE(SUM(CASE WHEN i.prompt_blob_id IS NULL THEN LENGTH(CAST(i.prompt AS BLOB)) + LENGTH(CAST(i.response AS BLOB)) ELSE 0 END), 0) AS inline_bytes,
+			COALESCE(SUM(i.prompt_blob_id IS NULL), 0) AS inline_rows
+		FROM interactions AS i
+		LEFT JOIN blobs AS p ON p.id = i.prompt_blob_id
+		LEFT JOIN blobs AS r ON r.id = i.response_blob_id
+		"""
+	).fetchone()
+	blobs = conn.execute(
+		"""
+		SELECT COUNT(*), COALESCE(SUM(size), 0),
+			COALESCE(SUM(LENGTH(data)), 0) + (SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blob_dicts)
+		FROM blobs
+		"""
+	).fetchone()
+	return {
+		"interactions": int(row["interactions"]),
+		"inline_rows": int(row["inline_rows"]),
+		"blobs": int(blobs[0]),
+		"unique_bytes": int(blobs[1]),
+		"logical_bytes": int(row["logical_bytes"]),
+		"stored_bytes": int(blobs[2]) + int(row["inline_bytes"]),
+	}
+
+
+# Storage and retention
+
+# A batched write aims to hold the write lock about this long, and pauses
+# this long between batches so the GUI and imports get their turn
+MAX_LOCK_S = 0.2
+BATCH_PAUSE_S = 0.02
+_MIN_BATCH = 50
+# Page cache while rolling back an import or merging another database
+BULK_CACHE_KIB = 64 * 1024
+_MAX_BATCH = 50_000
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def run_in_batches(step: Callable[[int], int], batch_size: int = 500, progress=None) -> int:
+	"""Call ``step(limit)`` until it returns 0; returns the sum of its results.
+
+	``step`` handles at most ``limit`` rows in one transaction. The limit
+	is scaled so that a full batch takes about :data:`MAX_LOCK_S`.
+	"""
+	total = 0
+	while True:
+		t0 = time.perf_counter()
+		n = step(batch_size)
+		if n <= 0:
+			return total
+		total += n
+		if progress is not None:
+			progress(total)
+		elapsed = time.perf_counter() - t0
+		if n >= batch_size:
+			scale = min(2.0, max(0.5, MAX_LOCK_S / elapsed)) if elapsed > 0 else 2.0
+			batch_size = min(_MAX_BATCH, max(_MIN_BATCH, int(batch_size * scale)))
+		time.sleep(BATCH_PAUSE_S)
+
+
+@instrumented
+def fetch_storage_settings(conn: sqlite3.Connection) -> Dict[str, object]:
+	page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+	return {
+		"page_size": page_size,
+		"file_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+		"free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+		"auto_vacuum": AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "none"),
+		"journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+	}
+
+
+@instrumented
+def fetch_storage_objects(conn: sqlite3.Connection) -> Optional[List[sqlite3.Row]]:
+	"""Pages and bytes of every table and index, largest first.
+
+	None if SQLite was built without the ``dbstat`` table. Reads every page
+	of the file.
+	"""
+	try:
+		return conn.execute(
+			"""
+			SELECT s.name, COALESCE(m.tbl_name, s.name) AS tbl_name, COALESCE(m.type, 'table') AS type,
+				COUNT(*) AS pages, SUM(s.pgsize) AS bytes, SUM(s.payload) AS payload_bytes, SUM(s.unused) AS unused_bytes
+			FROM dbstat AS s
+			LEFT JOIN sqlite_master AS m ON m.name = s.name
+			GROUP BY s.name
+			ORDER BY bytes DESC
+			"""
+		).fetchall()
+	except sqlite3.OperationalError:
+		return None
+
+
+def storage_tables(conn: sqlite3.Connection) -> List[str]:
+	"""Ordinary tables, without SQLite's own and the search index's shadow tables."""
+	rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+	virtual = [r["name"] for r in rows if (r["sql"] or "").upper().startswith("CREATE VIRTUAL")]
+	return [r["name"] for r in rows if r["name"] not in virtual and not any(r["name"].startswith(v + "_") for v in virtual)]
+
+
+@instrumented
+def fetch_column_sizes(conn: sqlite3.Connection, table: str) -> Tuple[int, Dict[str, int]]:
+	"""(rows, bytes per column) of ``table``; numbers count as 8 bytes."""
+	columns = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+	sums = ", ".join(
+		f"COALESCE(SUM(CASE typeof(\"{c}\") WHEN 'null' THEN 0 WHEN 'integer' THEN 8 WHEN 'real' THEN 8 "
+		f"ELSE LENGTH(CAST(\"{c}\" AS BLOB)) END), 0)"
+		for c in columns
+	)
+	row = conn.execute(f"SELECT COUNT(*), {sums} FROM \"{table}\"").fetchone()
+	return int(row[0]), dict(zip(columns, (int(v) for v in row[1:])))
+
+
+@instrumented
+def clear_raw_lines(conn: sqlite3.Connection, before_iso: str, progress=None) -> int:
+	"""Drop the stored log line of calls made before ``before_iso``; returns rows changed."""
+	last_id = 0
+
+	def step(limit: int) -> int:
+		nonlocal last_id
+		with transaction(conn):
+			hi = conn.execute(
+				"""
+				SELECT MAX(id) FROM (
+					SELECT id FROM llm_calls
+					WHERE id > ? AND raw_line IS NOT NULL AND COALESCE(call_timestamp, imported_at) < ?
+					ORDER BY id LIMIT ?
+				)
+				""",
+				(last_id, before_iso, limit),
+			).fetchone()[0]
+			if hi is None:
+				return 0
+			changed = conn.execute(
+				"""
+				UPDATE llm_calls SET raw_line = NULL
+				WHERE id > ? AND id <= ? AND raw_line IS NOT NULL AND COALESCE(call_timestamp, imported_at) < ?
+				""",
+				(last_id, hi, before_iso),
+			).rowcount
+		last_id = hi
+		return changed
+
+	return run_in_batches(step, batch_size=5000, progress=progress)
+
+
+@instrumented
+def fetch_unrated_interactions(conn: sqlite3.Connection, before_iso: str, after_id: int, limit: int) -> List[sqlite3.Row]:
+	"""Interactions without rating or comment from before ``before_iso``, with their text and session."""
+	return conn.execute(
+		f"""
+		SELECT interactions.id, sessions.session_guid, sessions.session_timestamp, sessions.source_file,
+			interactions.interaction_timestamp, interactions.offset_ms, interactions.situation_id,
+			interactions.llm_name, interactions.index_in_session,
+			{_PROMPT_TEXT} AS prompt, {_RESPONSE_TEXT} AS response,
+			interactions.extra, interactions.prompt_tokens, interactions.response_tokens, llm_calls.duration_ms
+		FROM interactions
+		JOIN sessions ON sessions.id = interactions.session_id
+		{_TEXT_JOINS}
+		LEFT JOIN llm_calls ON llm_calls.id = interactions.llm_call_id
+		WHERE interactions.id > ? AND interactions.rating IS NULL AND COALESCE(interactions.comment, '') = ''
+			AND COALESCE(interactions.interaction_timestamp, sessions.session_timestamp, sessions.imported_at) < ?
+		ORDER BY interactions.id LIMIT ?
+		""",
+		(after_id, before_iso, limit),
+	).fetchall()
+
+
+@instrumented
+def delete_interactions(conn: sqlite3.Connection, ids: List[int]) -> int:
+	"""Delete interactions along with what only they used; call inside a transaction.
+
+	Prompt sections, parsed actions, group membership and search entries
+	go with each row. Blobs and response groups no other interaction uses
+	and sessions left without interactions are deleted too.
+	"""
+	if not ids:
+		return 0
+	conn.execute("CREATE TEMP TABLE IF NOT EXISTS doomed (kind TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (kind, id)) WITHOUT ROWID")
+	conn.execute("DELETE FROM temp.doomed")
+	conn.executemany("INSERT OR IGNORE INTO temp.doomed(kind, id) VALUES('interaction', ?)", [(i,) for i in ids])
+	conn.execute(
+		"""
+		INSERT OR IGNORE INTO temp.doomed(kind, id)
+		SELECT 'blob', prompt_blob_id FROM interactions WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'interaction') AND prompt_blob_id IS NOT NULL
+		UNION SELECT 'blob', response_blob_id FROM interactions WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'interaction') AND response_blob_id IS NOT NULL
+		UNION SELECT 'session', session_id FROM interactions WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'interaction')
+		UNION SELECT 'cluster', cluster_id FROM cluster_members WHERE interaction_id IN (SELECT id FROM temp.doomed WHERE kind = 'interaction')
+		"""
+	)
+	deleted = conn.execute("DELETE FROM interactions WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'interaction')").rowcount
+	conn.execute(
+		"""
+		DELETE FROM blobs WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'blob')
+			AND NOT EXISTS (SELECT 1 FROM interactions WHERE prompt_blob_id = blobs.id)
+			AND NOT EXISTS (SELECT 1 FROM interactions WHERE response_blob_id = blobs.id)
+		"""
+	)
+	conn.execute(
+		"""
+		DELETE FROM response_clusters WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'cluster')
+			AND NOT EXISTS (SELECT 1 FROM cluster_members WHERE cluster_id = response_clusters.id)
+		"""
+	)
+	conn.execute(
+		"""
+		DELETE FROM sessions WHERE id IN (SELECT id FROM temp.doomed WHERE kind = 'session')
+			AND NOT EXISTS (SELECT 1 FROM interactions WHERE session_id = sessions.id)
+		"""
+	)
+	conn.execute("DELETE FROM temp.doomed")
+	return deleted
+
+
+def _batch_spans(conn: sqlite3.Connection, batch_id: str) -> List[Tuple[str, Optional[int], Optional[int]]]:
+	"""Time ranges of the batch's calls, whose interactions need relinking."""
+	call_ms = _epoch_ms_sql("call_timestamp")
+	return [
+		(r[0], r[1], r[2])
+		for r in conn.execute(
+			f"""
+			SELECT llm_name, MIN({call_ms}), MAX({call_ms})
+			FROM llm_calls WHERE import_batch_id = ? AND call_timestamp IS NOT NULL
+			GROUP BY llm_name
+			""",
+			(batch_id,),
+		)
+	]
+
+
+@instrumented
+def rollback_import_batch(conn: sqlite3.Connection, batch_id: str, progress=None) -> Dict[str, int]:
+	"""Delete everything import ``batch_id`` added, in short transactions.
+
+	That is its calls, its sessions with all their interactions (also
+	those appended later by other imports) and the interactions it
+	appended to other sessions, along with their derived rows (see
+	:func:`delete_interactions`). Interactions that were linked to the
+	deleted calls are matched again against the calls that are left.
+	Sessions that lose appended interactions get a checksum no file has,
+	so importing their file again adds them back. Interrupted, it can be
+	run again to finish.
+	"""
+	# Deletes touch pages all over the indexes. With the default cache they
+	# spill to the file mid-transaction, which locks readers (the GUI) out
+	# until the commit instead of only during it.
+	cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+	conn.execute(f"PRAGMA cache_size = {-BULK_CACHE_KIB}")
+	try:
+		return _rollback_import_batch(conn, batch_id, progress or (lambda _msg: None))
+	finally:
+		conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+
+
+def _rollback_import_batch(conn: sqlite3.Connection, batch_id: str, say: Callable[[str], None]) -> Dict[str, int]:
+	result = {"interactions": 0, "sessions": 0, "calls": 0, "relinked": 0}
+	spans = _batch_spans(conn, batch_id)
+
+	def delete_where(sql: str, args: Tuple[object, ...]) -> Callable[[int], int]:
+		def step(limit: int) -> int:
+			with transaction(conn):
+				ids = [r[0] for r in conn.execute(sql + " LIMIT ?", args + (limit,))]
+				deleted = delete_interactions(conn, ids)
+			if deleted:
+				result["interactions"] += deleted
+				say(f"Deleted {result['interactions']} interactions")
+			return deleted
+		return step
+
+	result["sessions"] = conn.execute("SELECT COUNT(*) FROM sessions WHERE import_batch_id = ?", (batch_id,)).fetchone()[0]
+	# Later imports that only appended to these sessions are left with nothing
+	appenders = [r[0] for r in conn.execute(
+		"""
+		SELECT DISTINCT import_batch_id FROM interactions
+		WHERE session_id IN (SELECT id FROM sessions WHERE import_batch_id = ?) AND import_batch_id <> ?
+		""",
+		(batch_id, batch_id),
+	)]
+	run_in_batches(delete_where(
+		"SELECT id FROM interactions WHERE session_id IN (SELECT id FROM sessions WHERE import_batch_id = ?)",
+		(batch_id,),
+	))
+	appended_to = [r[0] for r in conn.execute("SELECT DISTINCT session_id FROM interactions WHERE import_batch_id = ?", (batch_id,))]
+	run_in_batches(delete_where("SELECT id FROM interactions WHERE import_batch_id = ?", (batch_id,)))
+	with transaction(conn):
+		# Sessions without any interactions were not deleted with them
+		conn.execute("DELETE FROM sessions WHERE import_batch_id = ?", (batch_id,))
+		conn.executemany(
+			"UPDATE sessions SET checksum = 'rolled back ' || ? || ' ' || id WHERE id = ?",
+			[(batch_id, session_id) for session_id in appended_to],
+		)
+
+	def delete_calls(limit: int) -> int:
+		with transaction(conn):
+			deleted = conn.execute(
+				"DELETE FROM llm_calls WHERE id IN (SELECT id FROM llm_calls WHERE import_batch_id = ? LIMIT ?)",
+				(batch_id, limit),
+			).rowcount
+		if deleted:
+			result["calls"] += deleted
+			say(f"Deleted {result['calls']} calls")
+		return deleted
+
+	run_in_batches(delete_calls, batch_size=5000)
+	with transaction(conn):
+		if spans:
+			say("Linking interactions to the remaining calls")
+			result["relinked"] = link_interactions_to_calls(conn, scopes=spans)
+		conn.execute("DELETE FROM import_batches WHERE id = ?", (batch_id,))
+		conn.executemany(
+			"""
+			DELETE FROM import_batches WHERE id = ?
+				AND NOT EXISTS (SELECT 1 FROM interactions WHERE import_batch_id = import_batches.id)
+				AND NOT EXISTS (SELECT 1 FROM sessions WHERE import_batch_id = import_batches.id)
+				AND NOT EXISTS (SELECT 1 FROM llm_calls WHERE import_batch_id = import_batches.id)
+			""",
+			[(b,) for b in appenders],
+		)
+	return result
+
+
+@instrumented
+def merge_search_index(conn: sqlite3.Connection) -> int:
+	"""Merge the search index's segments, dropping entries of deleted rows.
+
+	Deletes only add tombstones to the index; after large deletes it takes
+	more space than before until merged. Returns the merge steps that did
+	work.
+	"""
+
+	def step(limit: int) -> int:
+		before = conn.total_changes
+		with transaction(conn):
+			conn.execute("INSERT INTO interactions_fts(interactions_fts, rank) VALUES('merge', ?)", (-limit,))
+		# A step that found nothing to merge changes at most one row
+		return 1 if conn.total_changes - before >= 2 else 0
+
+	return run_in_batches(step, batch_size=500)
+
+
+@instrumented
+def incremental_vacuum(conn: sqlite3.Connection, progress=None) -> int:
+	"""Return free pages to the file system; returns the pages freed.
+
+	Only has an effect with ``auto_vacuum=incremental``.
+	"""
+
+	def step(limit: int) -> int:
+		before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+		if not before:
+			return 0
+		conn.execute(f"PRAGMA incremental_vacuum({int(limit)})").fetchall()
+		return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+	return run_in_batches(step, batch_size=2000, progress=progress)
+
+
+@instrumented
+def vacuum_into_incremental(conn: sqlite3.Connection) -> None:
+	"""Rebuild the file with VACUUM, switching it to incremental auto-vacuum.
+
+	Holds an exclusive lock for the whole rebuild; afterwards
+	:func:`incremental_vacuum` shrinks the file without one.
+	"""
+	conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+	conn.execute("VACUUM")
+
+
+# Prompt sections
+
+def _backfill_prompt_sections(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	"""Decompose prompts of interactions imported before prompt_sections existed."""
+	rows = conn.execute(
+		f"""
+		SELECT interactions.id, {_PROMPT_TEXT} AS prompt
+		FROM interactions
+		{_INTERACTION_JOINS}
+		LEFT JOIN prompt_sections ON prompt_sections.interaction_id = interactions.id
+		WHERE interactions.id > ? AND interactions.id <= ? AND prompt_sections.interaction_id IS NULL
+		""",
+		(lo, hi),
+	).fetchall()
+	_insert_prompt_sections(conn, [(int(r["id"]), prompts.decompose(r["prompt"]).as_row()) for r in rows])
+
+
+def _backfill_token_counts(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	"""Count prompt/response tokens of interactions imported without them."""
+	rows = conn.execute(
+		f"""
+		SELECT interactions.id, {_PROMPT_TEXT} AS prompt, {_RESPONSE_TEXT} AS response
+		FROM interactions
+		{_INTERACTION_JOINS}
+		WHERE interactions.id > ? AND interactions.id <= ?
+			AND (interactions.prompt_tokens IS NULL OR interactions.response_tokens IS NULL)
+		""",
+		(lo, hi),
+	).fetchall()
+	conn.executemany(
+		"UPDATE interactions SET prompt_tokens = ?, response_tokens = ? WHERE id = ?",
+		[(tokens.count(r["prompt"]), tokens.count(r["response"]), r["id"]) for r in rows],
+	)
+
+
+def _backfill_response_actions(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	"""Parse responses of interactions imported before response_actions existed."""
+	rows = conn.execute(
+		f"""
+		SELECT interactions.id, {_RESPONSE_TEXT} AS response, prompt_sections.prompt_kind
+		FROM interactions
+		{_INTERACTION_JOINS}
+		LEFT JOIN prompt_sections ON prompt_sections.interaction_id = interactions.id
+		WHERE interactions.id > ? AND interactions.id <= ? AND response_actions.interaction_id IS NULL
+		""",
+		(lo, hi),
+	).fetchall()
+	_insert_response_actions(
+		conn, [(int(r["id"]), responses.parse(r["response"], r["prompt_kind"]).as_row()) for r in rows]
+	)
+
+
+@cached_query
+@instrumented
+def fetch_action_distribution(conn: sqlite3.Connection, by_situation: bool = True) -> List[sqlite3.Row]:
+	"""Response counts per LLM (and situation), action type and goal status.
+
+	Unparseable responses have a NULL action_type and parse_error = 1.
+	"""
+	group = "interactions.llm_name, interactions.situation_id" if by_situation else "interactions.llm_name"
+	situation = "interactions.situation_id" if by_situation else "NULL"
+	return list(
+		conn.execute(
+			f"""
+			SELECT interactions.llm_name AS llm_name, {situation} AS situation_id,
+				ra.action_type, ra.goal_status,
+				COUNT(*) AS responses,
+				SUM(ra.parse_error) AS parse_errors,
+				SUM(ra.lenient) AS lenient
+			FROM response_actions AS ra
+			JOIN interactions ON interactions.id = ra.interaction_id
+			GROUP BY {group}, ra.action_type, ra.goal_status
+			ORDER BY {group}, ra.action_type, ra.goal_status
+			"""
+		)
+	)
+
+
+@instrumented
+def fetch_interactions_by_environment(
+	conn: sqlite3.Connection,
+	*,
+	player_adjacent: Optional[bool] = None,
+	max_player_distance: Optional[int] = None,
+	map_id: Optional[int] = None,
+	situation_id: Optional[str] = None,
+	limit: Optional[int] = None,
+) -> List[sqlite3.Row]:
+	"""Interactions filtered on indexed environment fields of their prompt."""
+	conds = []
+	args: List[object] = []
+	if player_adjacent is not None:
+		conds.append("prompt_sections.player_adjacent = ?")
+		args.append(1 if player_adjacent else 0)
+	if max_player_distance is not None:
+		conds.append("prompt_sections.player_distance <= ?")
+		args.append(int(max_player_distance))
+	if map_id is not None:
+		conds.append("prompt_sections.map_id = ?")
+		args.append(int(map_id))
+	if situation_id:
+		conds.append("interactions.situation_id = ?")
+		args.append(situation_id)
+	where = f"WHERE {' AND '.join(conds)}" if conds else ""
+	limit_sql = f"LIMIT {int(limit)}" if limit else ""
+	return list(
+		conn.execute(
+			f"""
+			SELECT {_INTERACTION_COLUMNS}, prompt_sections.map_id, prompt_sections.player_distance, prompt_sections.player_adjacent
+			FROM prompt_sections
+			JOIN interactions ON interactions.id = prompt_sections.interaction_id
+			{_INTERACTION_JOINS}
+			{where}
+			ORDER BY interactions.id
+			{limit_sql}
+			""",
+			args,
+		)
+	)
+
+
+# Report queries
+
+# Epoch milliseconds of an ISO timestamp column (any UTC offset)
+def _epoch_ms_sql(column: str) -> str:
+	return f"CAST(ROUND((julianday({column}) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+
+@cached_query
+@instrumented
+def fetch_prompt_section_totals(conn: sqlite3.Connection, by_situation: bool = True) -> List[sqlite3.Row]:
+	"""Summed section sizes per LLM (and situation) from prompt_sections."""
+	group = "interactions.llm_name, interactions.situation_id" if by_situation else "interactions.llm_name"
+	situation = "interactions.situation_id" if by_situation else "NULL"
+	env_header = len(prompts.ENV_HEADER.encode("utf-8"))
+	return list(
+		conn.execute(
+			f"""
+			SELECT interactions.llm_name AS llm_name,
+				{situation} AS situation_id,
+				COUNT(*) AS prompts,
+				SUM(ps.total_bytes) AS total_bytes,
+				SUM(ps.history_bytes) AS history_bytes,
+				SUM(ps.description_bytes) AS description_bytes,
+				SUM(ps.goal_bytes) AS goal_bytes,
+				SUM(ps.policy_bytes) AS policy_bytes,
+				SUM(ps.env_bytes) AS env_bytes,
+				SUM(ps.other_bytes) AS other_bytes,
+				SUM(CASE WHEN ps.env_min_bytes IS NOT NULL THEN ps.env_bytes - {env_header} - ps.env_min_bytes ELSE 0 END) AS env_whitespace_bytes
+			FROM prompt_sections AS ps
+			JOIN interactions ON interactions.id = ps.interaction_id
+			GROUP BY {group}
+			ORDER BY {group}
+			"""
+		)
+	)
+
+
+@instrumented
+def fetch_size_duration_pairs(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+	"""(llm_name, situation_id, total_bytes, duration_ms) of interactions linked to a perf row."""
+	return list(
+		conn.execute(
+			"""
+			SELECT interactions.llm_name, interactions.situation_id, prompt_sections.total_bytes, llm_calls.duration_ms
+			FROM interactions
+			JOIN llm_calls ON llm_calls.id = interactions.llm_call_id
+			JOIN prompt_sections ON prompt_sections.interaction_id = interactions.id
+			"""
+		)
+	)
+
+
+@cached_query
+@instrumented
+def fetch_token_throughput(conn: sqlite3.Connection) -> Dict[str, sqlite3.Row]:
+	"""Per LLM: average prompt/response tokens and output tokens per second of linked calls."""
+	rows = conn.execute(
+		"""
+		SELECT interactions.llm_name AS llm_name,
+			COUNT(*) AS calls,
+			AVG(interactions.prompt_tokens) AS avg_input_tokens,
+			AVG(interactions.response_tokens) AS avg_output_tokens,
+			SUM(interactions.response_tokens) * 1000.0 / SUM(llm_calls.duration_ms) AS output_tokens_per_s
+		FROM interactions
+		JOIN llm_calls ON llm_calls.id = interactions.llm_call_id
+		WHERE interactions.prompt_tokens IS NOT NULL AND interactions.response_tokens IS NOT NULL
+		GROUP BY interactions.llm_name
+		"""
+	)
+	return {r["llm_name"]: r for r in rows}
+
+
+# Linking interactions to llm_calls
+
+def _link_scopes(conn: sqlite3.Connection, import_batch_id: Optional[str]) -> List[Tuple[str, Optional[int], Optional[int]]]:
+	"""(llm_name, first_ms, last_ms) ranges to match; None bounds mean all rows."""
+	if import_batch_id is None:
+		return [(r[0], None, None) for r in conn.execute("SELECT DISTINCT llm_name FROM interactions WHERE llm_call_id IS NULL")]
+	call_ms = _epoch_ms_sql("call_timestamp")
+	interaction_ms = _epoch_ms_sql("interactions.interaction_timestamp")
+	return [
+		(r[0], r[1], r[2])
+		for r in conn.execute(
+			f"""
+			SELECT llm_name, MIN({call_ms}), MAX({call_ms})
+			FROM llm_calls WHERE import_batch_id = ? AND call_timestamp IS NOT NULL
+			GROUP BY llm_name
+			UNION ALL
+			SELECT interactions.llm_name, MIN({interaction_ms}), MAX({interaction_ms})
+			FROM interactions
+			WHERE interactions.import_batch_id = ? AND interactions.interaction_timestamp IS NOT NULL
+			GROUP BY interactions.llm_name
+			""",
+			(import_batch_id, import_batch_id),
+		)
+	]
+
+
+@instrumented
+def link_interactions_to_calls(
+	conn: sqlite3.Connection,
+	import_batch_id: Optional[str] = None,
+	tolerance_ms: int = matching.DEFAULT_TOLERANCE_MS,
+	scopes: Optional[List[Tuple[str, Optional[int], Optional[int]]]] = None,
+) -> int:
+	"""Set interactions.llm_call_id from the nearest unlinked perf row of the same model.
+
+	With ``import_batch_id`` only the models and time range of that import
+	are considered, with ``scopes`` only the given (llm_name, first epoch ms,
+	last epoch ms) ranges; without either every unlinked interaction is
+	(backfill). Returns the number of interactions linked. The caller commits.
+	"""
+	linked = 0
+	for llm_name, first_ms, last_ms in (scopes if scopes is not None else _link_scopes(conn, import_batch_id)):
+		window = ""
+		args: List[object] = [llm_name]
+		if first_ms is not None:
+			window = "AND epoch_ms BETWEEN ? AND ?"
+			args += [first_ms - tolerance_ms, last_ms + tolerance_ms]
+		interactions = conn.execute(
+			f"""
+			SELECT * FROM (
+				SELECT id, llm_name, {_epoch_ms_sql("interaction_timestamp")} AS epoch_ms
+				FROM interactions
+				WHERE llm_name = ? AND llm_call_id IS NULL AND interaction_timestamp IS NOT NULL
+			) WHERE 1 {window}
+			""",
+			args,
+		).fetchall()
+		if not interactions:
+			continue
+		calls = conn.execute(
+			f"""
+			SELECT * FROM (
+				SELECT id, llm_name, {_epoch_ms_sql("call_timestamp")} AS epoch_ms
+				FROM llm_calls
+				WHERE llm_name = ? AND call_timestamp IS NOT NULL
+					AND NOT EXISTS (SELECT 1 FROM interactions WHERE interactions.llm_call_id = llm_calls.id)
+			) WHERE 1 {window}
+			""",
+			args,
+		).fetchall()
+		pairs = matching.match_nearest(interactions, calls, tolerance_ms)
+		conn.executemany(
+			"UPDATE interactions SET llm_call_id = ? WHERE id = ?",
+			[(call_id, interaction_id) for interaction_id, call_id in pairs.items()],
+		)
+		linked += len(pairs)
+	return linked
+
+
+# Full-text search
+#
+# interactions_fts indexes prompt, response and comment. It is an external
+# content table over the interaction_texts view, so the text itself is only
+# stored (compressed) once. Triggers keep it in sync; they decode blobs with
+# blob_decode and therefore need a connection from get_connection().
+#
+# Databases that already had interactions when the index was added are
+# indexed by the "fts" backfill (see run_backfills). Rows with ids in
+# (fts_done, fts_until] from meta are not indexed yet; the triggers leave
+# them alone and the backfill picks up their current text later.
+#
+# The index keeps full position lists. detail=column would be about a third
+# of the size, but then bm25 ranking re-reads (and decodes) every match.
+
+def _stored_text_sql(row: str, column: str) -> str:
+	return (
+		f"COALESCE((SELECT blob_decode(b.codec, b.data, d.data) FROM blobs AS b "
+		f"LEFT JOIN blob_dicts AS d ON d.id = b.dict_id WHERE b.id = {row}.{column}_blob_id), {row}.{column})"
+	)
+
+
+def _fts_indexed_sql(row: str) -> str:
+	return (
+		f"NOT ({row}.id > COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'fts_done'), 0) "
+		f"AND {row}.id <= COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'fts_until'), 0))"
+	)
+
+
+def _fts_insert_sql(row: str) -> str:
+	return (
+		f"INSERT INTO interactions_fts(rowid, prompt, response, comment) VALUES("
+		f"{row}.id, {_stored_text_sql(row, 'prompt')}, {_stored_text_sql(row, 'response')}, {row}.comment);"
+	)
+
+
+def _fts_delete_sql(row: str) -> str:
+	return (
+		f"INSERT INTO interactions_fts(interactions_fts, rowid, prompt, response, comment) VALUES("
+		f"'delete', {row}.id, {_stored_text_sql(row, 'prompt')}, {_stored_text_sql(row, 'response')}, {row}.comment);"
+	)
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+	exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'interactions_fts'").fetchone()
+	conn.execute(
+		f"""
+		CREATE VIEW IF NOT EXISTS interaction_texts AS
+		SELECT interactions.id AS id, {_PROMPT_TEXT} AS prompt, {_RESPONSE_TEXT} AS response, interactions.comment AS comment
+		FROM interactions
+		{_TEXT_JOINS}
+		"""
+	)
+	conn.execute(
+		"""
+		CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+			prompt, response, comment,
+			content='interaction_texts', content_rowid='id',
+			tokenize='unicode61 remove_diacritics 2'
+		)
+		"""
+	)
+	if not exists:
+		schedule_backfill(conn, "fts")
+	conn.execute(
+		f"""
+		CREATE TRIGGER IF NOT EXISTS interactions_fts_insert AFTER INSERT ON interactions
+		WHEN {_fts_indexed_sql("new")}
+		BEGIN
+			{_fts_insert_sql("new")}
+		END
+		"""
+	)
+	conn.execute(
+		f"""
+		CREATE TRIGGER IF NOT EXISTS interactions_fts_delete AFTER DELETE ON interactions
+		WHEN {_fts_indexed_sql("old")}
+		BEGIN
+			{_fts_delete_sql("old")}
+		END
+		"""
+	)
+	conn.execute(
+		f"""
+		CREATE TRIGGER IF NOT EXISTS interactions_fts_update
+		AFTER UPDATE OF prompt, response, comment, prompt_blob_id, response_blob_id ON interactions
+		WHEN {_fts_indexed_sql("old")}
+		BEGIN
+			{_fts_delete_sql("old")}
+			{_fts_insert_sql("new")}
+		END
+		"""
+	)
+
+
+def search_index_pending(conn: sqlite3.Connection) -> int:
+	"""Number of existing interactions not in the search index yet."""
+	row = conn.execute(
+		"""
+		SELECT COUNT(*) FROM interactions
+		WHERE id > COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'fts_done'), 0)
+			AND id <= COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'fts_until'), 0)
+		"""
+	).fetchone()
+	return int(row[0])
+
+
+def _backfill_search_index(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	conn.executemany(
+		"INSERT INTO interactions_fts(rowid, prompt, response, comment) VALUES(?, ?, ?, ?)",
+		[tuple(r) for r in conn.execute("SELECT id, prompt, response, comment FROM interaction_texts WHERE id > ? AND id <= ?", (lo, hi))],
+	)
+
+
+def fts_query(text: str) -> str:
+	"""FTS5 query matching all words of ``text``; a trailing * keeps prefix search."""
+	terms = []
+	for word in text.split():
+		prefix = word.endswith("*")
+		word = word.rstrip("*").replace('"', '""')
+		if word:
+			terms.append(f'"{word}"' + ("*" if prefix else ""))
+	return " ".join(terms) or '""'
+
+
+# Response clusters
+#
+# The "clusters" backfill assigns interactions with ids above meta
+# clusters_done to clusters. Imports only schedule it (schedule_clustering),
+# so they never wait for it; the GUI runs it in the background, the
+# collector and watch between polls, and cluster_responses right away.
+# Exact repeats of a response are the common case and are resolved from a
+# per-step cache without touching the buckets.
+
+def _cluster_scope(situation_id: Optional[str]) -> str:
+	return situation_id or ""
+
+
+# Interactions per clustering step of writers that group responses between
+# their own work (collector, watch), so new work waits little
+CLUSTER_STEP_ROWS = 200
+
+
+def schedule_clustering(conn: sqlite3.Connection) -> None:
+	"""Have the clusters backfill reach every interaction stored now; call in the import's transaction."""
+	done, until = _backfill_state(conn, "clusters")
+	latest = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM interactions").fetchone()[0]
+	if latest > until:
+		_set_backfill_range(conn, "clusters", done, latest)
+
+
+@instrumented
+def cluster_responses(
+	conn: sqlite3.Connection,
+	batch_size: int = 2000,
+	progress=None,
+) -> int:
+	"""Cluster every response not clustered yet, now; resumable, one commit per batch."""
+	with transaction(conn):
+		schedule_clustering(conn)
+	done = 0
+	while True:
+		n = backfill_step(conn, "clusters", batch_size)
+		if not n:
+			break
+		done += n
+		if progress is not None:
+			progress(done)
+	return done
+
+
+def _backfill_clusters(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	row = conn.execute("SELECT value FROM meta WHERE key = 'cluster_prompt_context'").fetchone()
+	with_prompt = bool(row and row[0] == "1")
+	prompt_column = f"{_PROMPT_TEXT} AS prompt" if with_prompt else "NULL AS prompt"
+	# (scope, clustering text) -> cluster id, and cluster id -> signature
+	known: Dict[Tuple[str, str], int] = {}
+	signatures: Dict[int, Tuple[int, ...]] = {}
+	members = []
+	for r in conn.execute(
+		f"""
+		SELECT interactions.id, interactions.situation_id, {_RESPONSE_TEXT} AS response, {prompt_column}
+		FROM interactions
+		{_TEXT_JOINS}
+		WHERE interactions.id > ? AND interactions.id <= ?
+		ORDER BY interactions.id
+		""",
+		(lo, hi),
+	).fetchall():
+		scope = _cluster_scope(r["situation_id"])
+		text = clustering.clustering_text(r["response"], r["prompt"] if with_prompt else None)
+		cluster_id = known.get((scope, text))
+		if cluster_id is None:
+			cluster_id = _assign_cluster(conn, scope, r["situation_id"], text, signatures)
+			known[(scope, text)] = cluster_id
+		members.append((int(r["id"]), cluster_id))
+	conn.executemany("INSERT OR REPLACE INTO cluster_members(interaction_id, cluster_id) VALUES(?, ?)", members)
+
+
+def _assign_cluster(
+	conn: sqlite3.Connection,
+	scope: str,
+	situation_id: Optional[str],
+	text: str,
+	signatures: Dict[int, Tuple[int, ...]],
+) -> int:
+	sig = clustering.signature(text)
+	buckets = clustering.band_buckets(sig, scope)
+	placeholders = ",".join("?" for _ in buckets)
+	# Most shared buckets first: the likeliest matches are checked first
+	candidates = [
+		int(r[0])
+		for r in conn.execute(
+			f"""
+			SELECT cluster_id FROM cluster_buckets WHERE bucket IN ({placeholders})
+			GROUP BY cluster_id HAVING COUNT(*) >= ?
+			ORDER BY COUNT(*) DESC, cluster_id
+			""",
+			(*buckets, clustering.MIN_SHARED_BANDS),
+		)
+	]
+	missing = [c for c in candidates if c not in signatures]
+	if missing:
+		for r in conn.execute(
+			f"SELECT id, situation_id, signature FROM response_clusters WHERE id IN ({','.join('?' for _ in missing)})",
+			missing,
+		):
+			# Bucket keys can collide across scopes; such clusters never match
+			signatures[int(r["id"])] = clustering.unpack(r["signature"]) if _cluster_scope(r["situation_id"]) == scope else ()
+	for c in candidates:
+		if signatures[c] and clustering.similarity(sig, signatures[c]) >= clustering.THRESHOLD:
+			return c
+	cur = conn.execute(
+		"INSERT INTO response_clusters(situation_id, signature) VALUES(?, ?)",
+		(situation_id, clustering.pack(sig)),
+	)
+	cluster_id = int(cur.lastrowid)
+	conn.executemany(
+		"""
+		INSERT OR IGNORE INTO cluster_buckets(bucket, cluster_id)
+		SELECT ?, ? WHERE (SELECT COUNT(*) FROM cluster_buckets WHERE bucket = ?) < ?
+		""",
+		[(b, cluster_id, b, clustering.BUCKET_CAPACITY) for b in buckets],
+	)
+	signatures[cluster_id] = sig
+	return cluster_id
+
+
+@instrumented
+def rebuild_response_clusters(conn: sqlite3.Connection, prompt_context: bool = False) -> None:
+	"""Drop all clusters so the clusters backfill starts over.
+
+	With ``prompt_context``, responses are clustered together with the last
+	history entry of their prompt.
+	"""
+	with transaction(conn):
+		conn.execute("DELETE FROM cluster_members")
+		conn.execute("DELETE FROM cluster_buckets")
+		conn.execute("DELETE FROM response_clusters")
+		conn.execute(
+			"INSERT OR REPLACE INTO meta(key, value) VALUES('cluster_prompt_context', ?)", ("1" if prompt_context else "0",)
+		)
+		_set_backfill_range(conn, "clusters", 0, conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM interactions").fetchone()[0])
+
+
+# Merging databases
+#
+# merge_database copies another analyzer database (a tester's) into this
+# one with INSERT ... SELECT over an ATTACHed copy. temp.merge_* tables map
+# its ids to ours: rows we already have map to our row, new rows get their
+# own id plus the current maximum, so ids never collide and need no lookup.
+# A session is known if its checksum or guid is; a call if a call of the
+# same LLM with the same timestamp and duration is; an interaction if its
+# session has one with the same index and offset. Everything copied gets
+# the merge's import batch id, so the merge shows up in the Imports tab and
+# can be rolled back as a whole. Derived rows come along; search index
+# entries, missing derived data and response groups are left to backfills.
+
+_MERGE_CALL_COLUMNS = "imported_at, source_file, source_line_no, llm_name, call_timestamp, duration_ms, raw_line"
+_MERGE_SESSION_COLUMNS = "session_guid, session_timestamp, llm_name, source_file, imported_at, checksum"
+_MERGE_INTERACTION_COLUMNS = (
+	"interaction_timestamp, offset_ms, situation_id, prompt, response, comment, rating, "
+	"llm_name, index_in_session, extra, prompt_tokens, response_tokens"
+)
+
+
+def _max_id(conn: sqlite3.Connection, table: str) -> int:
+	return int(conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0])
+
+
+@instrumented
+def merge_database(conn: sqlite3.Connection, source: Path, progress=None) -> Dict[str, object]:
+	"""Copy sessions, interactions (with ratings and comments) and calls of another database.
+
+	Rows this database already has are skipped; ratings and comments they
+	lack are taken from the other database. ``source`` is only read; one
+	from an older version is upgraded in a temporary copy. Returns the rows
+	copied and the import batch id.
+	"""
+	source = Path(source)
+	if not source.is_file():
+		raise FileNotFoundError(f"{source} does not exist")
+	target = database_path(conn)
+	if target is not None and target.resolve() == source.resolve():
+		raise ValueError("Cannot merge a database into itself")
+	say = progress or (lambda _msg: None)
+	batch = ImportBatch("merge", str(source))
+	t0 = time.perf_counter()
+	with _current_schema_source(source, say) as attach_name:
+		cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+		conn.execute(f"PRAGMA cache_size = {-BULK_CACHE_KIB}")
+		conn.execute("ATTACH DATABASE ? AS src", (attach_name,))
+		try:
+			with transaction(conn):
+				result = _merge_attached(conn, batch, say)
+				record_import_batch(
+					conn, batch, (time.perf_counter() - t0) * 1000.0,
+					bytes_read=source.stat().st_size, calls=result["calls"],
+					sessions=result["sessions"], interactions=result["interactions"],
+				)
+		finally:
+			for table in ("calls", "sessions", "interactions", "dicts", "blobs"):
+				conn.execute(f"DROP TABLE IF EXISTS temp.merge_{table}")
+			conn.execute("DETACH DATABASE src")
+			conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+	result["import_batch_id"] = batch.id
+	return result
+
+
+@contextmanager
+def _current_schema_source(source: Path, say: Callable[[str], None]) -> Iterator[str]:
+	"""Name to ATTACH ``source`` by at the current schema, without writing to it.
+
+	A database at the current schema is attached read-only; an older one is
+	copied to a temporary file, which is upgraded instead.
+	"""
+	uri = source.resolve().as_uri() + "?mode=ro"
+	other = sqlite3.connect(uri, uri=True)
+	try:
+		version = get_schema_version(other)
+		if version is not None and version > SCHEMA_VERSION:
+			raise ValueError(f"{source} was written by a newer version (schema {version})")
+		if version == SCHEMA_VERSION:
+			other.close()
+			yield uri
+			return
+		with tempfile.TemporaryDirectory(prefix="llm_analyzer_merge_") as tmp:
+			say("Upgrading a copy of the older database")
+			copy_path = Path(tmp) / "source.sqlite"
+			copy = get_connection(copy_path)
+			try:
+				other.backup(copy)
+				other.close()
+				initialize_schema(copy)
+			finally:
+				copy.close()
+			yield str(copy_path)
+	finally:
+		other.close()
+
+
+def _merge_attached(conn: sqlite3.Connection, batch: ImportBatch, say: Callable[[str], None]) -> Dict[str, int]:
+	result = {"calls": 0, "sessions": 0, "interactions": 0, "annotations": 0, "linked": 0}
+
+	say("Merging calls")
+	conn.execute("CREATE TEMP TABLE merge_calls(src_id INTEGER PRIMARY KEY, dst_id INTEGER, new INTEGER NOT NULL DEFAULT 0)")
+	conn.execute(
+		"""
+		INSERT INTO temp.merge_calls(src_id, dst_id)
+		SELECT s.id, CASE WHEN s.call_timestamp IS NULL THEN (
+			-- Without a time, only the same line of the same log is the same call
+			SELECT t.id FROM main.llm_calls AS t
+			WHERE t.source_file = s.source_file AND t.source_line_no = s.source_line_no
+				AND t.call_timestamp IS NULL AND +t.llm_name = s.llm_name AND +t.duration_ms = s.duration_ms
+			LIMIT 1
+		) ELSE (
+			SELECT t.id FROM main.llm_calls AS t
+			-- Unary + keeps SQLite on the timestamp index; without ANALYZE it
+			-- picks the duration index, which has few distinct values
+			WHERE t.call_timestamp = s.call_timestamp AND +t.llm_name = s.llm_name AND +t.duration_ms = s.duration_ms
+			LIMIT 1
+		) END
+		FROM src.llm_calls AS s
+		"""
+	)
+	conn.execute("UPDATE temp.merge_calls SET dst_id = src_id + ?, new = 1 WHERE dst_id IS NULL", (_max_id(conn, "main.llm_calls"),))
+	result["calls"] = conn.execute(
+		f"""
+		INSERT INTO main.llm_calls(id, {_MERGE_CALL_COLUMNS}, import_batch_id)
+		SELECT m.dst_id, {_MERGE_CALL_COLUMNS}, ?
+		FROM src.llm_calls JOIN temp.merge_calls AS m ON m.src_id = llm_calls.id
+		WHERE m.new
+		""",
+		(batch.id,),
+	).rowcount
+
+	say("Merging sessions")
+	conn.execute("CREATE TEMP TABLE merge_sessions(src_id INTEGER PRIMARY KEY, dst_id INTEGER, new INTEGER NOT NULL DEFAULT 0)")
+	conn.execute(
+		"""
+		INSERT INTO temp.merge_sessions(src_id, dst_id)
+		SELECT s.id, COALESCE(
+			(SELECT t.id FROM main.sessions AS t WHERE t.checksum = s.checksum),
+			(SELECT t.id FROM main.sessions AS t WHERE t.session_guid = s.session_guid ORDER BY t.id DESC LIMIT 1)
+		)
+		FROM src.sessions AS s
+		"""
+	)
+	conn.execute("UPDATE temp.merge_sessions SET dst_id = src_id + ?, new = 1 WHERE dst_id IS NULL", (_max_id(conn, "main.sessions"),))
+	result["sessions"] = conn.execute(
+		f"""
+		INSERT INTO main.sessions(id, {_MERGE_SESSION_COLUMNS}, import_batch_id)
+		SELECT m.dst_id, {_MERGE_SESSION_COLUMNS}, ?
+		FROM src.sessions JOIN temp.merge_sessions AS m ON m.src_id = sessions.id
+		WHERE m.new
+		""",
+		(batch.id,),
+	).rowcount
+
+	say("Merging interactions")
+	conn.execute("CREATE TEMP TABLE merge_interactions(src_id INTEGER PRIMARY KEY, dst_id INTEGER, new INTEGER NOT NULL DEFAULT 0)")
+	conn.execute(
+		"""
+		INSERT INTO temp.merge_interactions(src_id, dst_id)
+		SELECT s.id, CASE WHEN ms.new THEN NULL ELSE (
+			SELECT t.id FROM main.interactions AS t
+			WHERE t.session_id = ms.dst_id AND t.index_in_session IS s.index_in_session AND +t.offset_ms = s.offset_ms
+			LIMIT 1
+		) END
+		FROM src.interactions AS s JOIN temp.merge_sessions AS ms ON ms.src_id = s.session_id
+		"""
+	)
+	first_id = _max_id(conn, "main.interactions")
+	conn.execute("UPDATE temp.merge_interactions SET dst_id = src_id + ?, new = 1 WHERE dst_id IS NULL", (first_id,))
+	conn.execute("CREATE INDEX temp.merge_interactions_dst ON merge_interactions(dst_id)")
+	last_id = first_id + _max_id(conn, "src.interactions")
+	fts_done, fts_until = _backfill_state(conn, "fts")
+	if fts_done >= fts_until:
+		# The search index triggers skip these rows; the fts backfill indexes
+		# them later instead of decoding every text during the merge
+		_set_backfill_range(conn, "fts", first_id, last_id)
+
+	# Texts: blobs the new interactions need, with their dictionaries. A
+	# dictionary name can stand for different data in each database.
+	conn.execute("CREATE TEMP TABLE merge_dicts(src_id INTEGER PRIMARY KEY, dst_id INTEGER NOT NULL)")
+	for d in conn.execute("SELECT id, name, data FROM src.blob_dicts").fetchall():
+		row = conn.execute("SELECT id FROM main.blob_dicts WHERE data = ?", (d["data"],)).fetchone()
+		if row is None:
+			taken = conn.execute("SELECT 1 FROM main.blob_dicts WHERE name = ?", (d["name"],)).fetchone()
+			row = (conn.execute(
+				"INSERT INTO main.blob_dicts(name, data) VALUES(?, ?)",
+				(f"{d['name']} ({batch.id})" if taken else d["name"], d["data"]),
+			).lastrowid,)
+		conn.execute("INSERT INTO temp.merge_dicts(src_id, dst_id) VALUES(?, ?)", (d["id"], row[0]))
+	conn.execute("CREATE TEMP TABLE merge_blobs(src_id INTEGER PRIMARY KEY, dst_id INTEGER)")
+	conn.execute(
+		"""
+		INSERT OR IGNORE INTO temp.merge_blobs(src_id)
+		SELECT blob_id FROM (
+			SELECT s.prompt_blob_id AS blob_id FROM src.interactions AS s JOIN temp.merge_interactions AS m ON m.src_id = s.id WHERE m.new
+			UNION ALL
+			SELECT s.response_blob_id FROM src.interactions AS s JOIN temp.merge_interactions AS m ON m.src_id = s.id WHERE m.new
+		) WHERE blob_id IS NOT NULL
+		"""
+	)
+	conn.execute(
+		"""
+		INSERT INTO main.blobs(hash, codec, size, data, dict_id)
+		SELECT b.hash, b.codec, b.size, b.data, d.dst_id
+		FROM temp.merge_blobs AS m
+		JOIN src.blobs AS b ON b.id = m.src_id
+		LEFT JOIN temp.merge_dicts AS d ON d.src_id = b.dict_id
+		WHERE NOT EXISTS (SELECT 1 FROM main.blobs AS t WHERE t.hash = b.hash)
+		"""
+	)
+	conn.execute(
+		"""
+		UPDATE temp.merge_blobs SET dst_id = (
+			SELECT t.id FROM src.blobs AS b JOIN main.blobs AS t ON t.hash = b.hash WHERE b.id = merge_blobs.src_id
+		)
+		"""
+	)
+
+	result["interactions"] = conn.execute(
+		f"""
+		INSERT INTO main.interactions(id, session_id, {_MERGE_INTERACTION_COLUMNS}, prompt_blob_id, response_blob_id, llm_call_id, import_batch_id)
+		SELECT m.dst_id, ms.dst_id, {", ".join(f"s.{c.strip()}" for c in _MERGE_INTERACTION_COLUMNS.split(","))},
+			pb.dst_id, rb.dst_id, mc.dst_id, ?
+		FROM src.interactions AS s
+		JOIN temp.merge_interactions AS m ON m.src_id = s.id
+		JOIN temp.merge_sessions AS ms ON ms.src_id = s.session_id
+		LEFT JOIN temp.merge_blobs AS pb ON pb.src_id = s.prompt_blob_id
+		LEFT JOIN temp.merge_blobs AS rb ON rb.src_id = s.response_blob_id
+		LEFT JOIN temp.merge_calls AS mc ON mc.src_id = s.llm_call_id
+		WHERE m.new
+		ORDER BY m.dst_id
+		""",
+		(batch.id,),
+	).rowcount
+	for table, columns in (("prompt_sections", _PROMPT_SECTION_COLUMNS), ("response_actions", _RESPONSE_ACTION_COLUMNS)):
+		cols = ", ".join(columns)
+		conn.execute(
+			f"""
+			INSERT INTO main.{table}(interaction_id, {cols})
+			SELECT m.dst_id, {", ".join(f"d.{c}" for c in columns)}
+			FROM src.{table} AS d JOIN temp.merge_interactions AS m ON m.src_id = d.interaction_id
+			WHERE m.new
+			"""
+		)
+	if result["interactions"]:
+		# Rows the other database had not derived yet
+		for name in ("prompt_sections", "token_counts", "response_actions"):
+			_extend_backfill(conn, name, first_id, last_id)
+		schedule_clustering(conn)
+
+	# Ratings and comments given in the other database to interactions we have
+	result["annotations"] = conn.execute(
+		"""
+		UPDATE main.interactions SET
+			rating = COALESCE(rating, (SELECT s.rating FROM src.interactions AS s JOIN temp.merge_interactions AS m ON m.src_id = s.id WHERE m.dst_id = interactions.id)),
+			comment = COALESCE(comment, (SELECT s.comment FROM src.interactions AS s JOIN temp.merge_interactions AS m ON m.src_id = s.id WHERE m.dst_id = interactions.id))
+		WHERE id IN (
+			SELECT m.dst_id FROM temp.merge_interactions AS m JOIN src.interactions AS s ON s.id = m.src_id
+			WHERE NOT m.new AND (s.rating IS NOT NULL OR s.comment IS NOT NULL)
+		)
+			AND (rating IS NULL OR comment IS NULL)
+		"""
+	).rowcount
+
+	# Interactions the other tester never linked may belong to calls one of
+	# the two databases has
+	say("Linking interactions to calls")
+	result["linked"] = link_interactions_to_calls(conn, batch.id)
+	return result
+
+
+# Migrations and backfills
+#
+# A migration changes the schema and runs when the database is opened, in
+# one transaction. Rewriting existing rows is left to backfills: a backfill
+# handles the rows of one table with rowid in (lo, hi]. Scheduling it stores
+# <name>_done = 0 and <name>_until = the table's current MAX(rowid) in meta;
+# rows added after that are written complete by the importers.
+# run_backfills moves <name>_done forward in the same transaction as each
+# batch, so an interrupted run continues after the last committed batch.
+
+@dataclass
+class Migration:
+	version: int
+	name: str
+	apply: Callable[[sqlite3.Connection], None]
+
+
+@dataclass
+class Backfill:
+	name: str
+	table: str
+	step: Callable[[sqlite3.Connection, int, int], None]
+
+
+def _backfill_interaction_batches(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	# Interactions imported before came with their session (appends were
+	# not told apart)
+	conn.execute(
+		"""
+		UPDATE interactions SET import_batch_id = (SELECT import_batch_id FROM sessions WHERE sessions.id = interactions.session_id)
+		WHERE id > ? AND id <= ? AND import_batch_id IS NULL
+		""",
+		(lo, hi),
+	)
+
+
+def _backfill_import_batch_calls(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	# Batches imported before import_batches existed, without duration and size
+	conn.execute(
+		"""
+		INSERT INTO import_batches(id, kind, source, started_at, calls)
+		SELECT import_batch_id, CASE WHEN MIN(source_file) LIKE 'loadtest:%' THEN 'loadtest' ELSE 'performance_log' END,
+			MIN(source_file), MIN(imported_at), COUNT(*)
+		FROM llm_calls WHERE id > ? AND id <= ?
+		GROUP BY import_batch_id
+		ON CONFLICT(id) DO UPDATE SET calls = calls + excluded.calls, started_at = MIN(started_at, excluded.started_at)
+		""",
+		(lo, hi),
+	)
+
+
+def _backfill_import_batch_sessions(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+	# Runs after interaction_batches, so interactions appended since by
+	# another import are not counted here
+	conn.execute(
+		"""
+		INSERT INTO import_batches(id, kind, source, started_at, sessions, interactions)
+		SELECT sessions.import_batch_id, 'session', MIN(sessions.source_file), MIN(sessions.imported_at),
+			COUNT(DISTINCT sessions.id), COUNT(interactions.id)
+		FROM sessions
+		LEFT JOIN interactions ON interactions.session_id = sessions.id AND interactions.import_batch_id = sessions.import_batch_id
+		WHERE sessions.id > ? AND sessions.id <= ?
+		GROUP BY sessions.import_batch_id
+		ON CONFLICT(id) DO UPDATE SET
+			sessions = sessions + excluded.sessions,
+			interactions = interactions + excluded.interactions,
+			started_at = MIN(started_at, excluded.started_at)
+		""",
+		(lo, hi),
+	)
+
+
+# In the order run_backfills works through them
+BACKFILLS: Dict[str, Backfill] = {
+	b.name: b
+	for b in (
+		Backfill("interaction_batches", "interactions", _backfill_interaction_batches),
+		Backfill("import_batch_calls", "llm_calls", _backfill_import_batch_calls),
+		Backfill("import_batch_sessions", "sessions", _backfill_import_batch_sessions),
+		Backfill("prompt_sections", "interactions", _backfill_prompt_sections),
+		Backfill("token_counts", "interactions", _backfill_token_counts),
+		# Needs prompt_sections for the prompt kind
+		Backfill("response_actions", "interactions", _backfill_response_actions),
+		Backfill("fts", "interactions", _backfill_search_index),
+		# Also scheduled by every import, see schedule_clustering
+		Backfill("clusters", "interactions", _backfill_clusters),
+	)
+}
+
+
+def schedule_backfill(conn: sqlite3.Connection, name: str) -> None:
+	"""Have backfill ``name`` visit every row its table has now."""
+	backfill = BACKFILLS[name]
+	until = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {backfill.table}").fetchone()[0]
+	if until:
+		_set_backfill_range(conn, name, 0, until)
+
+
+def _backfill_state(conn: sqlite3.Connection, name: str) -> Tuple[int, int]:
+	meta = dict(conn.execute("SELECT key, value FROM meta WHERE key IN (?, ?)", (f"{name}_done", f"{name}_until")).fetchall())
+	return int(meta.get(f"{name}_done", 0)), int(meta.get(f"{name}_until", 0))
+
+
+def _set_backfill_range(conn: sqlite3.Connection, name: str, done: int, until: int) -> None:
+	conn.executemany(
+		"INSERT OR REPLACE INTO meta(key, value) VALUES(?, ?)",
+		[(f"{name}_done", str(done)), (f"{name}_until", str(until))],
+	)
+
+
+def _extend_backfill(conn: sqlite3.Connection, name: str, lo: int, hi: int) -> None:
+	"""Add rowids (lo, hi] to backfill ``name``.
+
+	While it is still running the rows in between are visited again, so
+	only for backfills that skip rows already done (not fts).
+	"""
+	done, until = _backfill_state(conn, name)
+	_set_backfill_range(conn, name, done if done < until else lo, max(until, hi))
+
+
+def backfills_pending(conn: sqlite3.Connection) -> Dict[str, int]:
+	"""Rowids each unfinished backfill has left to visit."""
+	pending: Dict[str, int] = {}
+	for name in BACKFILLS:
+		done, until = _backfill_state(conn, name)
+		if done < until:
+			pending[name] = until - done
+	return pending
+
+
+@instrumented
+def run_backfills(
+	conn: sqlite3.Connection,
+	names: Optional[Iterable[str]] = None,
+	progress: Optional[Callable[[str], None]] = None,
+) -> Dict[str, int]:
+	"""Work through scheduled backfills (or just ``names``) in short batches.
+
+	Returns the rowids visited per backfill.
+	"""
+	wanted = set(BACKFILLS if names is None else names)
+	visited: Dict[str, int] = {}
+	for name in BACKFILLS:
+		if name not in wanted:
+			continue
+		_, until = _backfill_state(conn, name)
+		say = progress or (lambda _msg: None)
+		n = run_in_batches(
+			lambda limit, name=name: backfill_step(conn, name, limit),
+			batch_size=2000,
+			progress=lambda n, name=name, until=until: say(f"Updating older data ({name}): {n} of {until}"),
+		)
+		if n:
+			visited[name] = n
+			logger.info("Backfill %s visited %d rows", name, n)
+	return visited
+
+
+def backfill_step(conn: sqlite3.Connection, name: str, limit: int) -> int:
+	"""Run backfill ``name`` on up to ``limit`` more rowids in one transaction; returns how many."""
+	with transaction(conn):
+		# Read inside the transaction so two runners never do a range twice
+		done, until = _backfill_state(conn, name)
+		if done >= until:
+			return 0
+		hi = min(until, done + limit)
+		BACKFILLS[name].step(conn, done, hi)
+		conn.execute("UPDATE meta SET value = ? WHERE key = ?", (str(hi), f"{name}_done"))
+	return hi - done
+
+
+def _schedule_derived_data(conn: sqlite3.Connection) -> None:
+	# Interactions imported by versions that did not store these yet
+	for name in ("prompt_sections", "token_counts", "response_actions"):
+		schedule_backfill(conn, name)
+
+
+MIGRATIONS: List[Migration] = [
+	Migration(12, "derive prompt sections, token counts and actions of older interactions", _schedule_derived_data),
+]
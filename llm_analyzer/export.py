@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import csv
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import db
+from .utils import nearest_rank_percentile
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def parquet_available() -> bool:
+	try:
+		import pyarrow  # noqa: F401
+		import pyarrow.parquet  # noqa: F401
+	except ImportError:
+		return False
+	return True
+
+
+def format_from_path(path: Path) -> str:
+	suffix = Path(path).suffix.lower().lstrip(".")
+	if suffix in {"jsonl", "ndjson"}:
+		return "jsonl"
+	if suffix in {"parquet", "pq"}:
+		return "parquet"
+	return "csv"
+
+
+# Datasets. Each yields batches of tuples matching its column list; column
+# types are "string", "int" or "float" and are only used for Parquet.
+
+@dataclass
+class Dataset:
+	columns: List[Tuple[str, str]]
+	batches: Callable[..., Iterator[List[tuple]]]
+
+
+def _review_batches(conn, batch_size: int, llm_name=None, situation_id=None, session_timestamp=None, search=None) -> Iterator[List[tuple]]:
+	for batch in db.iter_review(conn, llm_name, situation_id, session_timestamp, batch_size=batch_size, search=search):
+		yield [
+			(
+				r["interaction_timestamp"] or f"t={r['offset_ms']} ms",
+				r["session_timestamp"] or "",
+				r["prompt"] or "",
+				r["response"] or "",
+				r["comment"] or "",
+				r["rating"] or "",
+			)
+			for r in batch
+		]
+
+
+def _llm_calls_batches(conn, batch_size: int, llm_filter=None, date_from_iso=None, date_to_iso=None) -> Iterator[List[tuple]]:
+	for batch in db.iter_llm_calls(conn, llm_filter, date_from_iso, date_to_iso, batch_size=batch_size):
+		yield [tuple(r) for r in batch]
+
+
+def _performance_batches(conn, batch_size: int, llm_filter=None, date_from_iso=None, date_to_iso=None) -> Iterator[List[tuple]]:
+	stats = db.fetch_performance_overview(conn, llm_filter, date_from_iso, date_to_iso)
+	durations = db.fetch_durations_grouped(conn, llm_filter, date_from_iso, date_to_iso)
+	throughput = db.fetch_token_throughput(conn)
+	rows = []
+	for r in stats:
+		values = durations.get(r["llm_name"], [])
+		t = throughput.get(r["llm_name"])
+		rows.append((
+			r["llm_name"],
+			int(r["cnt"]),
+			r["min_ms"],
+			float(r["avg_ms"]) if r["avg_ms"] is not None else None,
+			nearest_rank_percentile(values, 0.50),
+			nearest_rank_percentile(values, 0.90),
+			nearest_rank_percentile(values, 0.99),
+			r["max_ms"],
+			float(t["avg_input_tokens"]) if t is not None else None,
+			float(t["avg_output_tokens"]) if t is not None else None,
+			float(t["output_tokens_per_s"]) if t is not None and t["output_tokens_per_s"] is not None else None,
+		))
+	for i in range(0, len(rows), batch_size):
+		yield rows[i:i + batch_size]
+
+
+DATASETS: Dict[str, Dataset] = {
+	"review": Dataset(
+		[("interaction_time", "string"), ("session_time", "string"), ("prompt", "string"),
+		 ("response", "string"), ("comment", "string"), ("rating", "string")],
+		_review_batches,
+	),
+	"llm_calls": Dataset(
+		[("id", "int"), ("llm_name", "string"), ("call_timestamp", "string"), ("duration_ms", "int"),
+		 ("source_file", "string"), ("source_line_no", "int"), ("imported_at", "string"), ("import_batch_id", "string")],
+		_llm_calls_batches,
+	),
+	"performance": Dataset(
+		[("llm_name", "string"), ("count", "int"), ("min_ms", "int"), ("avg_ms", "float"),
+		 ("p50_ms", "float"), ("p90_ms", "float"), ("p99_ms", "float"), ("max_ms", "int"),
+		 ("avg_input_tokens", "float"), ("avg_output_tokens", "float"), ("output_tokens_per_s", "float")],
+		_performance_batches,
+	),
+}
+
+
+# Writers
+
+class _CsvWriter:
+	def __init__(self, path: Path, columns: List[str]):
+		self.f = open(path, "w", encoding="utf-8", newline="")
+		self.writer = csv.writer(self.f)
+		self.writer.writerow(columns)
+
+	def write(self, rows: List[tuple]) -> None:
+		self.writer.writerows(rows)
+
+	def close(self) -> None:
+		self.f.close()
+
+
+class _JsonlWriter:
+	def __init__(self, path: Path, columns: List[str]):
+		self.f = open(path, "w", encoding="utf-8", newline="\n")
+		self.columns = columns
+
+	def write(self, rows: List[tuple]) -> None:
+		self.f.writelines(json.dumps(dict(zip(self.columns, r)), ensure_ascii=False) + "\n" for r in rows)
+
+	def close(self) -> None:
+		self.f.close()
+
+
+class _ParquetWriter:
+	def __init__(self, path: Path, columns: List[Tuple[str, str]]):
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+
+		types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64()}
+		self.pa = pa
+		self.names = [name for name, _ in columns]
+		self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+		self.writer = pq.ParquetWriter(str(path), self.schema)
+
+	def write(self, rows: List[tuple]) -> None:
+		# Transpose the batch into columns and write it as one row group
+		cols = list(zip(*rows)) if rows else [() for _ in self.names]
+		arrays = [self.pa.array(list(col), type=field.type) for col, field in zip(cols, self.schema)]
+		self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+	def close(self) -> None:
+		self.writer.close()
+
+
+def export_dataset(
+	conn,
+	dataset: str,
+	out_path: Path,
+	*,
+	fmt: Optional[str] = None,
+	params: Optional[Dict[str, object]] = None,
+	batch_size: int = 5000,
+	progress: Optional[Callable[[int], None]] = None,
+	cancel: Optional[threading.Event] = None,
+) -> int:
+	"""Stream a dataset to ``out_path`` batch by batch; returns rows written.
+
+	A cancelled export removes its partial output file.
+	"""
+	spec = DATASETS[dataset]
+	fmt = fmt or format_from_path(out_path)
+	if fmt == "parquet" and not parquet_available():
+		raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+	out_path = Path(out_path)
+	names = [name for name, _ in spec.columns]
+	if fmt == "parquet":
+		writer = _ParquetWriter(out_path, spec.columns)
+	elif fmt == "jsonl":
+		writer = _JsonlWriter(out_path, names)
+	else:
+		writer = _CsvWriter(out_path, names)
+	written = 0
+	cancelled = False
+	try:
+		for rows in spec.batches(conn, batch_size, **(params or {})):
+			if cancel is not None and cancel.is_set():
+				cancelled = True
+				break
+			writer.write(rows)
+			written += len(rows)
+			if progress is not None:
+				progress(written)
+	finally:
+		writer.close()
+		if cancelled:
+			out_path.unlink(missing_ok=True)
+	return written
+
+
+class BackgroundExport(threading.Thread):
+	"""Runs export_dataset on its own connection so the UI thread stays free.
+
+	Poll ``done``/``rows_written``/``error`` from the UI thread.
+	"""
+
+	def __init__(self, db_path: Path, dataset: str, out_path: Path, **kwargs):
+		super().__init__(daemon=True)
+		self.db_path = db_path
+		self.dataset = dataset
+		self.out_path = out_path
+		self.kwargs = kwargs
+		self.cancel_event = threading.Event()
+		self.rows_written = 0
+		self.error: Optional[BaseException] = None
+		self.done = False
+
+	def _progress(self, n: int) -> None:
+		self.rows_written = n
+
+	def run(self) -> None:
+		conn = db.get_connection(self.db_path)
+		try:
+			self.rows_written = export_dataset(
+				conn,
+				self.dataset,
+				self.out_path,
+				progress=self._progress,
+				cancel=self.cancel_event,
+				**self.kwargs,
+			)
+		except BaseException as e:  # reported to the UI thread
+			self.error = e
+		finally:
+			conn.close()
+			self.done = True
+
+	def cancel(self) -> None:
+		self.cancel_event.set()
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-import csv
+import logging
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
-from . import db
+from . import db, export, instrument, logformats, maintenance, reports, tokens, watch
 from .config import load_config, save_config
 from .importers import import_performance_log_file, import_session_json_file
 from .utils import nearest_rank_percentile
@@ -34,6 +34,348 @@ def _extract_response_preview(text: str) -> str:
 	return lines[0].strip() if lines else ""
 
 
+# Row builders. These hold the query side of each tab's refresh and return
+# plain Treeview values, so refresh paths can be timed without a display.
+# Their results are cached until the database changes, so switching back
+# to a tab only re-inserts the rows.
+
+def _performance_row(name: str, cnt, min_ms, avg_ms, p90, max_ms, t) -> tuple:
+	return (
+		name,
+		int(cnt),
+		int(min_ms) if min_ms is not None else "—",
+		int(avg_ms) if avg_ms is not None else "—",
+		int(p90) if p90 is not None else "—",
+		int(max_ms) if max_ms is not None else "—",
+		int(t["avg_input_tokens"]) if t is not None else "—",
+		int(t["avg_output_tokens"]) if t is not None else "—",
+		f"{t['output_tokens_per_s']:.1f}" if t is not None and t["output_tokens_per_s"] is not None else "—",
+	)
+
+
+@db.cached_query
+def build_performance_rows(conn) -> List[tuple]:
+	stats = db.fetch_performance_overview(conn)
+	durations = db.fetch_durations_grouped(conn)
+	throughput = db.fetch_token_throughput(conn)
+	return [
+		_performance_row(
+			r["llm_name"], r["cnt"], r["min_ms"], r["avg_ms"],
+			nearest_rank_percentile(durations.get(r["llm_name"], []), 0.90),
+			r["max_ms"], throughput.get(r["llm_name"]),
+		)
+		for r in stats
+	]
+
+
+def build_live_performance_rows(conn, stats: watch.RunningStats) -> List[tuple]:
+	"""Performance rows from stats kept up to date while watching a log folder."""
+	throughput = db.fetch_token_throughput(conn)
+	rows: List[tuple] = []
+	for name in stats.llm_names():
+		cnt, min_ms, avg_ms, p90, max_ms = stats.summary(name)
+		rows.append(_performance_row(name, cnt, min_ms, avg_ms, p90, max_ms, throughput.get(name)))
+	return rows
+
+
+@db.cached_query
+def build_session_rows(conn) -> List[Tuple[str, tuple]]:
+	rows: List[Tuple[str, tuple]] = []
+	for r in db.fetch_sessions(conn):
+		time_label = (r["session_timestamp"] or r["imported_at"]) or ""
+		rows.append((str(r["id"]), (time_label, r["llm_name"], r["interaction_count"], r["source_file"])))
+	return rows
+
+
+ACTION_TYPES = ("move", "speak", "give", "giveCoins", "wait", "setSwitch")
+
+
+@db.cached_query
+def build_action_rows(conn) -> List[tuple]:
+	report = reports.action_summary(conn)
+	rows: List[tuple] = []
+	for r in report["by_llm"] + report["by_situation"]:
+		total = r["responses"]
+		shares = tuple(_pct(r["actions"].get(t, 0) / total if total else None) for t in ACTION_TYPES)
+		goals = r["goal_status"]
+		goal_total = sum(goals.values())
+		rows.append((
+			r["llm_name"],
+			r["situation_id"] if r["situation_id"] is not None else "(all)",
+			total,
+		) + shares + (
+			_pct(goals.get("achieved", 0) / goal_total) if goal_total else "—",
+			_pct(r["parse_error_rate"]),
+			_pct(r["lenient_rate"]),
+		))
+	return rows
+
+
+def _action_label(data: Dict) -> str:
+	if data.get("parse_error"):
+		return "invalid JSON"
+	action = data.get("action_type") or ""
+	if data.get("goal_status"):
+		return f"{action} / {data['goal_status']}"
+	return action
+
+
+# Search results are ranked, so only the best ones are listed
+SEARCH_LIMIT = 500
+
+
+@db.cached_query
+def build_review_rows(
+	conn,
+	llm: Optional[str],
+	sit: Optional[str],
+	session: Optional[str],
+	search: Optional[str] = None,
+	grouped: bool = False,
+) -> Tuple[int, int, List[Tuple[tuple, Dict]]]:
+	ok, not_ok, rows = db.fetch_review(
+		conn, llm, sit, session, search=search, limit=SEARCH_LIMIT if search and not grouped else None, grouped=grouped
+	)
+	result: List[Tuple[tuple, Dict]] = []
+	for r in rows:
+		data = dict(r)
+		itime = data.get("interaction_timestamp") or f"t={data.get('offset_ms', 0)} ms"
+		stime = data.get("session_timestamp") or ""
+		prompt = _extract_prompt_preview(data.get("prompt"))[:200]
+		response = _extract_response_preview(data.get("response"))[:200]
+		comment = (data.get("comment") or "")[:200]
+		rating = _cluster_rating_label(data) if grouped else data.get("rating") or ""
+		duration = data.get("call_duration_ms")
+		size = (data.get("cluster_size") or "") if grouped else ""
+		result.append(((itime, stime, duration if duration is not None else "—", prompt, _action_label(data), response, comment, rating, size), data))
+	return ok, not_ok, result
+
+
+def _cluster_rating_label(data: Dict) -> str:
+	size = int(data.get("cluster_size") or 0)
+	ok = int(data.get("cluster_okay") or 0)
+	not_ok = int(data.get("cluster_not_okay") or 0)
+	if size and ok == size:
+		return "okay"
+	if size and not_ok == size:
+		return "not_okay"
+	if ok or not_ok:
+		return f"mixed ({ok}/{not_ok})"
+	return ""
+
+
+def _pct(value: Optional[float]) -> str:
+	return f"{value * 100:.1f}%" if value is not None else "—"
+
+
+@db.cached_query
+def build_prompt_size_rows(conn) -> List[tuple]:
+	report = reports.prompt_attribution(conn)
+	rows: List[tuple] = []
+	for r in report["by_llm"] + report["by_situation"]:
+		sections = r["sections"]
+		rows.append((
+			r["llm_name"],
+			r["situation_id"] if r["situation_id"] is not None else "(all)",
+			r["prompts"],
+			int(r["avg_bytes"]),
+			int(r["avg_tokens"]),
+			_pct(sections["history"]["share"]),
+			_pct(sections["description"]["share"]),
+			_pct(sections["goal"]["share"] + sections["policy"]["share"]),
+			_pct(sections["environment"]["share"]),
+			_pct(r["minified_env_saved_share"]),
+			f"{r['ms_per_kb']:.0f}" if r["ms_per_kb"] is not None else "—",
+			f"{r['pearson_r']:.2f}" if r["pearson_r"] is not None else "—",
+		))
+	return rows
+
+
+@db.cached_query
+def build_prompt_cache_rows(conn) -> Tuple[List[str], List[tuple]]:
+	"""Ordering names and one row per LLM / NPC with the cacheable share under each."""
+	report = reports.prefix_cache_simulation(conn)
+	names = list(report["orderings"])
+	rows: List[tuple] = []
+	for r in report["by_llm"] + report["by_situation"]:
+		rows.append((
+			r["llm_name"],
+			r["situation_id"] if r["situation_id"] is not None else "(all)",
+			r["prompts"],
+			int(r["prompt_tokens"]),
+		) + tuple(_pct(r["cacheable"][name]["fraction"]) for name in names))
+	return names, rows
+
+
+_COMPARISON_LABELS = {"p50_ms": "P50 latency (ms)", "p90_ms": "P90 latency (ms)", "ok_score": "OK score"}
+
+
+def build_comparison_rows(report: Dict[str, object]) -> List[tuple]:
+	"""One row per metric of a compare.compare_llms report."""
+	rows: List[tuple] = []
+	for m in report["metrics"]:
+		if m["metric"] == "ok_score":
+			value = _pct
+			signed = lambda v: f"{v * 100:+.1f} pp"
+		else:
+			value = lambda v: f"{v:.0f}" if v is not None else "—"
+			signed = lambda v: f"{v:+.0f}"
+		diff = m["difference"]
+		rows.append((
+			_COMPARISON_LABELS.get(m["metric"], m["metric"]),
+			value(m["a"]),
+			value(m["b"]),
+			signed(diff) if diff is not None else "—",
+			f"{signed(m['ci_low'])} … {signed(m['ci_high'])}" if diff is not None else "—",
+			("yes" if m["significant"] else "no") if diff is not None else "—",
+		))
+	return rows
+
+
+def build_concurrency_rows(report: Dict[str, object]) -> List[Tuple[str, str, str, tuple]]:
+	"""(parent iid, iid, name, values) for a concurrency.analyze report.
+
+	One row per LLM with its peaks, and below it the latency of its calls by
+	how many of its calls were in flight when they started.
+	"""
+	rows: List[Tuple[str, str, str, tuple]] = []
+	for r in report["by_llm"]:
+		name = r["llm_name"]
+		rate = r["calls_per_minute"]
+		rows.append(("", name, name, (r["calls"], r["peak_in_flight"], r["peak_at"][:19].replace("T", " "), rate["peak"], int(rate["p90"]), "", "", "")))
+		for g in r["latency_by_in_flight"]:
+			rows.append((name, f"{name}/{g['in_flight']}", f"{g['in_flight']} in flight", (
+				g["calls"], "", "", "", "", int(g["p50_ms"]), int(g["p90_ms"]), int(g["avg_ms"]),
+			)))
+	return rows
+
+
+def _bytes(n: Optional[int]) -> str:
+	if n is None:
+		return "—"
+	for unit in ("B", "KB", "MB"):
+		if abs(n) < 1024:
+			return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+		n /= 1024
+	return f"{n:.1f} GB"
+
+
+def build_storage_rows(report: Dict[str, object]) -> List[Tuple[str, str, str, tuple]]:
+	"""(parent iid, iid, name, values) for a maintenance.size_report.
+
+	Tables come first, largest first, with their indexes and columns below
+	them. Without dbstat a table's size is the sum of its columns.
+	"""
+	file_bytes = report["file_bytes"] or 1
+	tables: Dict[str, Dict[str, object]] = report.get("tables") or {}
+	groups: Dict[str, Dict[str, object]] = {}
+	for o in report["objects"] or []:
+		g = groups.setdefault(o["tbl_name"], {"bytes": 0, "indexes": []})
+		g["bytes"] += o["bytes"]
+		if o["type"] == "index":
+			g["indexes"].append(o)
+	if report["objects"] is None:
+		for name, t in tables.items():
+			groups[name] = {"bytes": sum(t["columns"].values()), "indexes": []}
+	rows: List[Tuple[str, str, str, tuple]] = []
+	for name, g in sorted(groups.items(), key=lambda kv: -kv[1]["bytes"]):
+		t = tables.get(name)
+		rows.append(("", name, name, ("table", t["rows"] if t else "", _bytes(g["bytes"]), _pct(g["bytes"] / file_bytes))))
+		for o in g["indexes"]:
+			rows.append((name, f"{name}/{o['name']}", o["name"], ("index", "", _bytes(o["bytes"]), _pct(o["bytes"] / file_bytes))))
+		for column, size in (t["columns"].items() if t else ()):
+			rows.append((name, f"{name}.{column}", column, ("column", "", _bytes(size), "")))
+	return rows
+
+
+def build_import_rows(conn) -> List[Tuple[str, tuple]]:
+	"""(batch id, values) per import, newest first."""
+	rows = []
+	for r in db.fetch_import_batches(conn):
+		added = r["calls"] + r["interactions"]
+		seconds = (r["duration_ms"] or 0) / 1000.0
+		rows.append((r["id"], (
+			r["started_at"][:19].replace("T", " "),
+			r["kind"],
+			r["source"] or "",
+			r["calls"],
+			r["sessions"],
+			r["interactions"],
+			r["skipped"],
+			_bytes(r["bytes_read"]) if r["bytes_read"] else "—",
+			f"{seconds:.2f}" if r["duration_ms"] is not None else "—",
+			f"{added / seconds:.0f}" if seconds > 0 else "—",
+		)))
+	return rows
+
+
+class TreeSync:
+	"""Differential updates for a Treeview whose rows have stable iids.
+
+	Only rows that appeared, disappeared, changed or moved are touched, so
+	selection and scroll position survive a refresh.
+	"""
+
+	def __init__(self, tree: ttk.Treeview) -> None:
+		self.tree = tree
+		self.values: Dict[str, tuple] = {}
+
+	def update(self, rows: List[Tuple[str, tuple]]) -> None:
+		wanted = dict(rows)
+		stale = [iid for iid in self.values if iid not in wanted]
+		if stale:
+			self.tree.delete(*stale)
+		for index, (iid, values) in enumerate(rows):
+			old = self.values.get(iid)
+			if old is None:
+				self.tree.insert("", index, iid=iid, values=values)
+				continue
+			if old != values:
+				self.tree.item(iid, values=values)
+			if self.tree.index(iid) != index:
+				self.tree.move(iid, "", index)
+		self.values = wanted
+
+
+def start_background_export(widget, button, dataset: str, params: Dict[str, object], title: str) -> None:
+	"""Ask for a target file and stream ``dataset`` to it on a worker thread.
+
+	``button`` shows progress while the export runs and is disabled until it
+	finishes.
+	"""
+	filetypes = [("CSV","*.csv"),("JSON Lines","*.jsonl")]
+	if export.parquet_available():
+		filetypes.append(("Parquet","*.parquet"))
+	path = filedialog.asksaveasfilename(title=title, defaultextension=".csv", filetypes=filetypes)
+	if not path:
+		return
+	job = export.BackgroundExport(db.database_path(widget.conn), dataset, Path(path), params=params)
+	label = button.cget("text")
+	button.configure(state=tk.DISABLED)
+	job.start()
+
+	def poll():
+		if not job.done:
+			button.configure(text=f"Exporting… {job.rows_written}")
+			widget.after(200, poll)
+			return
+		button.configure(text=label, state=tk.NORMAL)
+		if job.error is not None:
+			messagebox.showerror("Export", str(job.error))
+		else:
+			messagebox.showinfo("Export", f"Exported {job.rows_written} rows.")
+
+	widget.after(200, poll)
+
+
+# Compressed logs are recognized by content, these only fill the file dialog
+LOG_FILE_PATTERNS = "*.csv *.jsonl *.log *.txt *.gz *.bz2 *.xz *.zst"
+# How often the window title shows the progress of background backfills
+BACKFILL_POLL_MS = 500
+# How often imports of a watched log folder are shown
+WATCH_REFRESH_MS = 500
+
+
 class AnalyzerApp(tk.Tk):
 	def __init__(self, paths):
 		super().__init__()
@@ -41,6 +383,12 @@ class AnalyzerApp(tk.Tk):
 		self.geometry("1000x700")
 		self.paths = paths
 		self.config_obj = load_config(paths)
+		instrument.configure(
+			slow_ms=self.config_obj.get("slow_query_ms"),
+			explain_slow=self.config_obj.get("explain_slow_queries"),
+		)
+		tokens.configure(self.config_obj.get("tokenizer"))
+		logformats.configure(self.config_obj.get("log_formats"))
 		self.conn = db.get_connection(paths["db_path"])
 
 		self._apply_dark_theme()
@@ -58,13 +406,138 @@ class AnalyzerApp(tk.Tk):
 		self.review_tab = ReviewTab(nb, self.conn)
 		nb.add(self.review_tab, text="LLM & Situation Review")
 
+		self.prompt_size_tab = PromptSizeTab(nb, self.conn)
+		nb.add(self.prompt_size_tab, text="Prompt Size")
+
+		self.prompt_cache_tab = PromptCacheTab(nb, self.conn)
+		nb.add(self.prompt_cache_tab, text="Prompt Cache")
+
+		self.compare_tab = CompareTab(nb, self.conn)
+		nb.add(self.compare_tab, text="Compare LLMs")
+
+		self.concurrency_tab = ConcurrencyTab(nb, self.conn)
+		nb.add(self.concurrency_tab, text="Concurrency")
+
+		self.actions_tab = ActionsTab(nb, self.conn)
+		nb.add(self.actions_tab, text="Actions")
+
+		self.imports_tab = ImportsTab(nb, self.conn)
+		nb.add(self.imports_tab, text="Imports")
+
+		self.storage_tab = StorageTab(nb, self.conn, self.paths, self.config_obj)
+		nb.add(self.storage_tab, text="Storage")
+
+		# Hidden unless enabled in config; Ctrl+Shift+D toggles it
+		self.diag_tab = DiagnosticsTab(nb)
+		nb.add(self.diag_tab, text="Diagnostics", state="normal" if self.config_obj.get("show_diagnostics") else "hidden")
+		self.bind_all("<Control-Shift-D>", self._toggle_diagnostics)
+
 		self.protocol("WM_DELETE_WINDOW", self.on_close)
 		# Refresh review tab when selected and when data updates
 		nb.bind("<<NotebookTabChanged>>", self._on_tab_changed)
 		self.bind("<<DataUpdated>>", self._on_data_updated)
+		self.bind("<<ToggleWatch>>", self._toggle_watch)
+		self.bind("<<ImportRolledBack>>", self._on_import_rolled_back)
+		self.watcher: Optional[watch.WatchThread] = None
+		self.watch_totals = [0, 0]
+		# Tabs load their data when first shown; the initially selected tab
+		# is loaded once the window is up so the first paint is not blocked.
+		self.after_idle(self._on_tab_changed, None)
+		# Older databases get their derived data filled in behind the UI, and
+		# imports get their responses grouped
+		self.backfill: Optional[maintenance.BackgroundMaintenance] = None
+		self._start_backfill()
+
+	def _start_backfill(self) -> None:
+		if self.backfill is not None or not db.backfills_pending(self.conn):
+			return
+		self.backfill = maintenance.BackgroundMaintenance(self.paths["db_path"], lambda conn, progress: db.run_backfills(conn, progress=progress))
+		self.backfill.start()
+		self.after(BACKFILL_POLL_MS, self._poll_backfill)
+
+	def _poll_backfill(self) -> None:
+		job = self.backfill
+		if not job.done:
+			self.title(f"LLM Analyzer – {job.status}" if job.status else "LLM Analyzer")
+			self.after(BACKFILL_POLL_MS, self._poll_backfill)
+			return
+		self.title("LLM Analyzer")
+		self.backfill = None
+		if job.error is not None:
+			# Picked up again after the next import or start; what is done so far stays
+			logging.error("Background backfill failed", exc_info=job.error)
+		elif job.result:
+			self.event_generate("<<DataUpdated>>")
+
+	def _toggle_watch(self, event=None) -> None:
+		tab = self.perf_tab
+		if self.watcher is not None:
+			self.watcher.stop()
+			self.watcher = None
+			tab.live = None
+			tab.btn_watch.configure(text="Watch Log Folder…")
+			tab.lbl_watch.configure(text="")
+			tab.refresh()
+			return
+		initial = self.config_obj.get("watch_dir") or None
+		directory = filedialog.askdirectory(title="Watch the game's logs/llm folder", initialdir=initial)
+		if not directory:
+			return
+		self.config_obj["watch_dir"] = directory
+		tab.live = watch.RunningStats.from_db(self.conn)
+		self.watch_totals = [0, 0]
+		self.watcher = watch.WatchThread(self.paths["db_path"], Path(directory))
+		self.watcher.start()
+		tab.btn_watch.configure(text="Stop Watching")
+		tab.lbl_watch.configure(text=f"Watching {directory}")
+		tab.loaded = True
+		tab.refresh()
+		self.after(WATCH_REFRESH_MS, self._poll_watch, self.watcher)
+
+	def _poll_watch(self, watcher: watch.WatchThread) -> None:
+		if watcher is not self.watcher:
+			# Stopped, or replaced by a newer watch
+			return
+		results = watcher.drain()
+		calls = [c for r in results for c in r.calls]
+		if calls:
+			for llm_name, duration_ms in calls:
+				self.perf_tab.live.add(llm_name, duration_ms)
+			self.perf_tab.refresh()
+		interactions = sum(r.interactions for r in results)
+		if interactions or any(r.new_sessions for r in results):
+			if self.session_tab.loaded:
+				self.session_tab.refresh_sessions()
+		if results:
+			self.watch_totals[0] += len(calls)
+			self.watch_totals[1] += interactions
+			self.perf_tab.lbl_watch.configure(
+				text=f"Watching {watcher.directory} | {self.watch_totals[0]} calls, {self.watch_totals[1]} interactions imported"
+			)
+		self.after(WATCH_REFRESH_MS, self._poll_watch, watcher)
+
+	def _on_import_rolled_back(self, event=None) -> None:
+		tab = self.perf_tab
+		if tab.live is not None:
+			tab.live = watch.RunningStats.from_db(self.conn)
+		if tab.loaded:
+			tab.refresh()
+		sessions = self.session_tab
+		if sessions.loaded:
+			sessions.refresh_sessions()
+			if sessions.current_session_id is not None and not sessions.sessions.exists(str(sessions.current_session_id)):
+				# Its interactions are gone; do not save annotations to them
+				sessions.current_session_id = None
+				sessions.interactions = []
+				sessions.current_index = 0
+				sessions.lbl_meta.config(text="")
+				for t in (sessions.txt_prompt, sessions.txt_response, sessions.txt_comment):
+					t.delete("1.0", tk.END)
 
 	def on_close(self):
 		try:
+			if self.watcher is not None:
+				self.watcher.stop()
 			save_config(self.paths, self.config_obj)
 		finally:
 			self.conn.close()
@@ -146,14 +619,22 @@ class AnalyzerApp(tk.Tk):
 		try:
 			selected = self.nb.select()
 			widget = self.nb.nametowidget(selected)
-			if widget is self.review_tab:
-				self.review_tab.reload_filter_values()
-				self.review_tab.refresh()
+			widget.on_shown()
 		except Exception:
 			pass
 
+	def _toggle_diagnostics(self, event=None):
+		if self.nb.tab(self.diag_tab, "state") == "hidden":
+			self.nb.tab(self.diag_tab, state="normal")
+			self.nb.select(self.diag_tab)
+		else:
+			self.nb.tab(self.diag_tab, state="hidden")
+
 	def _on_data_updated(self, event):
+		self._start_backfill()
 		try:
+			if not self.review_tab.loaded:
+				return
 			self.review_tab.reload_filter_values()
 			# If review tab is currently visible, also refresh its data
 			selected = self.nb.select()
@@ -164,7 +645,23 @@ class AnalyzerApp(tk.Tk):
 			pass
 
 
-class PerformanceTab(ttk.Frame):
+class LazyTab(ttk.Frame):
+	"""Notebook page whose initial queries run when it is first shown."""
+
+	def __init__(self, parent):
+		super().__init__(parent)
+		self.loaded = False
+
+	def on_shown(self) -> None:
+		if not self.loaded:
+			self.loaded = True
+			self.load()
+
+	def load(self) -> None:
+		"""Run the initial queries; tabs that wait for a button leave this empty."""
+
+
+class PerformanceTab(LazyTab):
 	def __init__(self, parent, conn):
 		super().__init__(parent)
 		self.conn = conn
@@ -174,8 +671,18 @@ class PerformanceTab(ttk.Frame):
 
 		self.btn_import = ttk.Button(top, text="Import Performance Log…", command=self.on_import)
 		self.btn_import.pack(side=tk.LEFT, padx=6, pady=6)
-
-		self.tree = ttk.Treeview(self, columns=("llm","count","min","avg","p90","max"), show="headings")
+		self.btn_export_calls = ttk.Button(top, text="Export Calls…", command=self.on_export_calls)
+		self.btn_export_calls.pack(side=tk.LEFT, padx=6, pady=6)
+		self.btn_export_stats = ttk.Button(top, text="Export Stats…", command=self.on_export_stats)
+		self.btn_export_stats.pack(side=tk.LEFT, padx=6, pady=6)
+		self.btn_watch = ttk.Button(top, text="Watch Log Folder…", command=lambda: self.winfo_toplevel().event_generate("<<ToggleWatch>>"))
+		self.btn_watch.pack(side=tk.LEFT, padx=6, pady=6)
+		self.lbl_watch = ttk.Label(top, text="")
+		self.lbl_watch.pack(side=tk.LEFT, padx=6, pady=6)
+		# Set while a log folder is watched; rows then come from these stats
+		self.live: Optional[watch.RunningStats] = None
+
+		self.tree = ttk.Treeview(self, columns=("llm","count","min","avg","p90","max","in_tok","out_tok","tok_s"), show="headings")
 		for col, label in (
 			("llm","LLM"),
 			("count","Count"),
@@ -183,45 +690,50 @@ class PerformanceTab(ttk.Frame):
 			("avg","Avg (ms)"),
 			("p90","P90 (ms)"),
 			("max","Max (ms)"),
+			("in_tok","Avg In Tokens"),
+			("out_tok","Avg Out Tokens"),
+			("tok_s","Out Tokens/s"),
 		):
 			self.tree.heading(col, text=label)
-			self.tree.column(col, width=120 if col!="llm" else 200, anchor=tk.CENTER)
+			self.tree.column(col, width=100 if col!="llm" else 200, anchor=tk.CENTER)
 		self.tree.pack(fill=tk.BOTH, expand=True)
+		self.tree_sync = TreeSync(self.tree)
 
+	def load(self) -> None:
 		self.refresh()
 
 	def refresh(self):
-		for i in self.tree.get_children():
-			self.tree.delete(i)
-		stats = db.fetch_performance_overview(self.conn)
-		durations = db.fetch_durations_grouped(self.conn)
-		p90_map = {k: int(nearest_rank_percentile(v, 0.90)) if nearest_rank_percentile(v, 0.90) is not None else None for k,v in durations.items()}
-		for r in stats:
-			name = r["llm_name"]
-			p90 = p90_map.get(name)
-			values = (
-				name,
-				int(r["cnt"]),
-				int(r["min_ms"]) if r["min_ms"] is not None else "—",
-				int(r["avg_ms"]) if r["avg_ms"] is not None else "—",
-				p90 if p90 is not None else "—",
-				int(r["max_ms"]) if r["max_ms"] is not None else "—",
-			)
-			self.tree.insert("", tk.END, values=values)
+		if self.live is not None:
+			rows = build_live_performance_rows(self.conn, self.live)
+		else:
+			rows = build_performance_rows(self.conn)
+		self.tree_sync.update([(str(values[0]), values) for values in rows])
 
 	def on_import(self):
-		path = filedialog.askopenfilename(title="Import Performance Log", filetypes=[("CSV","*.csv"),("JSONL","*.jsonl"),("All","*.*")])
+		path = filedialog.askopenfilename(
+			title="Import Performance Log",
+			filetypes=[("Performance logs", LOG_FILE_PATTERNS), ("All", "*.*")],
+		)
 		if not path:
 			return
-		if path.lower().endswith(".csv"):
-			res = import_performance_log_file(self.conn, Path(path), format_hint=".csv")
-		else:
-			res = import_performance_log_file(self.conn, Path(path), format_hint=".jsonl")
+		try:
+			res = import_performance_log_file(self.conn, Path(path))
+		except (OSError, UnicodeDecodeError, ValueError, EOFError) as e:
+			messagebox.showerror("Import Error", str(e))
+			return
 		messagebox.showinfo("Import Summary", f"Inserted: {res['inserted']}, Skipped: {res['skipped']}")
+		if self.live is not None:
+			self.live = watch.RunningStats.from_db(self.conn)
 		self.refresh()
 
+	def on_export_calls(self):
+		start_background_export(self, self.btn_export_calls, "llm_calls", {}, "Export LLM Calls")
+
+	def on_export_stats(self):
+		start_background_export(self, self.btn_export_stats, "performance", {}, "Export Performance Stats")
 
-class SessionTab(ttk.Frame):
+
+class SessionTab(LazyTab):
 	def __init__(self, parent, conn):
 		super().__init__(parent)
 		self.conn = conn
@@ -246,6 +758,7 @@ class SessionTab(ttk.Frame):
 			self.sessions.column(col, width=w, anchor=tk.W)
 		self.sessions.pack(fill=tk.BOTH, padx=6, pady=6)
 		self.sessions.bind("<<TreeviewSelect>>", self.on_session_select)
+		self.sessions_sync = TreeSync(self.sessions)
 
 		right = ttk.Frame(self)
 		right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -283,16 +796,11 @@ class SessionTab(ttk.Frame):
 		self.txt_response.pack(fill=tk.BOTH, expand=True, padx=6, pady=6)
 		self.txt_comment.pack(fill=tk.BOTH, expand=True, padx=6, pady=6)
 
+	def load(self) -> None:
 		self.refresh_sessions()
 
 	def refresh_sessions(self):
-		for i in self.sessions.get_children():
-			self.sessions.delete(i)
-		sess_rows = db.fetch_sessions(self.conn)
-		for r in sess_rows:
-			cnt = list(self.conn.execute("SELECT COUNT(*) FROM interactions WHERE session_id = ?", (r["id"],)))[0][0]
-			time_label = (r["session_timestamp"] or r["imported_at"]) or ""
-			self.sessions.insert("", tk.END, iid=str(r["id"]), values=(time_label, r["llm_name"], cnt, r["source_file"]))
+		self.sessions_sync.update(build_session_rows(self.conn))
 
 	def on_session_select(self, event):
 		sel = self.sessions.selection()
@@ -311,7 +819,10 @@ class SessionTab(ttk.Frame):
 			return
 		item = self.interactions[self.current_index]
 		time_display = item.get("interaction_timestamp") or f"t={item.get('offset_ms',0)} ms"
-		self.lbl_meta.config(text=f"Time: {time_display} | Situation: {item.get('situation_id','')} | LLM: {item.get('llm_name','')}")
+		duration = item.get("call_duration_ms")
+		duration_display = f"{duration} ms" if duration is not None else "—"
+		tokens_display = f"{item.get('prompt_tokens')} in / {item.get('response_tokens')} out" if item.get("prompt_tokens") is not None else "—"
+		self.lbl_meta.config(text=f"Time: {time_display} | Situation: {item.get('situation_id','')} | LLM: {item.get('llm_name','')} | Duration: {duration_display} | Tokens: {tokens_display}")
 		self.txt_prompt.delete("1.0", tk.END)
 		self.txt_prompt.insert("1.0", item.get("prompt",""))
 		self.txt_response.delete("1.0", tk.END)
@@ -344,7 +855,7 @@ class SessionTab(ttk.Frame):
 			self.load_current()
 
 	def on_import(self):
-		path = filedialog.askopenfilename(title="Import Session JSON", filetypes=[("JSON","*.json"),("All","*.*")])
+		path = filedialog.askopenfilename(title="Import Session JSON", filetypes=[("JSON", "*.json *.json.gz *.json.xz"), ("All", "*.*")])
 		if not path:
 			return
 		try:
@@ -361,7 +872,7 @@ class SessionTab(ttk.Frame):
 			pass
 
 
-class ReviewTab(ttk.Frame):
+class ReviewTab(LazyTab):
 	def __init__(self, parent, conn):
 		super().__init__(parent)
 		self.conn = conn
@@ -371,25 +882,40 @@ class ReviewTab(ttk.Frame):
 		self.llm_var = tk.StringVar(value="")
 		self.sit_var = tk.StringVar(value="")
 		self.session_var = tk.StringVar(value="")
-		self.cmb_llm = ttk.Combobox(filters, textvariable=self.llm_var, values=self._load_llms(), width=30)
-		self.cmb_sit = ttk.Combobox(filters, textvariable=self.sit_var, values=self._load_situations(), width=30)
-		self.cmb_session = ttk.Combobox(filters, textvariable=self.session_var, values=self._load_sessions(), width=30)
+		# Value lists are filled by reload_filter_values() when the tab is shown
+		self.cmb_llm = ttk.Combobox(filters, textvariable=self.llm_var, values=[""], width=30)
+		self.cmb_sit = ttk.Combobox(filters, textvariable=self.sit_var, values=[""], width=30)
+		self.cmb_session = ttk.Combobox(filters, textvariable=self.session_var, values=[""], width=30)
+		self.grouped_var = tk.BooleanVar(value=False)
+		self.chk_grouped = ttk.Checkbutton(filters, text="Group similar", variable=self.grouped_var, command=self.refresh)
+		self.search_var = tk.StringVar(value="")
+		self.ent_search = ttk.Entry(filters, textvariable=self.search_var, width=30)
+		self.ent_search.bind("<Return>", lambda _e: self.refresh())
 		self.btn_apply = ttk.Button(filters, text="Apply", command=self.refresh)
-		self.btn_export = ttk.Button(filters, text="Export CSV", command=self.on_export)
-		for w in (self.cmb_llm, self.cmb_sit, self.cmb_session, self.btn_apply, self.btn_export):
+		self.btn_export = ttk.Button(filters, text="Export…", command=self.on_export)
+		for w in (self.cmb_llm, self.cmb_sit, self.cmb_session, ttk.Label(filters, text="Search:"), self.ent_search, self.chk_grouped, self.btn_apply, self.btn_export):
 			w.pack(side=tk.LEFT, padx=6, pady=6)
 
 		self.lbl_summary = ttk.Label(self, text="")
 		self.lbl_summary.pack(fill=tk.X, padx=6, pady=6)
 
-		self.tree = ttk.Treeview(self, columns=("itime","stime","prompt","response","comment","rating"), show="headings")
+		# Rating a group rates every similar response, not only the listed one
+		cluster_bar = ttk.Frame(self)
+		cluster_bar.pack(fill=tk.X)
+		for text, rating in (("Rate group okay", "okay"), ("Rate group not okay", "not_okay"), ("Clear group rating", None)):
+			ttk.Button(cluster_bar, text=text, command=lambda r=rating: self.on_rate_cluster(r)).pack(side=tk.LEFT, padx=6, pady=(0, 6))
+
+		self.tree = ttk.Treeview(self, columns=("itime","stime","duration","prompt","action","response","comment","rating","size"), show="headings")
 		for col, label, w in (
 			("itime","Interaction Time",140),
 			("stime","Session Time",140),
+			("duration","Duration (ms)",90),
 			("prompt","Prompt",260),
+			("action","Action",110),
 			("response","Response",260),
 			("comment","Comment",200),
 			("rating","Rating",80),
+			("size","Similar",70),
 		):
 			self.tree.heading(col, text=label)
 			self.tree.column(col, width=w, anchor=tk.W)
@@ -398,15 +924,24 @@ class ReviewTab(ttk.Frame):
 		self.row_details: Dict[str, Dict] = {}
 		self.tree.bind("<Double-1>", self._on_tree_double_click)
 
+	def load(self) -> None:
+		self.reload_filter_values()
 		self.refresh()
 
+	def on_shown(self) -> None:
+		# Filter values and rows may change through other tabs, so the review
+		# tab reloads on every visit rather than only the first one.
+		self.loaded = True
+		self.load()
+
 	def reload_filter_values(self) -> None:
 		"""Reload combobox value lists from DB while preserving current selections if valid."""
 		current_llm = self.llm_var.get()
 		current_sit = self.sit_var.get()
 		current_session = self.session_var.get()
-		llms = self._load_llms()
-		sits = self._load_situations()
+		llms, sits = db.fetch_llm_and_situations(self.conn)
+		llms = [""] + llms
+		sits = [""] + sits
 		sessions = self._load_sessions()
 		self.cmb_llm.configure(values=llms)
 		self.cmb_sit.configure(values=sits)
@@ -424,14 +959,6 @@ class ReviewTab(ttk.Frame):
 		else:
 			self.session_var.set("")
 
-	def _load_llms(self) -> List[str]:
-		llms, _ = db.fetch_llm_and_situations(self.conn)
-		return [""] + llms
-
-	def _load_situations(self) -> List[str]:
-		_, sits = db.fetch_llm_and_situations(self.conn)
-		return [""] + sits
-
 	def _load_sessions(self) -> List[str]:
 		sessions = db.fetch_session_timestamps(self.conn)
 		return [""] + sessions
@@ -443,21 +970,43 @@ class ReviewTab(ttk.Frame):
 		llm = self.llm_var.get().strip() or None
 		sit = self.sit_var.get().strip() or None
 		session = self.session_var.get().strip() or None
-		ok, not_ok, rows = db.fetch_review(self.conn, llm, sit, session)
+		search = self.search_var.get().strip() or None
+		grouped = self.grouped_var.get()
+		ok, not_ok, rows = build_review_rows(self.conn, llm, sit, session, search, grouped)
 		den = ok + not_ok
 		ok_score = (ok / den) if den else None
-		self.lbl_summary.config(text=f"okay: {ok} | not_okay: {not_ok} | OK score: {ok_score:.2f}" if ok_score is not None else "okay: 0 | not_okay: 0 | OK score: —")
-		for r in rows:
-			data = dict(r)
-			itime = data.get("interaction_timestamp") or f"t={data.get('offset_ms', 0)} ms"
-			stime = data.get("session_timestamp") or ""
-			prompt = _extract_prompt_preview(data.get("prompt"))[:200]
-			response = _extract_response_preview(data.get("response"))[:200]
-			comment = (data.get("comment") or "")[:200]
-			rating = data.get("rating") or ""
-			iid = self.tree.insert("", tk.END, values=(itime, stime, prompt, response, comment, rating))
+		summary = f"okay: {ok} | not_okay: {not_ok} | OK score: {ok_score:.2f}" if ok_score is not None else "okay: 0 | not_okay: 0 | OK score: —"
+		if grouped:
+			summary += f" | {len(rows)} groups"
+		elif search:
+			summary += f" | {len(rows)} matches" + (f" (best {SEARCH_LIMIT})" if len(rows) >= SEARCH_LIMIT else "")
+			pending = db.search_index_pending(self.conn)
+			if pending:
+				summary += f" | {pending} older interactions not indexed yet"
+		self.lbl_summary.config(text=summary)
+		for values, data in rows:
+			iid = self.tree.insert("", tk.END, values=values)
 			self.row_details[iid] = data
 
+	def on_rate_cluster(self, rating: Optional[str]) -> None:
+		if not self.grouped_var.get():
+			messagebox.showinfo("Rate Group", "Tick \"Group similar\" and select a group first.")
+			return
+		clusters = {
+			int(self.row_details[i]["cluster_id"])
+			for i in self.tree.selection()
+			if self.row_details.get(i, {}).get("cluster_id") is not None
+		}
+		if not clusters:
+			messagebox.showinfo("Rate Group", "Select one or more groups first.")
+			return
+		label = rating.replace("_", " ") if rating else "unrated"
+		if not messagebox.askyesno("Rate Group", f"Mark all responses in {len(clusters)} selected group(s) as {label}?\n\nThis includes similar responses outside the current filters."):
+			return
+		for c in clusters:
+			db.update_cluster_rating(self.conn, c, rating)
+		self.refresh()
+
 	def _on_tree_double_click(self, event):
 		item_id = self.tree.identify_row(event.y)
 		if not item_id:
@@ -468,26 +1017,724 @@ class ReviewTab(ttk.Frame):
 		ReviewDetailPopup(self, data)
 
 	def on_export(self):
-		path = filedialog.asksaveasfilename(title="Export CSV", defaultextension=".csv", filetypes=[("CSV","*.csv")])
-		if not path:
+		params = {
+			"llm_name": self.llm_var.get().strip() or None,
+			"situation_id": self.sit_var.get().strip() or None,
+			"session_timestamp": self.session_var.get().strip() or None,
+			"search": self.search_var.get().strip() or None,
+		}
+		start_background_export(self, self.btn_export, "review", params, "Export Review")
+
+
+class PromptSizeTab(LazyTab):
+	"""Where prompt bytes go per LLM and NPC, and what they cost in latency."""
+
+	COLUMNS = (
+		("llm", "LLM", 160),
+		("situation", "NPC", 140),
+		("prompts", "Prompts", 70),
+		("bytes", "Avg bytes", 80),
+		("tokens", "Avg tokens", 80),
+		("history", "History", 70),
+		("description", "Description", 80),
+		("goal", "Goal+Policy", 80),
+		("env", "Environment", 80),
+		("minified", "Minify saves", 90),
+		("ms_per_kb", "ms / KB", 70),
+		("r", "r", 50),
+	)
+
+	def __init__(self, parent, conn):
+		super().__init__(parent)
+		self.conn = conn
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		ttk.Button(top, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=6, pady=6)
+		ttk.Label(
+			top,
+			text=f"Tokens estimated at {tokens.BYTES_PER_TOKEN:g} bytes each; durations matched from the performance log by model and time.",
+		).pack(side=tk.LEFT, padx=6)
+
+		self.tree = ttk.Treeview(self, columns=[c for c, _, _ in self.COLUMNS], show="headings")
+		for col, label, width in self.COLUMNS:
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=width, anchor=tk.W if col in {"llm", "situation"} else tk.CENTER)
+		self.tree.pack(fill=tk.BOTH, expand=True)
+
+	def load(self) -> None:
+		self.refresh()
+
+	def refresh(self):
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		for values in build_prompt_size_rows(self.conn):
+			self.tree.insert("", tk.END, values=values)
+
+
+class PromptCacheTab(LazyTab):
+	"""Simulated prefix-cache hits per LLM and NPC under different section orders."""
+
+	def __init__(self, parent, conn):
+		super().__init__(parent)
+		self.conn = conn
+		self.job: Optional[maintenance.BackgroundMaintenance] = None
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		self.btn_run = ttk.Button(top, text="Run Simulation", command=self.refresh)
+		self.btn_run.pack(side=tk.LEFT, padx=6, pady=6)
+		self.lbl_status = ttk.Label(top, text="")
+		self.lbl_status.pack(side=tk.LEFT, padx=6, pady=6)
+		ttk.Label(
+			top,
+			text="Share of prompt tokens matching an earlier prompt of the same NPC in the session (cacheable prefix).",
+		).pack(side=tk.LEFT, padx=6)
+
+		self.tree = ttk.Treeview(self, show="headings")
+		self.tree.pack(fill=tk.BOTH, expand=True)
+
+	def load(self) -> None:
+		# Replaying every prompt takes a while on big databases; wait for the button
+		pass
+
+	def refresh(self):
+		if self.job is not None:
 			return
-		llm = self.llm_var.get().strip() or None
-		sit = self.sit_var.get().strip() or None
-		session = self.session_var.get().strip() or None
-		_, _, rows = db.fetch_review(self.conn, llm, sit, session)
-		with open(path, "w", encoding="utf-8", newline="") as f:
-			writer = csv.writer(f)
-			writer.writerow(["interaction_time","session_time","prompt","response","comment","rating"]) 
-			for r in rows:
-				writer.writerow([
-					r["interaction_timestamp"] or f"t={r['offset_ms']} ms",
-					r["session_timestamp"] or "",
-					r["prompt"] or "",
-					r["response"] or "",
-					r["comment"] or "",
-					r["rating"] or "",
-				])
-			messagebox.showinfo("Export", "CSV exported.")
+		# Replays every prompt, so it runs on its own connection off the UI thread
+		self.job = maintenance.BackgroundMaintenance(
+			db.database_path(self.conn),
+			lambda conn, progress: dict(zip(("names", "rows"), build_prompt_cache_rows(conn))),
+		)
+		self.btn_run.configure(state=tk.DISABLED)
+		self.lbl_status.configure(text="Simulating…")
+		self.job.start()
+		self.after(200, self._poll_job)
+
+	def _poll_job(self):
+		job = self.job
+		if not job.done:
+			self.after(200, self._poll_job)
+			return
+		self.job = None
+		self.btn_run.configure(state=tk.NORMAL)
+		self.lbl_status.configure(text="")
+		if job.error is not None:
+			messagebox.showerror("Prompt Cache", str(job.error))
+			return
+		names, rows = job.result["names"], job.result["rows"]
+		columns = ["llm", "situation", "prompts", "tokens"] + names
+		self.tree.configure(columns=columns)
+		for col, label in zip(columns, ["LLM", "NPC", "Prompts", "Tokens"] + [n.replace("_", " ") for n in names]):
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=160 if col in {"llm", "situation"} else 100, anchor=tk.W if col in {"llm", "situation"} else tk.CENTER)
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		for values in rows:
+			self.tree.insert("", tk.END, values=values)
+
+
+class CompareTab(LazyTab):
+	"""Two LLMs side by side, with bootstrap intervals for the differences."""
+
+	def __init__(self, parent, conn):
+		super().__init__(parent)
+		self.conn = conn
+		self.job: Optional[maintenance.BackgroundMaintenance] = None
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		self.llm_a_var = tk.StringVar(value="")
+		self.llm_b_var = tk.StringVar(value="")
+		self.sit_var = tk.StringVar(value="")
+		# Set in load(): compare needs NumPy, which is only imported once the tab is shown
+		self.resamples_var = tk.StringVar(value="")
+		# Choices are re-read whenever a list opens, so new imports show up
+		self.cmb_a = ttk.Combobox(top, textvariable=self.llm_a_var, width=28, postcommand=self.reload_choices)
+		self.cmb_b = ttk.Combobox(top, textvariable=self.llm_b_var, width=28, postcommand=self.reload_choices)
+		self.cmb_sit = ttk.Combobox(top, textvariable=self.sit_var, width=20, postcommand=self.reload_choices)
+		self.btn_compare = ttk.Button(top, text="Compare", command=self.refresh)
+		for w in (
+			ttk.Label(top, text="A:"), self.cmb_a,
+			ttk.Label(top, text="B:"), self.cmb_b,
+			ttk.Label(top, text="NPC:"), self.cmb_sit,
+			ttk.Label(top, text="Resamples:"), ttk.Entry(top, textvariable=self.resamples_var, width=8),
+			self.btn_compare,
+		):
+			w.pack(side=tk.LEFT, padx=4, pady=6)
+
+		self.lbl_summary = ttk.Label(self, text="Differences are B − A with 95% bootstrap intervals; negative latency means B is faster.")
+		self.lbl_summary.pack(fill=tk.X, padx=6, pady=6)
+
+		self.tree = ttk.Treeview(self, columns=("metric","a","b","diff","ci","significant"), show="headings")
+		for col, label, w in (
+			("metric","Metric",160),
+			("a","A",100),
+			("b","B",100),
+			("diff","B − A",100),
+			("ci","95% interval",200),
+			("significant","Interval excludes 0",130),
+		):
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=w, anchor=tk.W if col == "metric" else tk.CENTER)
+		self.tree.pack(fill=tk.BOTH, expand=True)
+
+	def load(self) -> None:
+		from . import compare
+
+		if not self.resamples_var.get():
+			self.resamples_var.set(str(compare.DEFAULT_RESAMPLES))
+		self.reload_choices()
+		llms = list(self.cmb_a.cget("values"))
+		if len(llms) >= 2 and not self.llm_a_var.get():
+			self.llm_a_var.set(llms[0])
+			self.llm_b_var.set(llms[1])
+
+	def reload_choices(self) -> None:
+		# LLMs with performance rows, then those only known from sessions
+		llms = [r["llm_name"] for r in db.fetch_performance_overview(self.conn)]
+		review_llms, sits = db.fetch_llm_and_situations(self.conn)
+		llms += [n for n in review_llms if n not in llms]
+		self.cmb_a.configure(values=llms)
+		self.cmb_b.configure(values=llms)
+		self.cmb_sit.configure(values=[""] + [s for s in sits if s])
+
+	def refresh(self):
+		from . import compare
+
+		if self.job is not None:
+			return
+		llm_a, llm_b = self.llm_a_var.get().strip(), self.llm_b_var.get().strip()
+		if not llm_a or not llm_b:
+			messagebox.showinfo("Compare LLMs", "Choose the two LLMs to compare.")
+			return
+		try:
+			resamples = int(self.resamples_var.get())
+		except ValueError:
+			messagebox.showerror("Compare LLMs", "Resamples must be a whole number.")
+			return
+		situation = self.sit_var.get().strip() or None
+		# Bootstrapping takes seconds on large logs, so it runs on its own connection off the UI thread
+		self.job = maintenance.BackgroundMaintenance(
+			db.database_path(self.conn),
+			lambda conn, progress: compare.compare_llms(conn, llm_a, llm_b, situation, resamples=resamples),
+		)
+		self.btn_compare.configure(state=tk.DISABLED)
+		self.lbl_summary.configure(text="Comparing…")
+		self.job.start()
+		self.after(200, self._poll_job)
+
+	def _poll_job(self):
+		job = self.job
+		if not job.done:
+			self.after(200, self._poll_job)
+			return
+		self.job = None
+		self.btn_compare.configure(state=tk.NORMAL)
+		if job.error is not None:
+			self.lbl_summary.configure(text="")
+			messagebox.showerror("Compare LLMs", str(job.error))
+			return
+		report = job.result
+		self.lbl_summary.configure(
+			text=f"Calls: A {report['calls']['a']}, B {report['calls']['b']} | rated interactions: A {report['rated']['a']}, B {report['rated']['b']}"
+			f" | B − A with {report['confidence']:.0%} bootstrap intervals over {report['resamples']} resamples"
+		)
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		for values in build_comparison_rows(report):
+			self.tree.insert("", tk.END, values=values)
+
+
+class ConcurrencyTab(LazyTab):
+	"""Calls in flight over time and how latency grows with them."""
+
+	BAR = "#3b82f6"
+	SUBTLE = "#a9abb3"
+
+	def __init__(self, parent, conn):
+		super().__init__(parent)
+		self.conn = conn
+		self.report: Optional[Dict[str, object]] = None
+		self.job: Optional[maintenance.BackgroundMaintenance] = None
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		# Set in load(): concurrency needs NumPy, which is only imported once the tab is shown
+		self.bucket_var = tk.StringVar(value="")
+		self.btn_analyze = ttk.Button(top, text="Analyze", command=self.refresh)
+		self.btn_analyze.pack(side=tk.LEFT, padx=6, pady=6)
+		ttk.Label(top, text="Timeline seconds per bar:").pack(side=tk.LEFT, padx=6)
+		ttk.Entry(top, textvariable=self.bucket_var, width=6).pack(side=tk.LEFT, padx=6)
+		self.lbl_summary = ttk.Label(self, text="Calls start duration_ms before their logged time; this counts how many overlap.")
+		self.lbl_summary.pack(fill=tk.X, padx=6, pady=6)
+
+		self.canvas = tk.Canvas(self, height=160, bg="#131419", highlightthickness=0)
+		self.canvas.pack(fill=tk.X, padx=6, pady=6)
+		self.canvas.bind("<Configure>", lambda _e: self._draw_timeline())
+
+		self.tree = ttk.Treeview(self, columns=("calls","peak","peak_at","rpm","rpm90","p50","p90","avg"), show="tree headings")
+		self.tree.heading("#0", text="LLM / calls in flight at start")
+		self.tree.column("#0", width=240, anchor=tk.W)
+		for col, label, w in (
+			("calls","Calls",80),
+			("peak","Peak in flight",100),
+			("peak_at","Peak at",140),
+			("rpm","Peak calls/min",100),
+			("rpm90","P90 calls/min",100),
+			("p50","P50 (ms)",80),
+			("p90","P90 (ms)",80),
+			("avg","Avg (ms)",80),
+		):
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=w, anchor=tk.CENTER)
+		self.tree.pack(fill=tk.BOTH, expand=True)
+
+	def load(self) -> None:
+		# Reads every call with a timestamp; wait for the button
+		from . import concurrency
+
+		if not self.bucket_var.get():
+			self.bucket_var.set(str(concurrency.DEFAULT_BUCKET_S))
+
+	def refresh(self):
+		from . import concurrency
+
+		if self.job is not None:
+			return
+		try:
+			bucket_s = int(self.bucket_var.get())
+		except ValueError:
+			messagebox.showerror("Concurrency", "Seconds per bar must be a whole number.")
+			return
+		# Sweeps every timed call, so it runs on its own connection off the UI thread
+		self.job = maintenance.BackgroundMaintenance(
+			db.database_path(self.conn),
+			lambda conn, progress: concurrency.analyze(conn, bucket_s=bucket_s),
+		)
+		self.btn_analyze.configure(state=tk.DISABLED)
+		self.lbl_summary.configure(text="Analyzing…")
+		self.job.start()
+		self.after(200, self._poll_job)
+
+	def _poll_job(self):
+		job = self.job
+		if not job.done:
+			self.after(200, self._poll_job)
+			return
+		self.job = None
+		self.btn_analyze.configure(state=tk.NORMAL)
+		if job.error is not None:
+			self.lbl_summary.configure(text="")
+			messagebox.showerror("Concurrency", str(job.error))
+			return
+		self.report = job.result
+		overall = self.report["overall"]
+		if overall is None:
+			self.lbl_summary.configure(text="No calls with a timestamp yet.")
+		else:
+			rate = overall["calls_per_minute"]
+			self.lbl_summary.configure(
+				text=f"All LLMs: {overall['calls']} calls | peak {overall['peak_in_flight']} in flight at {overall['peak_at'][:19].replace('T', ' ')}"
+				f" | peak {rate['peak']} calls/min, P90 {rate['p90']:.0f} | timeline below leaves out idle time"
+			)
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		for parent, iid, text, values in build_concurrency_rows(self.report):
+			self.tree.insert(parent, tk.END, iid=iid, text=text, values=values)
+		self._draw_timeline()
+
+	def _draw_timeline(self) -> None:
+		"""Most calls in flight per bucket, active buckets side by side."""
+		self.canvas.delete("all")
+		if not self.report or self.report["overall"] is None:
+			return
+		buckets = self.report["overall"]["timeline"]
+		width = max(self.canvas.winfo_width(), 600)
+		height = int(self.canvas.cget("height"))
+		# Several buckets share a column when there are more than pixels
+		columns = min(len(buckets), width)
+		peaks = [0] * columns
+		for i, b in enumerate(buckets):
+			c = i * columns // len(buckets)
+			peaks[c] = max(peaks[c], b["max_in_flight"])
+		top = max(peaks) or 1
+		slot = width / columns
+		for c, peak in enumerate(peaks):
+			bar_h = (height - 30) * peak / top
+			self.canvas.create_rectangle(c * slot, height - 15 - bar_h, (c + 1) * slot, height - 15, fill=self.BAR, width=0)
+		self.canvas.create_text(4, 4, anchor=tk.NW, text=f"{top} in flight", fill=self.SUBTLE)
+		self.canvas.create_text(4, height - 2, anchor=tk.SW, text=buckets[0]["start"][:16].replace("T", " "), fill=self.SUBTLE)
+		self.canvas.create_text(width - 4, height - 2, anchor=tk.SE, text=buckets[-1]["start"][:16].replace("T", " "), fill=self.SUBTLE)
+
+
+class ActionsTab(LazyTab):
+	"""What the LLMs answered: action mix, goal outcomes and invalid JSON."""
+
+	def __init__(self, parent, conn):
+		super().__init__(parent)
+		self.conn = conn
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		ttk.Button(top, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=6, pady=6)
+
+		columns = [("llm", "LLM", 160), ("situation", "NPC", 140), ("responses", "Responses", 80)]
+		columns += [(t, t, 70) for t in ACTION_TYPES]
+		columns += [("achieved", "Goal achieved", 90), ("invalid", "Invalid JSON", 90), ("lenient", "Needed cleanup", 100)]
+		self.tree = ttk.Treeview(self, columns=[c for c, _, _ in columns], show="headings")
+		for col, label, width in columns:
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=width, anchor=tk.W if col in {"llm", "situation"} else tk.CENTER)
+		self.tree.pack(fill=tk.BOTH, expand=True)
+
+	def load(self) -> None:
+		self.refresh()
+
+	def refresh(self):
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		for values in build_action_rows(self.conn):
+			self.tree.insert("", tk.END, values=values)
+
+
+class StorageTab(LazyTab):
+	"""Database size by table, index and column, and the retention policy."""
+
+	def __init__(self, parent, conn, paths, config_obj):
+		super().__init__(parent)
+		self.conn = conn
+		self.paths = paths
+		self.config_obj = config_obj
+		self.job: Optional[maintenance.BackgroundMaintenance] = None
+		self.report_job: Optional[maintenance.BackgroundMaintenance] = None
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		self.btn_refresh = ttk.Button(top, text="Refresh", command=self.refresh)
+		self.btn_refresh.pack(side=tk.LEFT, padx=6, pady=6)
+		self.lbl_summary = ttk.Label(top, text="")
+		self.lbl_summary.pack(side=tk.LEFT, padx=6, pady=6)
+
+		policy = maintenance.RetentionPolicy.from_config(config_obj)
+		form = ttk.Frame(self)
+		form.pack(fill=tk.X)
+		self.raw_days_var = tk.StringVar(value="" if policy.raw_line_days is None else str(policy.raw_line_days))
+		self.archive_days_var = tk.StringVar(value="" if policy.archive_days is None else str(policy.archive_days))
+		self.archive_dir_var = tk.StringVar(value=str(policy.archive_dir or paths["app_dir"] / maintenance.ARCHIVE_DIR_NAME))
+		self.vacuum_var = tk.BooleanVar(value=False)
+		ttk.Label(form, text="Drop stored log lines older than").grid(row=0, column=0, sticky=tk.W, padx=6, pady=3)
+		ttk.Entry(form, textvariable=self.raw_days_var, width=6).grid(row=0, column=1, padx=6, pady=3)
+		ttk.Label(form, text="days").grid(row=0, column=2, sticky=tk.W)
+		ttk.Label(form, text="Archive unrated interactions older than").grid(row=1, column=0, sticky=tk.W, padx=6, pady=3)
+		ttk.Entry(form, textvariable=self.archive_days_var, width=6).grid(row=1, column=1, padx=6, pady=3)
+		ttk.Label(form, text="days to").grid(row=1, column=2, sticky=tk.W)
+		ttk.Entry(form, textvariable=self.archive_dir_var, width=50).grid(row=1, column=3, padx=6, pady=3)
+		ttk.Button(form, text="Browse…", command=self.on_browse).grid(row=1, column=4, padx=6, pady=3)
+		ttk.Checkbutton(form, text="Full VACUUM (once; later runs shrink the file incrementally)", variable=self.vacuum_var).grid(row=2, column=0, columnspan=4, sticky=tk.W, padx=6, pady=3)
+		self.btn_apply = ttk.Button(form, text="Apply Retention", command=self.on_apply)
+		self.btn_apply.grid(row=3, column=0, sticky=tk.W, padx=6, pady=6)
+		self.lbl_status = ttk.Label(form, text="")
+		self.lbl_status.grid(row=3, column=1, columnspan=4, sticky=tk.W, padx=6, pady=6)
+
+		self.tree = ttk.Treeview(self, columns=("kind","rows","size","share"), show="tree headings")
+		self.tree.heading("#0", text="Table / index / column")
+		self.tree.column("#0", width=300, anchor=tk.W)
+		for col, label, w in (("kind","Kind",80), ("rows","Rows",90), ("size","Size",100), ("share","Share of file",100)):
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=w, anchor=tk.CENTER)
+		self.tree.pack(fill=tk.BOTH, expand=True)
+
+	def load(self) -> None:
+		self.refresh()
+
+	def refresh(self):
+		if self.report_job is not None:
+			return
+		# Column sizes read every row, so the report is built on its own connection off the UI thread
+		self.report_job = maintenance.BackgroundMaintenance(
+			db.database_path(self.conn),
+			lambda conn, progress: maintenance.size_report(conn),
+		)
+		self.btn_refresh.configure(state=tk.DISABLED)
+		self.lbl_summary.configure(text="Measuring…")
+		self.report_job.start()
+		self.after(200, self._poll_report)
+
+	def _poll_report(self):
+		job = self.report_job
+		if not job.done:
+			self.after(200, self._poll_report)
+			return
+		self.report_job = None
+		self.btn_refresh.configure(state=tk.NORMAL)
+		if job.error is not None:
+			self.lbl_summary.configure(text="")
+			messagebox.showerror("Storage", str(job.error))
+			return
+		report = job.result
+		self.lbl_summary.configure(
+			text=f"File {_bytes(report['file_bytes'])} | free {_bytes(report['free_bytes'])} | auto-vacuum: {report['auto_vacuum']}"
+			+ ("" if report["objects"] is not None else " | table sizes from column totals (no dbstat)")
+		)
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		for parent, iid, text, values in build_storage_rows(report):
+			self.tree.insert(parent, tk.END, iid=iid, text=text, values=values)
+
+	def on_browse(self):
+		directory = filedialog.askdirectory(title="Archive folder", initialdir=self.archive_dir_var.get() or None)
+		if directory:
+			self.archive_dir_var.set(directory)
+
+	def _policy(self) -> Optional[maintenance.RetentionPolicy]:
+		try:
+			raw_days = int(self.raw_days_var.get()) if self.raw_days_var.get().strip() else None
+			archive_days = int(self.archive_days_var.get()) if self.archive_days_var.get().strip() else None
+		except ValueError:
+			messagebox.showerror("Retention", "Days must be whole numbers (or empty to keep everything).")
+			return None
+		archive_dir = self.archive_dir_var.get().strip()
+		return maintenance.RetentionPolicy(raw_days, archive_days, Path(archive_dir) if archive_dir else None)
+
+	def on_apply(self):
+		policy = self._policy()
+		if policy is None or self.job is not None:
+			return
+		what = []
+		if policy.raw_line_days is not None:
+			what.append(f"drop the stored log lines of calls older than {policy.raw_line_days} days")
+		if policy.archive_days is not None:
+			what.append(f"move unrated, uncommented interactions older than {policy.archive_days} days to {policy.archive_dir}")
+		if self.vacuum_var.get():
+			what.append("rebuild the file with VACUUM (blocks other programs using the database until done)")
+		if not what:
+			what.append("return free space to the file system")
+		if not messagebox.askyesno("Retention", "This will " + ", then ".join(what) + ". Continue?"):
+			return
+		self.config_obj["retention"] = policy.to_config()
+		vacuum = self.vacuum_var.get()
+		self.job = maintenance.BackgroundMaintenance(
+			db.database_path(self.conn),
+			lambda conn, progress: maintenance.apply_retention(conn, policy, vacuum=vacuum, progress=progress),
+		)
+		self.btn_apply.configure(state=tk.DISABLED)
+		self.job.start()
+		self.after(200, self._poll_job)
+
+	def _poll_job(self):
+		job = self.job
+		if not job.done:
+			self.lbl_status.configure(text=job.status)
+			self.after(200, self._poll_job)
+			return
+		self.job = None
+		self.btn_apply.configure(state=tk.NORMAL)
+		self.lbl_status.configure(text="")
+		if job.error is not None:
+			messagebox.showerror("Retention", str(job.error))
+		else:
+			r = job.result
+			messagebox.showinfo(
+				"Retention",
+				f"Log lines dropped: {r.get('raw_lines_dropped', 0)}\n"
+				f"Interactions archived: {r.get('archived', 0)}" + (f" to {r['archive']}" if r.get("archive") else "") + "\n"
+				f"File: {_bytes(r['file_bytes_before'])} → {_bytes(r['file_bytes_after'])}"
+				+ (f"\n{_bytes(r['free_bytes'])} are free for new data; tick Full VACUUM to shrink the file by it." if r["free_bytes"] else ""),
+			)
+		self.refresh()
+		self.winfo_toplevel().event_generate("<<DataUpdated>>")
+
+
+class ImportsTab(LazyTab):
+	"""Every import with its size and speed; one can be rolled back."""
+
+	def __init__(self, parent, conn):
+		super().__init__(parent)
+		self.conn = conn
+		self.job: Optional[maintenance.BackgroundMaintenance] = None
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		ttk.Button(top, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=6, pady=6)
+		self.btn_rollback = ttk.Button(top, text="Roll Back Selected…", command=self.on_rollback)
+		self.btn_rollback.pack(side=tk.LEFT, padx=6, pady=6)
+		self.lbl_status = ttk.Label(top, text="")
+		self.lbl_status.pack(side=tk.LEFT, padx=6, pady=6)
+
+		self.tree = ttk.Treeview(self, columns=("started","kind","source","calls","sessions","interactions","skipped","read","seconds","rate"), show="headings", selectmode="browse")
+		for col, label, w in (
+			("started","Started (UTC)",150),
+			("kind","Kind",110),
+			("source","Source",260),
+			("calls","Calls",80),
+			("sessions","Sessions",70),
+			("interactions","Interactions",90),
+			("skipped","Skipped",70),
+			("read","Read",80),
+			("seconds","Duration (s)",90),
+			("rate","Rows/s",80),
+		):
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=w, anchor=tk.W if col in ("started", "kind", "source") else tk.CENTER)
+		self.tree.pack(fill=tk.BOTH, expand=True)
+		self.tree_sync = TreeSync(self.tree)
+
+	def load(self) -> None:
+		self.refresh()
+
+	def on_shown(self) -> None:
+		# Imports happen on the other tabs and in the background
+		self.loaded = True
+		self.refresh()
+
+	def refresh(self):
+		self.tree_sync.update(build_import_rows(self.conn))
+
+	def on_rollback(self):
+		sel = self.tree.selection()
+		if not sel or self.job is not None:
+			return
+		batch_id = sel[0]
+		started, kind, source, calls, sessions, interactions = self.tree.item(batch_id, "values")[:6]
+		if not messagebox.askyesno(
+			"Roll Back Import",
+			f"Delete everything the {kind} import of {started} added from {source}: "
+			f"{calls} calls, {sessions} sessions (with any interactions added to them later) "
+			f"and {interactions} interactions, including their ratings and comments?",
+		):
+			return
+		self.job = maintenance.BackgroundMaintenance(
+			db.database_path(self.conn),
+			lambda conn, progress: maintenance.rollback_import(conn, batch_id, progress=progress),
+		)
+		self.btn_rollback.configure(state=tk.DISABLED)
+		self.job.start()
+		self.after(200, self._poll_job)
+
+	def _poll_job(self):
+		job = self.job
+		if not job.done:
+			self.lbl_status.configure(text=job.status)
+			self.after(200, self._poll_job)
+			return
+		self.job = None
+		self.btn_rollback.configure(state=tk.NORMAL)
+		self.lbl_status.configure(text="")
+		if job.error is not None:
+			messagebox.showerror("Roll Back Import", str(job.error))
+		else:
+			r = job.result
+			messagebox.showinfo(
+				"Roll Back Import",
+				f"Deleted {r['calls']} calls, {r['sessions']} sessions and {r['interactions']} interactions."
+				+ (f"\n{r['relinked']} interactions were linked to other calls." if r["relinked"] else ""),
+			)
+		self.refresh()
+		self.winfo_toplevel().event_generate("<<ImportRolledBack>>")
+		self.winfo_toplevel().event_generate("<<DataUpdated>>")
+
+
+class DiagnosticsTab(LazyTab):
+	"""Per-operation latency stats recorded by the instrument module."""
+
+	BAR = "#3b82f6"
+	SLOW_BAR = "#ef4444"
+	SUBTLE = "#a9abb3"
+
+	def __init__(self, parent):
+		super().__init__(parent)
+		self.stats: Dict[str, instrument.OperationStats] = {}
+
+		top = ttk.Frame(self)
+		top.pack(fill=tk.X)
+		ttk.Button(top, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=6, pady=6)
+		ttk.Button(top, text="Reset", command=self.on_reset).pack(side=tk.LEFT, padx=6, pady=6)
+		self.lbl_settings = ttk.Label(top, text="")
+		self.lbl_settings.pack(side=tk.LEFT, padx=6, pady=6)
+
+		self.tree = ttk.Treeview(self, columns=("op","count","p50","p90","max","slow","rows","bytes"), show="headings", height=10)
+		for col, label, w in (
+			("op","Operation",260),
+			("count","Calls",70),
+			("p50","P50 (ms)",80),
+			("p90","P90 (ms)",80),
+			("max","Max (ms)",80),
+			("slow","Slow",60),
+			("rows","Rows",90),
+			("bytes","Bytes",100),
+		):
+			self.tree.heading(col, text=label)
+			self.tree.column(col, width=w, anchor=tk.W if col == "op" else tk.CENTER)
+		self.tree.pack(fill=tk.X, padx=6, pady=6)
+		self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+		self.canvas = tk.Canvas(self, height=180, bg="#131419", highlightthickness=0)
+		self.canvas.pack(fill=tk.X, padx=6, pady=6)
+		self.txt_plan = tk.Text(self, height=8, wrap=tk.NONE)
+		self.txt_plan.configure(bg="#131419", fg="#e6e6e6", insertbackground="#e6e6e6", highlightthickness=0, bd=0)
+		self.txt_plan.pack(fill=tk.BOTH, expand=True, padx=6, pady=6)
+
+	def load(self) -> None:
+		self.refresh()
+
+	def on_shown(self) -> None:
+		self.loaded = True
+		self.refresh()
+
+	def on_reset(self):
+		instrument.reset()
+		self.refresh()
+
+	def refresh(self):
+		selected = self.tree.selection()
+		for i in self.tree.get_children():
+			self.tree.delete(i)
+		self.stats = {s.name: s for s in instrument.snapshot()}
+		self.lbl_settings.config(text=f"slow ≥ {instrument.settings.slow_ms:.0f} ms | EXPLAIN: {'on' if instrument.settings.explain_slow else 'off'}")
+		for name, s in self.stats.items():
+			p50 = s.percentile(0.5)
+			p90 = s.percentile(0.9)
+			self.tree.insert("", tk.END, iid=name, values=(
+				name,
+				s.count,
+				f"{p50:.1f}" if p50 is not None else "—",
+				f"{p90:.1f}" if p90 is not None else "—",
+				f"{s.max_ms:.1f}",
+				s.slow_count,
+				s.rows,
+				s.bytes,
+			))
+		if selected and selected[0] in self.stats:
+			self.tree.selection_set(selected[0])
+		else:
+			self._draw_histogram(None)
+
+	def _on_select(self, event):
+		sel = self.tree.selection()
+		self._draw_histogram(self.stats.get(sel[0]) if sel else None)
+
+	def _draw_histogram(self, stats: Optional[instrument.OperationStats]) -> None:
+		self.canvas.delete("all")
+		self.txt_plan.delete("1.0", tk.END)
+		if stats is None:
+			return
+		counts = stats.histogram()
+		labels = [f"≤{b:g}" for b in instrument.HISTOGRAM_BOUNDS_MS] + [f">{instrument.HISTOGRAM_BOUNDS_MS[-1]:g}"]
+		width = max(self.canvas.winfo_width(), 600)
+		height = int(self.canvas.cget("height"))
+		slot = width / len(counts)
+		peak = max(counts) or 1
+		for i, (count, label) in enumerate(zip(counts, labels)):
+			bar_h = (height - 40) * count / peak
+			x0 = i * slot + 4
+			x1 = (i + 1) * slot - 4
+			slow = i > 0 and instrument.HISTOGRAM_BOUNDS_MS[i - 1] >= instrument.settings.slow_ms
+			self.canvas.create_rectangle(x0, height - 20 - bar_h, x1, height - 20, fill=self.SLOW_BAR if slow else self.BAR, width=0)
+			self.canvas.create_text((x0 + x1) / 2, height - 10, text=label, fill=self.SUBTLE)
+			if count:
+				self.canvas.create_text((x0 + x1) / 2, height - 28 - bar_h, text=str(count), fill=self.SUBTLE)
+		self.txt_plan.insert("1.0", stats.last_plan or "No query plan captured (enable explain_slow_queries in config.json).")
 
 
 class ReviewDetailPopup(tk.Toplevel):
@@ -510,12 +1757,14 @@ class ReviewDetailPopup(tk.Toplevel):
 		sit = data.get("situation_id") or "—"
 		llm = data.get("llm_name") or "—"
 		rating = data.get("rating") or "—"
+		duration = data.get("call_duration_ms")
 
 		meta_lines = [
 			f"Interaction time: {itime}",
 			f"Session time: {stime}",
 			f"Situation: {sit}",
 			f"LLM: {llm}",
+			f"Call duration: {duration} ms" if duration is not None else "Call duration: —",
 			f"Rating: {rating}",
 		]
 		meta_label = ttk.Label(container, text="\n".join(meta_lines), justify=tk.LEFT)
@@ -0,0 +1,59 @@
+"""Minimal HTTP/1.1 for the local servers (replay server, collector).
+
+Enough of the protocol for JSON requests from the plugin and load tests
+on keep-alive connections; not meant to face the internet.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Dict, Optional, Tuple
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+_REASONS = {200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class BadRequest(Exception):
+	def __init__(self, status: int, message: str) -> None:
+		super().__init__(message)
+		self.status = status
+
+
+def http_response(status: int, payload: object, keep_alive: bool, headers: Optional[Dict[str, str]] = None) -> bytes:
+	body = json.dumps(payload).encode("utf-8") if status != 204 else b""
+	head = (
+		f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+		"Content-Type: application/json\r\n"
+		f"Content-Length: {len(body)}\r\n"
+		+ "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+		+ f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+	)
+	return head.encode("latin-1") + body
+
+
+async def read_http_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+	"""(method, path, lower-cased headers, body) of the next request; None at EOF."""
+	line = await reader.readline()
+	if not line.strip():
+		return None
+	try:
+		method, path, _ = line.decode("latin-1").split(" ", 2)
+	except ValueError:
+		raise BadRequest(400, "malformed request line") from None
+	headers: Dict[str, str] = {}
+	while True:
+		h = await reader.readline()
+		if h in (b"\r\n", b"\n", b""):
+			break
+		name, _, value = h.decode("latin-1").partition(":")
+		headers[name.strip().lower()] = value.strip()
+	try:
+		length = int(headers.get("content-length") or 0)
+	except ValueError:
+		raise BadRequest(400, "invalid Content-Length") from None
+	if length > MAX_BODY_BYTES:
+		raise BadRequest(413, "request too large")
+	body = await reader.readexactly(length) if length else b""
+	return method.upper(), path, headers, body
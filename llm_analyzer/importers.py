@@ -1,16 +1,53 @@
 from __future__ import annotations
 
 import csv
+import itertools
 import json
 import logging
 import re
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
 
-from . import db
+from . import db, logformats, prompts, responses, tokens
+from .instrument import instrumented
 from .utils import normalize_llm_name, parse_iso_datetime_to_utc
 
 
+def call_row(
+	values: Dict[str, object],
+	source_file: str,
+	line_no: int,
+	raw_line: Optional[str],
+	imported_at: str,
+	batch_id: str,
+) -> Optional[Dict[str, object]]:
+	"""llm_calls row from one parsed log line; None if it is not a valid call."""
+	llm = values.get("llm_name")
+	duration = values.get("duration_ms")
+	ts = values.get("call_timestamp")
+	if not llm or duration is None or duration == "":
+		return None
+	try:
+		dur = int(duration)
+	except Exception:
+		return None
+	if dur <= 0:
+		return None
+	return {
+		"imported_at": imported_at,
+		"source_file": source_file,
+		"source_line_no": line_no,
+		"llm_name": normalize_llm_name(str(llm)),
+		"call_timestamp": parse_iso_datetime_to_utc(str(ts)).isoformat() if ts else None,
+		"duration_ms": dur,
+		"raw_line": raw_line,
+		"import_batch_id": batch_id,
+	}
+
+
+@instrumented
 def import_performance_log_file(
 	conn,
 	file_path: Path,
@@ -18,135 +55,237 @@ def import_performance_log_file(
 	format_hint: Optional[str] = None,
 	custom_regex: Optional[str] = None,
 	store_raw_line: bool = True,
+	batch: Optional[db.ImportBatch] = None,
 ) -> Dict[str, int]:
+	"""Import a performance log in any format :mod:`logformats` detects.
+
+	``custom_regex`` (named groups like the regex formats) or
+	``format_hint`` override the detection.
+	"""
+	t0 = time.perf_counter()
 	path = Path(file_path)
-	batch_id = db.new_import_batch_id()
+	batch = batch or db.ImportBatch("performance_log", str(path))
+	batch_id = batch.id
 	imported_at = db.utc_now_iso()
 	insert_rows: List[Dict[str, object]] = []
 	skipped = 0
 	processed = 0
 
-	if custom_regex:
-		pattern = re.compile(custom_regex)
-		for i, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
-			if not line.strip():
-				continue
-			m = pattern.search(line)
-			if not m:
-				skipped += 1
-				continue
-			llm = m.groupdict().get("llm_name")
-			duration = m.groupdict().get("duration_ms")
-			ts = m.groupdict().get("call_timestamp")
-			if not llm or not duration:
-				skipped += 1
-				continue
-			try:
-				dur = int(duration)
-			except Exception:
-				skipped += 1
-				continue
-			if dur <= 0:
-				skipped += 1
-				continue
-			call_ts_utc = parse_iso_datetime_to_utc(ts).isoformat() if ts else None
-			insert_rows.append(
-				{
-					"imported_at": imported_at,
-					"source_file": str(path),
-					"source_line_no": i,
-					"llm_name": normalize_llm_name(llm),
-					"call_timestamp": call_ts_utc,
-					"duration_ms": dur,
-					"raw_line": line if store_raw_line else None,
-					"import_batch_id": batch_id,
-				}
-			)
-			processed += 1
-	elif (format_hint or path.suffix.lower()) in {".csv"}:
-		with path.open("r", encoding="utf-8", newline="") as f:
-			reader = csv.DictReader(f)
+	with logformats.open_log(path) as f:
+		# Detect the format by the first line that is not blank
+		head: List[str] = []
+		for line in f:
+			head.append(line)
+			if line.strip():
+				break
+		if custom_regex:
+			kind, pattern = "regex", re.compile(custom_regex)
+		elif not head[-1:] or not head[-1].strip():
+			kind, pattern = "jsonl", None
+		else:
+			kind, pattern = logformats.detect_format(head[-1], format_hint)
+		lines = itertools.chain(head, f)
+		if kind == "csv":
+			reader = csv.DictReader(lines)
 			for i, row in enumerate(reader, start=2):
-				llm = row.get("llm_name")
-				duration = row.get("duration_ms")
-				ts = row.get("call_timestamp")
-				if not llm or not duration:
+				call = call_row(row, str(path), i, None, imported_at, batch_id)
+				if call is None:
 					skipped += 1
 					continue
-				try:
-					dur = int(str(duration).strip())
-				except Exception:
-					skipped += 1
+				insert_rows.append(call)
+				processed += 1
+		else:
+			for i, line in enumerate(lines, start=1):
+				line = line.rstrip("\r\n")
+				if not line.strip():
 					continue
-				if dur <= 0:
+				if kind == "regex":
+					m = pattern.search(line)
+					values = m.groupdict() if m else None
+				else:
+					try:
+						values = json.loads(line)
+					except Exception:
+						values = None
+				row = call_row(values, str(path), i, line if store_raw_line else None, imported_at, batch_id) if isinstance(values, dict) else None
+				if row is None:
 					skipped += 1
 					continue
-				call_ts_utc = parse_iso_datetime_to_utc(ts).isoformat() if ts else None
-				insert_rows.append(
-					{
-						"imported_at": imported_at,
-						"source_file": str(path),
-						"source_line_no": i,
-						"llm_name": normalize_llm_name(llm),
-						"call_timestamp": call_ts_utc,
-						"duration_ms": dur,
-						"raw_line": None,
-						"import_batch_id": batch_id,
-					}
-				)
+				insert_rows.append(row)
 				processed += 1
-	else:
-		# JSONL assumed
-		for i, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
-			if not line.strip():
-				continue
-			try:
-				obj = json.loads(line)
-			except Exception:
-				skipped += 1
-				continue
-			llm = obj.get("llm_name")
-			duration = obj.get("duration_ms")
-			ts = obj.get("call_timestamp")
-			if not llm or duration is None:
-				skipped += 1
-				continue
-			try:
-				dur = int(duration)
-			except Exception:
-				skipped += 1
-				continue
-			if dur <= 0:
-				skipped += 1
-				continue
-			call_ts_utc = parse_iso_datetime_to_utc(ts).isoformat() if ts else None
-			insert_rows.append(
-				{
-					"imported_at": imported_at,
-					"source_file": str(path),
-					"source_line_no": i,
-					"llm_name": normalize_llm_name(llm),
-					"call_timestamp": call_ts_utc,
-					"duration_ms": dur,
-					"raw_line": line if store_raw_line else None,
-					"import_batch_id": batch_id,
-				}
-			)
-			processed += 1
 
 	with db.transaction(conn):
 		if insert_rows:
 			db.insert_llm_calls(conn, insert_rows)
+			db.link_interactions_to_calls(conn, batch_id)
+		db.record_import_batch(
+			conn, batch, (time.perf_counter() - t0) * 1000.0,
+			bytes_read=path.stat().st_size, calls=len(insert_rows), skipped=skipped,
+		)
 
-	return {"inserted": len(insert_rows), "skipped": skipped, "processed": processed}
+	return {"inserted": len(insert_rows), "skipped": skipped, "processed": processed, "import_batch_id": batch_id}
 
 
+@dataclass
+class LogTail:
+	"""Read position in a performance log that is still being appended to."""
+	offset: int = 0
+	line_no: int = 0
+	# Lines up to this number were imported before (e.g. by an earlier run)
+	imported_lines: int = 0
+	header: Optional[List[str]] = None
+
+
+def open_log_tail(conn, file_path: Path) -> LogTail:
+	"""Tail state for ``file_path`` that skips the lines already in llm_calls."""
+	return LogTail(imported_lines=db.fetch_last_source_line(conn, str(Path(file_path))))
+
+
+@instrumented
+def import_performance_log_tail(
+	conn,
+	file_path: Path,
+	tail: LogTail,
+	*,
+	store_raw_line: bool = True,
+	batch: Optional[db.ImportBatch] = None,
+) -> Dict[str, object]:
+	"""Import the complete lines appended to a CSV or JSONL log since ``tail``.
+
+	``tail`` is advanced past them; a trailing partial line is left for the
+	next call. A file that got shorter was replaced and is read from the
+	start. The result includes ``calls``, the (llm_name, duration_ms) of
+	every inserted row. Pass the same ``batch`` on every call to record a
+	whole watch as one import.
+	"""
+	t0 = time.perf_counter()
+	path = Path(file_path)
+	is_csv = path.suffix.lower() == ".csv"
+	with path.open("rb") as f:
+		if f.seek(0, 2) < tail.offset:
+			tail.offset = tail.line_no = tail.imported_lines = 0
+			tail.header = None
+		f.seek(tail.offset)
+		data = f.read()
+	end = data.rfind(b"\n")
+	if end < 0:
+		return {"inserted": 0, "skipped": 0, "processed": 0, "calls": []}
+	tail.offset += end + 1
+	batch = batch or db.ImportBatch("performance_log", str(path))
+	batch_id = batch.id
+	imported_at = db.utc_now_iso()
+	insert_rows: List[Dict[str, object]] = []
+	skipped = 0
+	for raw in data[:end].split(b"\n"):
+		tail.line_no += 1
+		line = raw.decode("utf-8", errors="replace").rstrip("\r")
+		if is_csv and tail.header is None:
+			tail.header = next(csv.reader([line]))
+			continue
+		if tail.line_no <= tail.imported_lines or not line.strip():
+			continue
+		try:
+			values = dict(zip(tail.header, next(csv.reader([line])))) if is_csv else json.loads(line)
+		except Exception:
+			values = None
+		row = call_row(values, str(path), tail.line_no, None if is_csv or not store_raw_line else line, imported_at, batch_id) if isinstance(values, dict) else None
+		if row is None:
+			skipped += 1
+			continue
+		insert_rows.append(row)
+	if insert_rows or skipped:
+		with db.transaction(conn):
+			if insert_rows:
+				db.insert_llm_calls(conn, insert_rows)
+				db.link_interactions_to_calls(conn, batch_id)
+			db.record_import_batch(
+				conn, batch, (time.perf_counter() - t0) * 1000.0,
+				bytes_read=end + 1, calls=len(insert_rows), skipped=skipped,
+			)
+	return {
+		"inserted": len(insert_rows),
+		"skipped": skipped,
+		"processed": len(insert_rows),
+		"calls": [(r["llm_name"], r["duration_ms"]) for r in insert_rows],
+	}
+
+
+def interaction_row(
+	item: object,
+	index: int,
+	started_at: Optional[str],
+	llm_name_norm: str,
+) -> Optional[Dict[str, object]]:
+	"""interactions row for one item of a session's ``interactions``; None if invalid."""
+	if not isinstance(item, dict):
+		return None
+	t_ms = item.get("t_ms")
+	situation_id = item.get("situation_id")
+	prompt = item.get("prompt")
+	response = item.get("response")
+	if t_ms is None or situation_id is None or prompt is None or response is None:
+		return None
+	try:
+		t_ms_int = int(t_ms)
+	except Exception:
+		return None
+	if t_ms_int < 0:
+		return None
+	if started_at:
+		base = parse_iso_datetime_to_utc(started_at).timestamp()
+		abs_ts = base + (t_ms_int / 1000.0)
+		interaction_dt = parse_iso_datetime_to_utc(started_at)
+		interaction_dt = interaction_dt.fromtimestamp(abs_ts, tz=interaction_dt.tzinfo)  # reuse tz
+		interaction_iso = interaction_dt.astimezone().astimezone().isoformat()
+	else:
+		interaction_iso = None
+	sections = prompts.decompose(str(prompt))
+	extra_obj = item.get("extra")
+	extra_text = json.dumps(extra_obj, ensure_ascii=False) if isinstance(extra_obj, (dict, list)) else None
+	return {
+		"interaction_timestamp": interaction_iso,
+		"offset_ms": t_ms_int,
+		"situation_id": str(situation_id),
+		"prompt": str(prompt),
+		"response": str(response),
+		"comment": None,
+		"rating": None,
+		"llm_name": llm_name_norm,
+		"index_in_session": index,
+		"extra": extra_text,
+		"prompt_tokens": tokens.count(str(prompt)),
+		"response_tokens": tokens.count(str(response)),
+		"sections": sections.as_row(),
+		"action": responses.parse(str(response), sections.prompt_kind).as_row(),
+	}
+
+
+def _interaction_rows(
+	interactions: List[object],
+	started_at: Optional[str],
+	llm_name_norm: str,
+	stored: AbstractSet[int] = frozenset(),
+) -> List[Dict[str, object]]:
+	rows = (interaction_row(item, idx, started_at, llm_name_norm) for idx, item in enumerate(interactions) if idx not in stored)
+	return [r for r in rows if r is not None]
+
+
+@instrumented
 def import_session_json_file(
 	conn,
 	file_path: Path,
+	batch: Optional[db.ImportBatch] = None,
 ) -> Dict[str, int]:
+	"""Import a session file, or what was added to an already imported one.
+
+	Appended interactions belong to ``batch`` (a new one by default), not
+	to the batch of their session, so either can be rolled back alone.
+	"""
+	t0 = time.perf_counter()
 	path = Path(file_path)
-	payload = json.loads(path.read_text(encoding="utf-8"))
+	with logformats.open_log(path) as f:
+		text = f.read()
+	payload = json.loads(text)
 	if not isinstance(payload, dict):
 		raise ValueError("Session JSON must be an object")
 	llm_name = payload.get("llm_name")
@@ -159,7 +298,8 @@ def import_session_json_file(
 	started_at_utc = parse_iso_datetime_to_utc(started_at).isoformat() if started_at else None
 
 	checksum = db.session_checksum(payload)
-	batch_id = db.new_import_batch_id()
+	batch = batch or db.ImportBatch("session", str(path))
+	batch_id = batch.id
 	imported_at = db.utc_now_iso()
 
 	# Deduplicate
@@ -169,50 +309,25 @@ def import_session_json_file(
 	if exists:
 		return {"inserted_sessions": 0, "inserted_interactions": 0, "skipped_duplicates": 1}
 
-	# Build interactions
-	insert_interactions: List[Dict[str, object]] = []
-	inserted = 0
-	for idx, item in enumerate(interactions):
-		if not isinstance(item, dict):
-			continue
-		t_ms = item.get("t_ms")
-		situation_id = item.get("situation_id")
-		prompt = item.get("prompt")
-		response = item.get("response")
-		if t_ms is None or situation_id is None or prompt is None or response is None:
-			continue
-		try:
-			t_ms_int = int(t_ms)
-		except Exception:
-			continue
-		if t_ms_int < 0:
-			continue
-		interaction_ts_src = item.get("timestamp")
-		if started_at_utc:
-			base = parse_iso_datetime_to_utc(started_at).timestamp()
-			abs_ts = base + (t_ms_int / 1000.0)
-			interaction_dt = parse_iso_datetime_to_utc(started_at)
-			interaction_dt = interaction_dt.fromtimestamp(abs_ts, tz=interaction_dt.tzinfo)  # reuse tz
-			interaction_iso = interaction_dt.astimezone().astimezone().isoformat()
-		else:
-			interaction_iso = None
-		extra_obj = item.get("extra")
-		extra_text = json.dumps(extra_obj, ensure_ascii=False) if isinstance(extra_obj, (dict, list)) else None
-		insert_interactions.append(
-			{
-				"interaction_timestamp": interaction_iso,
-				"offset_ms": t_ms_int,
-				"situation_id": str(situation_id),
-				"prompt": str(prompt),
-				"response": str(response),
-				"comment": None,
-				"rating": None,
-				"llm_name": llm_name_norm,
-				"index_in_session": idx,
-				"extra": extra_text,
-			}
-		)
-		inserted += 1
+	# A session file is rewritten after every interaction; a known session
+	# only gets the interactions it does not have yet (the collector may
+	# have stored later ones before the plugin fell back to the file)
+	existing = db.fetch_session_by_guid(conn, session_guid) if session_guid else None
+	stored = db.fetch_session_indexes(conn, existing["id"]) if existing is not None else frozenset()
+	insert_interactions = _interaction_rows(interactions, started_at, llm_name_norm, stored)
+	inserted = len(insert_interactions)
+
+	if existing is not None:
+		with db.transaction(conn):
+			db.append_session_interactions(conn, existing["id"], insert_interactions, batch_id, checksum)
+			db.link_interactions_to_calls(conn, batch_id)
+			# Grouping responses takes a while on a large history; it runs afterwards
+			db.schedule_clustering(conn)
+			db.record_import_batch(
+				conn, batch, (time.perf_counter() - t0) * 1000.0,
+				bytes_read=len(text.encode("utf-8")), interactions=inserted,
+			)
+		return {"inserted_sessions": 0, "inserted_interactions": inserted, "skipped_duplicates": 0}
 
 	session_row = {
 		"session_guid": session_guid,
@@ -226,5 +341,11 @@ def import_session_json_file(
 
 	with db.transaction(conn):
 		db.insert_session_with_interactions(conn, session_row, insert_interactions)
+		db.link_interactions_to_calls(conn, batch_id)
+		db.schedule_clustering(conn)
+		db.record_import_batch(
+			conn, batch, (time.perf_counter() - t0) * 1000.0,
+			bytes_read=len(text.encode("utf-8")), sessions=1, interactions=inserted,
+		)
 
 	return {"inserted_sessions": 1, "inserted_interactions": inserted, "skipped_duplicates": 0}
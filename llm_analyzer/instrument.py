@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+HISTOGRAM_BOUNDS_MS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+WINDOW_SIZE = 1000
+
+
+@dataclass
+class InstrumentSettings:
+	slow_ms: float = 200.0
+	explain_slow: bool = False
+	max_explained_statements: int = 10
+
+
+@dataclass
+class OperationStats:
+	name: str
+	count: int = 0
+	total_ms: float = 0.0
+	max_ms: float = 0.0
+	rows: int = 0
+	bytes: int = 0
+	slow_count: int = 0
+	recent_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=WINDOW_SIZE))
+	last_plan: Optional[str] = None
+
+	def percentile(self, p: float) -> Optional[float]:
+		data = sorted(self.recent_ms)
+		if not data:
+			return None
+		index = max(0, min(len(data) - 1, int(round(p * len(data))) - 1))
+		return data[index]
+
+	def histogram(self) -> List[int]:
+		counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+		for ms in self.recent_ms:
+			for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+				if ms <= bound:
+					counts[i] += 1
+					break
+			else:
+				counts[-1] += 1
+		return counts
+
+
+settings = InstrumentSettings()
+_stats: Dict[str, OperationStats] = {}
+_lock = threading.Lock()
+# Statement buffers of the instrumented calls active on this thread; nested
+# calls (an importer calling db.insert_*) share one trace callback.
+_local = threading.local()
+
+
+def configure(slow_ms: Optional[float] = None, explain_slow: Optional[bool] = None) -> None:
+	if slow_ms is not None:
+		settings.slow_ms = float(slow_ms)
+	if explain_slow is not None:
+		settings.explain_slow = bool(explain_slow)
+
+
+def reset() -> None:
+	with _lock:
+		_stats.clear()
+
+
+def snapshot() -> List[OperationStats]:
+	"""Copy of the rolling stats table, sorted by total time spent."""
+	with _lock:
+		items = [
+			OperationStats(
+				name=s.name,
+				count=s.count,
+				total_ms=s.total_ms,
+				max_ms=s.max_ms,
+				rows=s.rows,
+				bytes=s.bytes,
+				slow_count=s.slow_count,
+				recent_ms=deque(s.recent_ms, maxlen=WINDOW_SIZE),
+				last_plan=s.last_plan,
+			)
+			for s in _stats.values()
+		]
+	return sorted(items, key=lambda s: s.total_ms, reverse=True)
+
+
+def _result_size(result: object) -> Tuple[Optional[int], int]:
+	"""Rows and approximate bytes of a query result."""
+	rows: Optional[List[object]] = None
+	if isinstance(result, list):
+		rows = result
+	elif isinstance(result, tuple) and result and isinstance(result[-1], list):
+		# (okay, not_okay, rows) from fetch_review
+		rows = result[-1]
+	if rows is None:
+		return None, 0
+	size = 0
+	for r in rows:
+		if isinstance(r, sqlite3.Row):
+			for v in r:
+				if isinstance(v, (str, bytes)):
+					size += len(v)
+	return len(rows), size
+
+
+def _input_bytes(args: tuple, kwargs: dict) -> int:
+	path = kwargs.get("file_path", args[1] if len(args) > 1 else None)
+	if isinstance(path, (str, Path)):
+		try:
+			return Path(path).stat().st_size
+		except OSError:
+			return 0
+	return 0
+
+
+def _explain(conn: sqlite3.Connection, statements: List[str]) -> Optional[str]:
+	plans: List[str] = []
+	for sql in statements[: settings.max_explained_statements]:
+		head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+		if head not in {"SELECT", "WITH"}:
+			continue
+		try:
+			detail = [r[-1] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+		except sqlite3.Error as e:
+			detail = [f"(explain failed: {e})"]
+		plans.append(sql.strip() + "\n  " + "\n  ".join(detail))
+	return "\n".join(plans) if plans else None
+
+
+def _trace(sql: str) -> None:
+	for buf in _local.buffers:
+		buf.append(sql)
+
+
+def _record(name: str, elapsed_ms: float, rows: int, nbytes: int, plan: Optional[str]) -> None:
+	with _lock:
+		s = _stats.get(name)
+		if s is None:
+			s = _stats[name] = OperationStats(name)
+		s.count += 1
+		s.total_ms += elapsed_ms
+		s.max_ms = max(s.max_ms, elapsed_ms)
+		s.rows += rows
+		s.bytes += nbytes
+		s.recent_ms.append(elapsed_ms)
+		if elapsed_ms >= settings.slow_ms:
+			s.slow_count += 1
+			if plan:
+				s.last_plan = plan
+
+
+def instrumented(fn: Callable) -> Callable:
+	"""Record wall time, rows and bytes of a function taking ``conn`` first.
+
+	Rows are the length of a returned list, otherwise the number of rows
+	changed on the connection. Calls slower than ``settings.slow_ms`` are
+	logged, with their query plans when ``settings.explain_slow`` is set.
+	"""
+	name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+	reads_file = fn.__module__.endswith(".importers")
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		conn = args[0] if args and isinstance(args[0], sqlite3.Connection) else None
+		statements: List[str] = []
+		tracing = conn is not None and settings.explain_slow
+		buffers = getattr(_local, "buffers", None)
+		if buffers is None:
+			buffers = _local.buffers = []
+		outermost = tracing and not buffers
+		if tracing:
+			buffers.append(statements)
+		if outermost:
+			conn.set_trace_callback(_trace)
+		changes_before = conn.total_changes if conn is not None else 0
+		t0 = time.perf_counter()
+		try:
+			result = fn(*args, **kwargs)
+		finally:
+			elapsed_ms = (time.perf_counter() - t0) * 1000.0
+			if tracing:
+				buffers.pop()
+			if outermost:
+				conn.set_trace_callback(None)
+		rows, nbytes = _result_size(result)
+		if rows is None:
+			rows = (conn.total_changes - changes_before) if conn is not None else 0
+		if reads_file:
+			nbytes = _input_bytes(args, kwargs)
+		plan = None
+		if elapsed_ms >= settings.slow_ms:
+			if tracing:
+				plan = _explain(conn, statements)
+			logger.warning(
+				"Slow operation %s: %.1f ms, rows=%s, bytes=%s%s",
+				name, elapsed_ms, rows, nbytes, ("\n" + plan) if plan else "",
+			)
+		else:
+			logger.debug("%s: %.1f ms, rows=%s, bytes=%s", name, elapsed_ms, rows, nbytes)
+		_record(name, elapsed_ms, rows, nbytes, plan)
+		return result
+
+	return wrapper
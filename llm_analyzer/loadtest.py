@@ -0,0 +1,311 @@
+"""Load generator for LLM backends.
+
+Replays recorded prompts against an OpenAI- or Anthropic-compatible
+endpoint, either with a fixed number of requests in flight (closed loop)
+or at a target arrival rate (open loop), and records every successful
+call into ``llm_calls`` under one import batch. The Performance tab then
+shows the backend's latency percentiles like those of a played session.
+Failed calls (refused, timed out, non-200) are only counted in the
+summary; their durations say nothing about the backend's latency.
+
+In open-loop mode a call's duration is measured from when it was due to be
+sent, so time spent waiting for a free connection counts against the
+backend instead of silently lowering the offered load.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import sqlite3
+import ssl
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from . import db
+from .utils import nearest_rank_percentile, normalize_llm_name
+
+PROVIDERS = ("openai", "anthropic")
+DEFAULT_TIMEOUT_S = 60.0
+# Recorded prompts hold only the user message; the system prompt is the
+# plugin's and not logged, so a short stand-in keeps requests valid.
+SYSTEM_PROMPT = (
+	"You control an NPC in a RPG Maker MZ game. Return EXACTLY ONE minified JSON object and nothing else."
+)
+ANTHROPIC_VERSION = "2023-06-01"
+MAX_TOKENS = 256
+# Calls are written in batches of this many rows
+_FLUSH_ROWS = 200
+
+
+def request_body(provider: str, model: str, prompt: str) -> dict:
+	"""Request as the plugin builds it for ``provider``."""
+	if provider == "anthropic":
+		return {
+			"model": model,
+			"max_tokens": MAX_TOKENS,
+			"system": SYSTEM_PROMPT,
+			"messages": [{"role": "user", "content": prompt}],
+		}
+	return {
+		"model": model,
+		"response_format": {"type": "json_object"},
+		"messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+	}
+
+
+def request_headers(provider: str, api_key: Optional[str]) -> Dict[str, str]:
+	headers = {"Content-Type": "application/json"}
+	if api_key and provider == "anthropic":
+		headers["x-api-key"] = api_key
+		headers["anthropic-version"] = ANTHROPIC_VERSION
+	elif api_key:
+		headers["Authorization"] = "Bearer " + api_key
+	return headers
+
+
+class _Connection:
+	__slots__ = ("reader", "writer")
+
+	def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		self.reader = reader
+		self.writer = writer
+
+	def close(self) -> None:
+		self.writer.close()
+
+
+class ConnectionPool:
+	"""Keep-alive HTTP/1.1 connections to one origin, at most ``size`` at a time."""
+
+	def __init__(self, url: str, size: int) -> None:
+		parts = urlsplit(url)
+		if parts.scheme not in ("http", "https"):
+			raise ValueError(f"Unsupported URL scheme: {url}")
+		self.host = parts.hostname or "localhost"
+		self.port = parts.port or (443 if parts.scheme == "https" else 80)
+		self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+		self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+		self.host_header = parts.netloc
+		self._slots = asyncio.Semaphore(size)
+		self._idle: List[_Connection] = []
+		self.opened = 0
+
+	async def _open(self) -> _Connection:
+		reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+		self.opened += 1
+		return _Connection(reader, writer)
+
+	async def post(self, body: bytes, headers: Dict[str, str]) -> Tuple[int, bytes]:
+		"""POST ``body``; returns (status, response body)."""
+		async with self._slots:
+			conn = self._idle.pop() if self._idle else None
+			if conn is not None:
+				try:
+					return await self._roundtrip(conn, body, headers)
+				except (ConnectionError, asyncio.IncompleteReadError):
+					# The server closed an idle connection; retry once on a new one
+					conn.close()
+			return await self._roundtrip(await self._open(), body, headers)
+
+	async def _roundtrip(self, conn: _Connection, body: bytes, headers: Dict[str, str]) -> Tuple[int, bytes]:
+		head = [f"POST {self.path} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(body)}"]
+		head.extend(f"{k}: {v}" for k, v in headers.items())
+		conn.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+		try:
+			await conn.writer.drain()
+			status, response, keep_alive = await _read_response(conn.reader)
+		except BaseException:
+			conn.close()
+			raise
+		if keep_alive:
+			self._idle.append(conn)
+		else:
+			conn.close()
+		return status, response
+
+	def close(self) -> None:
+		for conn in self._idle:
+			conn.close()
+		self._idle.clear()
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes, bool]:
+	line = await reader.readline()
+	if not line:
+		raise ConnectionResetError("connection closed")
+	status = int(line.split(b" ", 2)[1])
+	headers: Dict[str, str] = {}
+	while True:
+		h = await reader.readline()
+		if h in (b"\r\n", b"\n", b""):
+			break
+		name, _, value = h.decode("latin-1").partition(":")
+		headers[name.strip().lower()] = value.strip()
+	keep_alive = headers.get("connection", "").lower() != "close"
+	if headers.get("transfer-encoding", "").lower() == "chunked":
+		chunks = []
+		while True:
+			size = int((await reader.readline()).split(b";", 1)[0], 16)
+			if size == 0:
+				# Trailers end with an empty line
+				while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+					pass
+				break
+			chunks.append(await reader.readexactly(size))
+			await reader.readline()
+		return status, b"".join(chunks), keep_alive
+	if "content-length" in headers:
+		return status, await reader.readexactly(int(headers["content-length"])), keep_alive
+	return status, await reader.read(), False
+
+
+def load_prompts(conn: sqlite3.Connection, limit: int) -> List[str]:
+	"""Up to ``limit`` recorded prompts, oldest first."""
+	result: List[str] = []
+	for batch in db.iter_prompt_responses(conn):
+		result.extend(r["prompt"] for r in batch if r["prompt"])
+		if len(result) >= limit:
+			break
+	return result[:limit]
+
+
+class _Recorder:
+	"""Buffers successful calls as llm_calls rows and writes them in batches."""
+
+	def __init__(self, conn: sqlite3.Connection, url: str, llm_name: str, batch: db.ImportBatch, settings: Dict[str, object]) -> None:
+		self.conn = conn
+		self.url = url
+		self.llm_name = llm_name
+		self.batch = batch
+		self.settings = settings
+		self.imported_at = db.utc_now_iso()
+		self.pending: List[Dict[str, object]] = []
+		self.durations: List[int] = []
+		self.errors = 0
+		# "timeout", "HTTP 429", "ConnectionRefusedError", ... -> count
+		self.error_kinds: Dict[str, int] = {}
+
+	def add(self, seq: int, started: float, duration_ms: int, status: Optional[int], error: Optional[str]) -> None:
+		if error is not None or status != 200:
+			self.errors += 1
+			kind = error.split(":", 1)[0] if error is not None else f"HTTP {status}"
+			self.error_kinds[kind] = self.error_kinds.get(kind, 0) + 1
+			return
+		self.durations.append(duration_ms)
+		self.pending.append({
+			"imported_at": self.imported_at,
+			"source_file": f"loadtest:{self.url}",
+			"source_line_no": seq,
+			"llm_name": self.llm_name,
+			# When the call ended, as the plugin records it
+			"call_timestamp": datetime.fromtimestamp(started + duration_ms / 1000.0, timezone.utc).isoformat(),
+			"duration_ms": duration_ms,
+			"raw_line": json.dumps(dict(self.settings, status=status, error=error)),
+			"import_batch_id": self.batch.id,
+		})
+		if len(self.pending) >= _FLUSH_ROWS:
+			self.flush()
+
+	def flush(self) -> None:
+		if not self.pending:
+			return
+		t0 = time.perf_counter()
+		with db.transaction(self.conn):
+			db.insert_llm_calls(self.conn, self.pending)
+			db.record_import_batch(self.conn, self.batch, (time.perf_counter() - t0) * 1000.0, calls=len(self.pending))
+		self.pending = []
+
+
+async def run(
+	conn: sqlite3.Connection,
+	url: str,
+	model: str,
+	provider: str = "openai",
+	api_key: Optional[str] = None,
+	requests: int = 100,
+	concurrency: int = 8,
+	rate: Optional[float] = None,
+	label: Optional[str] = None,
+	timeout_s: float = DEFAULT_TIMEOUT_S,
+	seed: Optional[int] = None,
+) -> Dict[str, object]:
+	"""Send ``requests`` recorded prompts to ``url`` and record the successful ones in llm_calls.
+
+	Without ``rate``, ``concurrency`` requests are kept in flight. With
+	``rate`` (requests per second), arrivals are Poisson and ``concurrency``
+	caps the open connections. Calls are stored under llm_name ``label``
+	(default ``loadtest:<model>``) and a new import_batch_id.
+	"""
+	if provider not in PROVIDERS:
+		raise ValueError(f"provider must be one of {PROVIDERS}")
+	prompts_list = load_prompts(conn, requests)
+	if not prompts_list:
+		raise ValueError("No recorded prompts to replay; import a session first")
+	batch = db.ImportBatch("loadtest", f"loadtest:{url}")
+	llm_name = normalize_llm_name(label or f"loadtest:{model}")
+	settings = {"provider": provider, "model": model, "concurrency": concurrency, "rate": rate}
+	recorder = _Recorder(conn, url, llm_name, batch, settings)
+	pool = ConnectionPool(url, concurrency)
+	headers = request_headers(provider, api_key)
+
+	def bodies() -> Iterator[Tuple[int, bytes]]:
+		for seq in range(requests):
+			prompt = prompts_list[seq % len(prompts_list)]
+			yield seq + 1, json.dumps(request_body(provider, model, prompt)).encode("utf-8")
+
+	async def call(seq: int, body: bytes, due: float) -> None:
+		status: Optional[int] = None
+		error: Optional[str] = None
+		try:
+			status, _ = await asyncio.wait_for(pool.post(body, headers), timeout_s)
+		except asyncio.TimeoutError:
+			error = "timeout"
+		except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+			error = f"{type(e).__name__}: {e}"
+		duration_ms = max(1, int(round((time.time() - due) * 1000)))
+		recorder.add(seq, due, duration_ms, status, error)
+
+	started = time.time()
+	try:
+		if rate:
+			rng = random.Random(seed)
+			tasks = []
+			due = started
+			for seq, body in bodies():
+				delay = due - time.time()
+				if delay > 0:
+					await asyncio.sleep(delay)
+				tasks.append(asyncio.ensure_future(call(seq, body, due)))
+				due += rng.expovariate(rate)
+			await asyncio.gather(*tasks)
+		else:
+			work = bodies()
+
+			async def worker() -> None:
+				for seq, body in work:
+					await call(seq, body, time.time())
+
+			await asyncio.gather(*(worker() for _ in range(concurrency)))
+	finally:
+		recorder.flush()
+		pool.close()
+	elapsed = time.time() - started
+	durations = recorder.durations
+	return {
+		"import_batch_id": batch.id,
+		"llm_name": llm_name,
+		"requests": requests,
+		"ok": len(durations),
+		"errors": recorder.errors,
+		"error_kinds": recorder.error_kinds,
+		"connections_opened": pool.opened,
+		"elapsed_s": elapsed,
+		"throughput_rps": len(durations) / elapsed if elapsed > 0 else None,
+		"p50_ms": nearest_rank_percentile(durations, 0.50),
+		"p95_ms": nearest_rank_percentile(durations, 0.95),
+		"p99_ms": nearest_rank_percentile(durations, 0.99),
+		"max_ms": max(durations) if durations else None,
+	}
@@ -0,0 +1,118 @@
+"""Reading performance logs: compression and format detection.
+
+Archived playtest logs are often compressed. :func:`open_log` recognizes
+gzip, bzip2 and xz (and zstd with the ``zstandard`` package) by their first
+bytes, whatever the file is called, and decompresses while reading.
+
+:func:`detect_format` tells the formats apart by the first line: the
+plugin's CSV with its header, JSON lines, or one of the named regular
+expressions in :data:`REGEX_FORMATS`. More can be added with
+:func:`register_regex_format` or under ``log_formats`` in config.json; they
+need named groups ``llm_name``, ``duration_ms`` and optionally
+``call_timestamp``.
+"""
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import re
+from pathlib import Path
+from typing import Dict, IO, Optional, Tuple
+
+try:
+	import zstandard
+except ImportError:  # optional; only needed for .zst logs
+	zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of each compressed format
+_MAGIC = {
+	b"\x1f\x8b": "gzip",
+	b"BZh": "bzip2",
+	b"\xfd7zXZ\x00": "xz",
+	b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+REGEX_FORMATS: Dict[str, "re.Pattern[str]"] = {}
+
+
+def register_regex_format(name: str, pattern: str) -> None:
+	"""Recognize lines matching ``pattern`` as the format ``name``."""
+	compiled = re.compile(pattern)
+	missing = {"llm_name", "duration_ms"} - set(compiled.groupindex)
+	if missing:
+		raise ValueError(f"Log format {name!r} lacks the groups {', '.join(sorted(missing))}")
+	REGEX_FORMATS[name] = compiled
+
+
+# performance.csv rows without their header, e.g. a log split into parts
+register_regex_format("csv_no_header", r"^\s*(?P<llm_name>[^,\s][^,]*),(?P<duration_ms>\d+),(?P<call_timestamp>[^,]*?)\s*$")
+# key=value lines as written by many proxies and loggers, in any order
+register_regex_format(
+	"logfmt",
+	r'(?=.*\bllm_name="?(?P<llm_name>[^"\s]+))(?=.*\bduration_ms=(?P<duration_ms>\d+))(?:(?=.*\bcall_timestamp="?(?P<call_timestamp>[^"\s]+)))?',
+)
+
+
+def configure(formats: Optional[Dict[str, str]]) -> None:
+	"""Register the ``log_formats`` object of config.json (name -> regex)."""
+	for name, pattern in (formats or {}).items():
+		try:
+			register_regex_format(name, pattern)
+		except (re.error, ValueError) as e:
+			logger.warning("Ignoring log format %r: %s", name, e)
+
+
+def compression(path: Path) -> Optional[str]:
+	"""Compression of the file by its first bytes; None for plain text."""
+	with Path(path).open("rb") as f:
+		head = f.read(6)
+	for magic, name in _MAGIC.items():
+		if head.startswith(magic):
+			return name
+	return None
+
+
+def open_log(path: Path) -> IO[str]:
+	"""Open a log as UTF-8 text (without BOM), decompressing it on the fly."""
+	path = Path(path)
+	kind = compression(path)
+	if kind == "gzip":
+		return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+	if kind == "bzip2":
+		return bz2.open(path, "rt", encoding="utf-8-sig", newline="")
+	if kind == "xz":
+		return lzma.open(path, "rt", encoding="utf-8-sig", newline="")
+	if kind == "zstd":
+		if zstandard is None:
+			raise ValueError(f"{path.name} is zstd-compressed; install the zstandard package to read it")
+		raw = path.open("rb")
+		return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8-sig", newline="")
+	return path.open("r", encoding="utf-8-sig", newline="")
+
+
+def detect_format(line: str, hint: Optional[str] = None) -> Tuple[str, Optional["re.Pattern[str]"]]:
+	"""("csv" | "jsonl" | "regex", pattern) for a log starting with ``line``.
+
+	``hint`` (".csv", ".jsonl" or a name from REGEX_FORMATS) skips the
+	detection.
+	"""
+	if hint in (".csv", "csv"):
+		return "csv", None
+	if hint in (".jsonl", "jsonl"):
+		return "jsonl", None
+	if hint in REGEX_FORMATS:
+		return "regex", REGEX_FORMATS[hint]
+	first = line.strip()
+	if first.startswith("{"):
+		return "jsonl", None
+	if "," in first and {"llm_name", "duration_ms"} <= {c.strip().strip('"') for c in first.split(",")}:
+		return "csv", None
+	for pattern in REGEX_FORMATS.values():
+		if pattern.search(first):
+			return "regex", pattern
+	raise ValueError(f"Unrecognized log format; first line: {first[:80]!r}")
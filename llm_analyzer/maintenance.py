@@ -0,0 +1,195 @@
+"""Database size report and retention.
+
+Retention keeps the database from only ever growing: the stored copy of
+each performance log line (``llm_calls.raw_line``) can be dropped after a
+number of days, and interactions nobody rated or commented on can be moved
+to a compressed NDJSON archive after a number of days. Both work in short
+transactions (see :func:`db.run_in_batches`), so the GUI and running
+imports keep working meanwhile. Freed pages are returned to the file system
+with incremental vacuum where the database supports it.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from . import db
+
+ARCHIVE_DIR_NAME = "archive"
+
+
+@dataclass
+class RetentionPolicy:
+	"""What to prune; None leaves that kind of data alone."""
+	raw_line_days: Optional[int] = None
+	archive_days: Optional[int] = None
+	archive_dir: Optional[Path] = None
+
+	@classmethod
+	def from_config(cls, cfg: Dict[str, object]) -> "RetentionPolicy":
+		"""Read the ``retention`` object of config.json."""
+		section = cfg.get("retention") or {}
+		archive_dir = section.get("archive_dir")
+		return cls(
+			raw_line_days=section.get("raw_line_days"),
+			archive_days=section.get("archive_days"),
+			archive_dir=Path(archive_dir) if archive_dir else None,
+		)
+
+	def to_config(self) -> Dict[str, object]:
+		return {
+			"raw_line_days": self.raw_line_days,
+			"archive_days": self.archive_days,
+			"archive_dir": str(self.archive_dir) if self.archive_dir else None,
+		}
+
+
+def cutoff_iso(days: int, now: Optional[datetime] = None) -> str:
+	return ((now or datetime.now(timezone.utc)) - timedelta(days=days)).isoformat()
+
+
+def size_report(conn: sqlite3.Connection, columns: bool = True) -> Dict[str, object]:
+	"""File, table and index sizes, and with ``columns`` bytes per column.
+
+	``objects`` is None if SQLite lacks ``dbstat``; column sizes are summed
+	from the values and work everywhere.
+	"""
+	report: Dict[str, object] = db.fetch_storage_settings(conn)
+	objects = db.fetch_storage_objects(conn)
+	report["objects"] = None if objects is None else [dict(r) for r in objects]
+	if columns:
+		tables: Dict[str, object] = {}
+		for table in db.storage_tables(conn):
+			rows, sizes = db.fetch_column_sizes(conn, table)
+			tables[table] = {"rows": rows, "columns": dict(sorted(sizes.items(), key=lambda kv: -kv[1]))}
+		report["tables"] = tables
+	return report
+
+
+def drop_raw_lines(conn: sqlite3.Connection, days: int, progress=None) -> int:
+	"""Drop the stored log lines of calls older than ``days``."""
+	return db.clear_raw_lines(conn, cutoff_iso(days), progress=progress)
+
+
+def archive_interactions(conn: sqlite3.Connection, days: int, archive_dir: Path, progress=None) -> Dict[str, object]:
+	"""Move unrated, uncommented interactions older than ``days`` to NDJSON.
+
+	One gzip file per run, one JSON object per interaction with its text
+	and session. Each batch is on disk (fsync) before it is deleted; after
+	an interrupted run a batch may be in two archives, never in none.
+	"""
+	before = cutoff_iso(days)
+	path = Path(archive_dir) / f"interactions-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.ndjson.gz"
+	raw = None
+	gz = None
+	last_id = 0
+
+	def step(limit: int) -> int:
+		nonlocal raw, gz, last_id
+		rows = db.fetch_unrated_interactions(conn, before, last_id, limit)
+		if not rows:
+			return 0
+		if gz is None:
+			path.parent.mkdir(parents=True, exist_ok=True)
+			raw = open(path, "ab")
+			gz = gzip.GzipFile(fileobj=raw, mode="ab", compresslevel=6)
+		gz.write("".join(json.dumps(dict(r), ensure_ascii=False) + "\n" for r in rows).encode("utf-8"))
+		gz.flush()
+		os.fsync(raw.fileno())
+		with db.transaction(conn):
+			db.delete_interactions(conn, [int(r["id"]) for r in rows])
+		last_id = int(rows[-1]["id"])
+		return len(rows)
+
+	try:
+		archived = db.run_in_batches(step, batch_size=500, progress=progress)
+	finally:
+		if gz is not None:
+			gz.close()
+			raw.close()
+	return {"archived": archived, "archive": str(path) if archived else None}
+
+
+def reclaim_space(conn: sqlite3.Connection, full: bool = False) -> Dict[str, object]:
+	"""Shrink the file by its free pages.
+
+	With incremental auto-vacuum this runs in short steps. ``full``
+	rebuilds the file once with VACUUM and switches it to incremental mode.
+	"""
+	before = db.fetch_storage_settings(conn)
+	if full:
+		db.vacuum_into_incremental(conn)
+	elif before["auto_vacuum"] == "incremental":
+		db.incremental_vacuum(conn)
+	after = db.fetch_storage_settings(conn)
+	return {
+		"auto_vacuum": after["auto_vacuum"],
+		"file_bytes_before": before["file_bytes"],
+		"file_bytes_after": after["file_bytes"],
+		# Left for new rows; only a full vacuum returns them without incremental mode
+		"free_bytes": after["free_bytes"],
+	}
+
+
+def apply_retention(conn: sqlite3.Connection, policy: RetentionPolicy, vacuum: bool = False, progress: Optional[Callable[[str], None]] = None) -> Dict[str, object]:
+	"""Apply ``policy``, then reclaim the space it freed."""
+	result: Dict[str, object] = {}
+	say = progress or (lambda _msg: None)
+	if policy.raw_line_days is not None:
+		result["raw_lines_dropped"] = drop_raw_lines(conn, policy.raw_line_days, progress=lambda n: say(f"Dropped {n} log lines"))
+	if policy.archive_days is not None:
+		if policy.archive_dir is None:
+			raise ValueError("An archive folder is needed to archive interactions")
+		result.update(archive_interactions(conn, policy.archive_days, policy.archive_dir, progress=lambda n: say(f"Archived {n} interactions")))
+		if result["archived"]:
+			say("Compacting the search index")
+			db.merge_search_index(conn)
+	say("Reclaiming space")
+	result.update(reclaim_space(conn, full=vacuum))
+	return result
+
+
+def rollback_import(conn: sqlite3.Connection, batch_id: str, progress: Optional[Callable[[str], None]] = None) -> Dict[str, object]:
+	"""Roll back one import (see :func:`db.rollback_import_batch`)."""
+	result: Dict[str, object] = db.rollback_import_batch(conn, batch_id, progress=progress)
+	if result["interactions"]:
+		if progress is not None:
+			progress("Compacting the search index")
+		db.merge_search_index(conn)
+	return result
+
+
+class BackgroundMaintenance(threading.Thread):
+	"""Runs ``task(conn)`` on its own connection so the UI thread stays free.
+
+	Poll ``done``/``status``/``result``/``error`` from the UI thread.
+	"""
+
+	def __init__(self, db_path: Path, task: Callable[..., Dict[str, object]]):
+		super().__init__(daemon=True)
+		self.db_path = db_path
+		self.task = task
+		self.status = ""
+		self.result: Optional[Dict[str, object]] = None
+		self.error: Optional[BaseException] = None
+		self.done = False
+
+	def _progress(self, message: str) -> None:
+		self.status = message
+
+	def run(self) -> None:
+		conn = db.get_connection(self.db_path)
+		try:
+			self.result = self.task(conn, self._progress)
+		except BaseException as e:  # reported to the UI thread
+			self.error = e
+		finally:
+			conn.close()
+			self.done = True
@@ -0,0 +1,69 @@
+"""Match interactions to the llm_calls row that timed them.
+
+Session files and the perf log are written independently by the plugin, so
+the only link between an interaction and its call duration is the model
+name and a timestamp a few milliseconds apart. Both sides are sorted per
+model and merged with two pointers, pairing each interaction with the
+nearest unused call within a tolerance.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# The plugin logs the call when the response arrives and the interaction
+# right after, so matching timestamps are normally well under a second apart.
+DEFAULT_TOLERANCE_MS = 2000
+
+
+def _group_by_llm(rows: Iterable[Sequence]) -> Dict[str, List[Tuple[int, int]]]:
+	groups: Dict[str, List[Tuple[int, int]]] = {}
+	for row_id, llm_name, epoch_ms in ((r[0], r[1], r[2]) for r in rows):
+		if epoch_ms is None:
+			continue
+		groups.setdefault(llm_name, []).append((int(epoch_ms), int(row_id)))
+	for items in groups.values():
+		items.sort()
+	return groups
+
+
+def _merge(left: List[Tuple[int, int]], right: List[Tuple[int, int]], tolerance_ms: int) -> List[Tuple[int, int]]:
+	"""One-to-one nearest matches between two time-sorted ``(epoch_ms, id)`` lists."""
+	pairs: List[Tuple[int, int]] = []
+	j = 0
+	n = len(right)
+	for t, left_id in left:
+		# Skip calls too old for this (and therefore every later) interaction
+		while j < n and right[j][0] < t - tolerance_ms:
+			j += 1
+		if j >= n:
+			break
+		best = j
+		while best + 1 < n and abs(right[best + 1][0] - t) < abs(right[best][0] - t):
+			best += 1
+		if abs(right[best][0] - t) > tolerance_ms:
+			continue
+		pairs.append((left_id, right[best][1]))
+		# Calls before the chosen one cannot match a later interaction any better
+		j = best + 1
+	return pairs
+
+
+def match_nearest(
+	interactions: Iterable[Sequence],
+	calls: Iterable[Sequence],
+	tolerance_ms: int = DEFAULT_TOLERANCE_MS,
+) -> Dict[int, int]:
+	"""Map interaction id -> llm_calls id.
+
+	Both inputs are ``(id, llm_name, epoch_ms)`` rows in any order; rows
+	without a timestamp are ignored. Each call is used at most once.
+	"""
+	left = _group_by_llm(interactions)
+	right = _group_by_llm(calls)
+	result: Dict[int, int] = {}
+	for llm_name, items in left.items():
+		other = right.get(llm_name)
+		if other:
+			result.update(_merge(items, other, tolerance_ms))
+	return result
+
@@ -0,0 +1,105 @@
+"""Prompt-prefix cache simulation.
+
+Anthropic, DeepSeek, OpenAI and local servers such as LM Studio skip
+re-processing the longest prefix a prompt shares with an earlier one. The
+plugin's system prompt is constant per prompt kind and always hits; what
+matters is how much of the user prompt also matches. :class:`PrefixTrie`
+holds the prompts seen so far and returns that length for each new one.
+"""
+from __future__ import annotations
+
+import os
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Section orders to compare. "current" keeps the order the plugin uses today.
+ORDERINGS: Dict[str, Optional[Tuple[str, ...]]] = {
+	"current": None,
+	"stable_first": ("description", "goal", "policy", "history", "environment", "other"),
+	"history_last": ("description", "goal", "policy", "environment", "history", "other"),
+}
+
+
+def reorder(parts: Sequence[Tuple[str, str]], order: Optional[Sequence[str]]) -> str:
+	"""Join ``prompts.split_sections`` parts in ``order``; None keeps them as they are."""
+	if order is None:
+		return "".join(text for _, text in parts)
+	rank = {name: i for i, name in enumerate(order)}
+	# sorted() is stable, so repeated "other" parts keep their relative order
+	return "".join(text for _, text in sorted(parts, key=lambda p: rank.get(p[0], len(rank))))
+
+
+class _Node:
+	__slots__ = ("label", "children", "keys")
+
+	def __init__(self, label: Tuple[str, ...]):
+		# Lines on the edge leading to this node
+		self.label = label
+		self.children: Dict[str, _Node] = {}
+		# Sorted first lines of the children, for partial-line matches
+		self.keys: List[str] = []
+
+	def add(self, child: "_Node") -> None:
+		self.children[child.label[0]] = child
+		insort(self.keys, child.label[0])
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+	return len(os.path.commonprefix((a, b)))
+
+
+class PrefixTrie:
+	"""Radix trie over prompt lines.
+
+	Edges hold runs of whole lines, so a prompt adds at most two nodes no
+	matter how long it is. Within the first differing line the match is
+	refined to characters using the sorted neighbours of that line, which
+	are the siblings sharing the longest prefix with it.
+	"""
+
+	def __init__(self) -> None:
+		self.root = _Node(())
+
+	def insert(self, text: str) -> int:
+		"""Add ``text``; return the length of its longest common prefix with any earlier text."""
+		lines = tuple(text.splitlines(keepends=True))
+		node = self.root
+		i = 0
+		matched = 0
+		while i < len(lines):
+			child = node.children.get(lines[i])
+			if child is None:
+				matched += self._partial(node, lines[i])
+				node.add(_Node(lines[i:]))
+				return matched
+			label = child.label
+			k = 0
+			while k < len(label) and i < len(lines) and label[k] == lines[i]:
+				matched += len(lines[i])
+				k += 1
+				i += 1
+			if k == len(label):
+				node = child
+				continue
+			# Diverged inside the edge: split it at line k
+			mid = _Node(label[:k])
+			child.label = label[k:]
+			node.children[label[0]] = mid
+			mid.add(child)
+			if i < len(lines):
+				matched += _common_prefix_len(child.label[0], lines[i])
+				mid.add(_Node(lines[i:]))
+			return matched
+		return matched
+
+	@staticmethod
+	def _partial(node: _Node, line: str) -> int:
+		keys = node.keys
+		if not keys:
+			return 0
+		at = bisect_left(keys, line)
+		best = 0
+		for j in (at - 1, at):
+			if 0 <= j < len(keys):
+				best = max(best, _common_prefix_len(keys[j], line))
+		return best
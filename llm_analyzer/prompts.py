@@ -0,0 +1,181 @@
+"""Split plugin prompts into their sections.
+
+``callLlmForAction`` and ``callLlmForGoal`` build the user prompt as::
+
+	[Recent history (latest last):\\n<lines>\\n\\n]
+	[NPC Description:\\n<text>\\n\\n]
+	[Goal:\\n<text>\\n\\n]                                    (goal prompts)
+	[Switch Policy (allowed and when to use):\\n<text>\\n\\n] (goal prompts)
+	Environment:\\n<JSON.stringify(env, null, 2)>\\n<instruction>
+
+:func:`decompose` measures each section and pulls the fields worth
+indexing out of the environment JSON.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+HISTORY_HEADER = "Recent history (latest last):\n"
+DESCRIPTION_HEADER = "NPC Description:\n"
+GOAL_HEADER = "Goal:\n"
+POLICY_HEADER = "Switch Policy (allowed and when to use):\n"
+ENV_HEADER = "Environment:\n"
+ACTION_TRAILER = "Choose the next action."
+GOAL_TRAILER = "Return only JSON with {action,goal}."
+
+# Sections in prompt order; "other" collects the trailing instruction and
+# anything that does not match the expected layout.
+SECTIONS = ("history", "description", "goal", "policy", "environment", "other")
+_HEADERS = (
+	("history", HISTORY_HEADER),
+	("description", DESCRIPTION_HEADER),
+	("goal", GOAL_HEADER),
+	("policy", POLICY_HEADER),
+)
+
+_decoder = json.JSONDecoder()
+
+
+@dataclass
+class PromptSections:
+	prompt_kind: Optional[str]
+	total_bytes: int
+	history_bytes: int = 0
+	history_lines: int = 0
+	description_bytes: int = 0
+	description_lines: int = 0
+	goal_bytes: int = 0
+	goal_lines: int = 0
+	policy_bytes: int = 0
+	policy_lines: int = 0
+	env_bytes: int = 0
+	env_lines: int = 0
+	env_min_bytes: Optional[int] = None
+	other_bytes: int = 0
+	map_id: Optional[int] = None
+	npc_x: Optional[int] = None
+	npc_y: Optional[int] = None
+	player_distance: Optional[int] = None
+	player_adjacent: Optional[int] = None
+	others_count: Optional[int] = None
+	others_adjacent: Optional[int] = None
+
+	def as_row(self) -> Dict[str, object]:
+		# Scalar fields only, so a shallow copy is enough (asdict deep-copies)
+		return dict(vars(self))
+
+
+def _nbytes(text: str) -> int:
+	return len(text.encode("utf-8"))
+
+
+def _body_lines(block: str, header: str) -> int:
+	body = block[len(header):].strip("\n")
+	return body.count("\n") + 1 if body else 0
+
+
+def _int_or_none(value: object) -> Optional[int]:
+	if isinstance(value, bool):
+		return int(value)
+	if isinstance(value, (int, float)):
+		return int(value)
+	return None
+
+
+def _find_header(text: str, header: str, pos: int) -> int:
+	"""Index of ``header`` at a line start at or after ``pos``, or -1."""
+	if pos == 0 and text.startswith(header):
+		return 0
+	at = text.find("\n" + header, pos)
+	return at + 1 if at != -1 else -1
+
+
+def split_sections(prompt: str) -> List[Tuple[str, str]]:
+	"""Return ``(section, text)`` pairs covering the whole prompt in order."""
+	return _split(prompt)[0]
+
+
+def _split(prompt: str) -> Tuple[List[Tuple[str, str]], Optional[object]]:
+	env: Optional[object] = None
+	env_at = _find_header(prompt, ENV_HEADER, 0)
+	if env_at != -1:
+		# The environment JSON cannot contain a raw newline inside a string,
+		# so the last header occurrence is the real one.
+		env_at = max(env_at, prompt.rfind("\n" + ENV_HEADER) + 1)
+	head = prompt[:env_at] if env_at != -1 else prompt
+	parts: List[Tuple[str, str]] = []
+
+	# Header blocks appear in a fixed order, each starting at a line start
+	found: List[Tuple[int, str]] = []
+	pos = 0
+	for name, header in _HEADERS:
+		at = _find_header(head, header, pos)
+		if at == -1:
+			continue
+		found.append((at, name))
+		pos = at + len(header)
+	first = found[0][0] if found else len(head)
+	if first > 0:
+		parts.append(("other", head[:first]))
+	for i, (at, name) in enumerate(found):
+		end = found[i + 1][0] if i + 1 < len(found) else len(head)
+		parts.append((name, head[at:end]))
+
+	if env_at != -1:
+		tail = prompt[env_at:]
+		json_start = len(ENV_HEADER)
+		try:
+			env, json_end = _decoder.raw_decode(tail, json_start)
+		except ValueError:
+			json_end = len(tail)
+		parts.append(("environment", tail[:json_end]))
+		if json_end < len(tail):
+			parts.append(("other", tail[json_end:]))
+	return parts, env
+
+
+def parse_environment(prompt: str) -> Optional[dict]:
+	env = _split(prompt)[1]
+	return env if isinstance(env, dict) else None
+
+
+def decompose(prompt: str) -> PromptSections:
+	text = str(prompt or "")
+	stripped = text.rstrip()
+	if stripped.endswith(GOAL_TRAILER):
+		kind: Optional[str] = "goal"
+	elif stripped.endswith(ACTION_TRAILER):
+		kind = "action"
+	else:
+		kind = None
+	result = PromptSections(prompt_kind=kind, total_bytes=_nbytes(text))
+	headers = dict(_HEADERS)
+	parts, env = _split(text)
+	for name, block in parts:
+		size = _nbytes(block)
+		if name == "environment":
+			result.env_bytes += size
+			result.env_lines += _body_lines(block, ENV_HEADER)
+		elif name == "other":
+			result.other_bytes += size
+		else:
+			setattr(result, f"{name}_bytes", getattr(result, f"{name}_bytes") + size)
+			setattr(result, f"{name}_lines", getattr(result, f"{name}_lines") + _body_lines(block, headers[name]))
+
+	if isinstance(env, dict):
+		result.env_min_bytes = _nbytes(json.dumps(env, separators=(",", ":"), ensure_ascii=False))
+		npc = env.get("npc") if isinstance(env.get("npc"), dict) else {}
+		player = env.get("player") if isinstance(env.get("player"), dict) else {}
+		game_map = env.get("map") if isinstance(env.get("map"), dict) else {}
+		others = env.get("others") if isinstance(env.get("others"), list) else None
+		result.map_id = _int_or_none(game_map.get("id"))
+		result.npc_x = _int_or_none(npc.get("x"))
+		result.npc_y = _int_or_none(npc.get("y"))
+		result.player_distance = _int_or_none(player.get("distance"))
+		result.player_adjacent = _int_or_none(player.get("isAdjacent"))
+		if others is not None:
+			result.others_count = len(others)
+			result.others_adjacent = sum(1 for o in others if isinstance(o, dict) and o.get("isAdjacent") is True)
+	return result
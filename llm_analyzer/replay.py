@@ -0,0 +1,243 @@
+"""Offline LLM server that answers from recorded interactions.
+
+Point the plugin's proxy URL (or a provider base URL) at this server to
+load-test the game without a real provider. Both request shapes the plugin
+sends are understood: OpenAI-style chat completions (OpenAI, Mistral,
+DeepSeek, LM Studio) and Anthropic messages. The reply is the recorded
+response to the same user prompt; for an unseen prompt it is the response
+to the most similar recorded prompt of the same NPC. Each reply is delayed
+by a duration drawn from that model's ``llm_calls``.
+
+Everything needed to answer is loaded into memory at startup, so a request
+never touches the database.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from . import clustering, db, prompts, tokens
+from .httputil import BadRequest, http_response, read_http_request
+from .utils import normalize_llm_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8808
+# Recorded prompts kept per NPC for nearest-match lookups (newest win). A
+# lookup compares against all of them on the event loop, ~3 us each.
+MAX_CANDIDATES = 500
+# Nearest matches are remembered since NPCs resend unchanged prompts
+_MATCH_CACHE_SIZE = 10_000
+# Answer for prompts of an NPC that was never recorded
+FALLBACK_RESPONSE = '{"type":"wait","ms":500}'
+
+
+def _prompt_hash(prompt: str) -> bytes:
+	return hashlib.sha256(prompt.encode("utf-8")).digest()[:16]
+
+
+def _npc_key(prompt: str) -> str:
+	"""Prompts of the same NPC and kind share their description and trailer."""
+	sections = dict(prompts.split_sections(prompt))
+	kind = "goal" if prompts.GOAL_TRAILER in prompt else "action"
+	return kind + "\n" + sections.get("description", "")
+
+
+class ReplayIndex:
+	"""Recorded responses by exact prompt, by NPC, and call durations by model."""
+
+	def __init__(self, seed: Optional[int] = None) -> None:
+		self.rng = random.Random(seed)
+		# prompt hash -> [(llm_name, response)]
+		self.exact: Dict[bytes, List[Tuple[str, str]]] = {}
+		# npc key -> [(signature, llm_name, response)], oldest first
+		self.by_npc: Dict[str, List[Tuple[Tuple[int, ...], str, str]]] = {}
+		self.durations: Dict[str, List[int]] = {}
+		self.all_durations: List[int] = []
+		self._matches: "OrderedDict[Tuple[bytes, str], str]" = OrderedDict()
+		self.stats = {"exact": 0, "nearest": 0, "fallback": 0}
+
+	@classmethod
+	def load(cls, conn: sqlite3.Connection, seed: Optional[int] = None) -> "ReplayIndex":
+		index = cls(seed)
+		n = 0
+		for batch in db.iter_prompt_responses(conn):
+			for r in batch:
+				if r["prompt"] and r["response"] is not None:
+					index.add(r["llm_name"] or "", r["prompt"], r["response"])
+					n += 1
+		for candidates in index.by_npc.values():
+			del candidates[:-MAX_CANDIDATES]
+		index.durations = db.fetch_durations_grouped(conn)
+		index.all_durations = [d for values in index.durations.values() for d in values]
+		logger.info("Replay index: %d prompts, %d NPCs, %d call durations", n, len(index.by_npc), len(index.all_durations))
+		return index
+
+	def add(self, llm_name: str, prompt: str, response: str) -> None:
+		self.exact.setdefault(_prompt_hash(prompt), []).append((llm_name, response))
+		self.by_npc.setdefault(_npc_key(prompt), []).append((clustering.line_signature(prompt), llm_name, response))
+
+	def answer(self, model: str, prompt: str) -> str:
+		llm_name = normalize_llm_name(model or "")
+		key = _prompt_hash(prompt)
+		recorded = self.exact.get(key)
+		if recorded:
+			self.stats["exact"] += 1
+			same_model = [resp for name, resp in recorded if name == llm_name]
+			return self.rng.choice(same_model or [resp for _, resp in recorded])
+		cached = self._matches.get((key, llm_name))
+		if cached is not None:
+			self._matches.move_to_end((key, llm_name))
+			self.stats["nearest"] += 1
+			return cached
+		candidates = self.by_npc.get(_npc_key(prompt))
+		if not candidates:
+			self.stats["fallback"] += 1
+			return FALLBACK_RESPONSE
+		sig = clustering.line_signature(prompt)
+		# Most similar prompt; the requested model breaks ties
+		_, _, response = max(
+			candidates,
+			key=lambda c: (clustering.similarity(sig, c[0]), c[1] == llm_name),
+		)
+		self._matches[(key, llm_name)] = response
+		if len(self._matches) > _MATCH_CACHE_SIZE:
+			self._matches.popitem(last=False)
+		self.stats["nearest"] += 1
+		return response
+
+	def latency_ms(self, model: str) -> int:
+		values = self.durations.get(normalize_llm_name(model or "")) or self.all_durations
+		return self.rng.choice(values) if values else 0
+
+
+def _user_prompt(body: dict) -> str:
+	"""Last user message of either request shape."""
+	for message in reversed(body.get("messages") or []):
+		if isinstance(message, dict) and message.get("role") == "user":
+			content = message.get("content")
+			if isinstance(content, list):
+				return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+			return str(content or "")
+	return ""
+
+
+def is_anthropic_request(path: str, body: dict) -> bool:
+	if path.rstrip("/").endswith("/messages"):
+		return True
+	if path.rstrip("/").endswith("/chat/completions"):
+		return False
+	# A proxy URL says nothing about the provider; only Anthropic has a top-level system prompt
+	return "system" in body
+
+
+def completion_body(anthropic: bool, model: str, text: str, prompt_tokens: int) -> dict:
+	"""Provider-shaped reply carrying ``text``."""
+	output_tokens = tokens.count(text)
+	if anthropic:
+		return {
+			"id": f"msg_{uuid.uuid4().hex[:24]}",
+			"type": "message",
+			"role": "assistant",
+			"model": model,
+			"content": [{"type": "text", "text": text}],
+			"stop_reason": "end_turn",
+			"stop_sequence": None,
+			"usage": {"input_tokens": prompt_tokens, "output_tokens": output_tokens},
+		}
+	return {
+		"id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+		"object": "chat.completion",
+		"created": int(time.time()),
+		"model": model,
+		"choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+		"usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens},
+	}
+
+
+class ReplayServer:
+	"""asyncio HTTP/1.1 server with keep-alive; one task per connection."""
+
+	def __init__(self, index: ReplayIndex, latency_scale: float = 1.0) -> None:
+		self.index = index
+		self.latency_scale = latency_scale
+		self.requests = 0
+		self.in_flight = 0
+		self.peak_in_flight = 0
+
+	async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		try:
+			while True:
+				try:
+					request = await read_http_request(reader)
+				except BadRequest as e:
+					writer.write(http_response(e.status, {"error": str(e)}, False))
+					break
+				if request is None:
+					break
+				method, path, headers, body = request
+				keep_alive = headers.get("connection", "").lower() != "close"
+				status, payload = await self.respond(method, path, body)
+				writer.write(http_response(status, payload, keep_alive))
+				await writer.drain()
+				if not keep_alive:
+					break
+		except (asyncio.IncompleteReadError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+	async def respond(self, method: str, path: str, body: bytes) -> Tuple[int, object]:
+		if method == "GET" and path.rstrip("/") == "/stats":
+			return 200, dict(self.index.stats, requests=self.requests, in_flight=self.in_flight, peak_in_flight=self.peak_in_flight)
+		if method != "POST":
+			return 405, {"error": "POST a chat completion or message request"}
+		try:
+			request = json.loads(body or b"{}")
+		except ValueError:
+			return 400, {"error": "body is not JSON"}
+		if not isinstance(request, dict):
+			return 400, {"error": "body must be a JSON object"}
+		self.requests += 1
+		model = str(request.get("model") or "")
+		prompt = _user_prompt(request)
+		text = self.index.answer(model, prompt)
+		self.in_flight += 1
+		self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+		try:
+			delay = self.index.latency_ms(model) * self.latency_scale / 1000.0
+			if delay > 0:
+				await asyncio.sleep(delay)
+		finally:
+			self.in_flight -= 1
+		return 200, completion_body(is_anthropic_request(path, request), model, text, tokens.count(prompt))
+
+
+async def start_server(index: ReplayIndex, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, latency_scale: float = 1.0) -> asyncio.AbstractServer:
+	server = ReplayServer(index, latency_scale)
+	# Listen backlog sized for a map full of NPCs connecting at once
+	return await asyncio.start_server(server.handle, host, port, backlog=1024)
+
+
+def serve(index: ReplayIndex, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, latency_scale: float = 1.0) -> None:
+	"""Serve until interrupted."""
+
+	async def main() -> None:
+		server = await start_server(index, host, port, latency_scale)
+		logger.info("Replay server listening on http://%s:%d (latency x%.2f)", host, port, latency_scale)
+		async with server:
+			await server.serve_forever()
+
+	try:
+		asyncio.run(main())
+	except KeyboardInterrupt:
+		pass
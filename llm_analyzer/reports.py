@@ -0,0 +1,225 @@
+"""Analysis reports built on the derived tables.
+
+Reports aggregate in SQL where possible and return plain dicts, so the GUI
+and the command line can both render them.
+"""
+from __future__ import annotations
+
+import math
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from . import db, prefixcache, prompts, tokens
+from .tokens import BYTES_PER_TOKEN
+
+_SECTION_COLUMNS = (
+	("history", "history_bytes"),
+	("description", "description_bytes"),
+	("goal", "goal_bytes"),
+	("policy", "policy_bytes"),
+	("environment", "env_bytes"),
+	("other", "other_bytes"),
+)
+
+
+def estimate_tokens(nbytes: Optional[float]) -> Optional[float]:
+	return None if nbytes is None else nbytes / BYTES_PER_TOKEN
+
+
+class _Regression:
+	"""Running sums for a least-squares fit of duration against prompt bytes."""
+
+	def __init__(self) -> None:
+		self.n = 0
+		self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+
+	def add(self, x: float, y: float) -> None:
+		self.n += 1
+		self.sx += x
+		self.sy += y
+		self.sxx += x * x
+		self.syy += y * y
+		self.sxy += x * y
+
+	def result(self) -> Dict[str, Optional[float]]:
+		n = self.n
+		out: Dict[str, Optional[float]] = {
+			"matched_calls": n,
+			"avg_duration_ms": self.sy / n if n else None,
+			"pearson_r": None,
+			"ms_per_kb": None,
+		}
+		if n < 3:
+			return out
+		vx = n * self.sxx - self.sx * self.sx
+		vy = n * self.syy - self.sy * self.sy
+		cov = n * self.sxy - self.sx * self.sy
+		if vx > 0:
+			out["ms_per_kb"] = cov / vx * 1024.0
+		if vx > 0 and vy > 0:
+			out["pearson_r"] = cov / math.sqrt(vx * vy)
+		return out
+
+
+def _size_duration_fits(conn: sqlite3.Connection) -> Tuple[Dict[str, _Regression], Dict[Tuple[str, str], _Regression]]:
+	per_llm: Dict[str, _Regression] = {}
+	per_situation: Dict[Tuple[str, str], _Regression] = {}
+	for r in db.fetch_size_duration_pairs(conn):
+		x = float(r["total_bytes"])
+		y = float(r["duration_ms"])
+		per_llm.setdefault(r["llm_name"], _Regression()).add(x, y)
+		per_situation.setdefault((r["llm_name"], r["situation_id"]), _Regression()).add(x, y)
+	return per_llm, per_situation
+
+
+def _attribution_row(r: sqlite3.Row, fit: Optional[_Regression]) -> Dict[str, object]:
+	prompts_count = int(r["prompts"])
+	total = float(r["total_bytes"] or 0)
+	sections: Dict[str, Dict[str, float]] = {}
+	for name, column in _SECTION_COLUMNS:
+		nbytes = float(r[column] or 0)
+		sections[name] = {
+			"bytes": nbytes,
+			"avg_bytes": nbytes / prompts_count if prompts_count else 0.0,
+			"avg_tokens": estimate_tokens(nbytes / prompts_count) if prompts_count else 0.0,
+			"share": nbytes / total if total else 0.0,
+		}
+	saved = float(r["env_whitespace_bytes"] or 0)
+	row: Dict[str, object] = {
+		"llm_name": r["llm_name"],
+		"situation_id": r["situation_id"],
+		"prompts": prompts_count,
+		"avg_bytes": total / prompts_count if prompts_count else 0.0,
+		"avg_tokens": estimate_tokens(total / prompts_count) if prompts_count else 0.0,
+		"sections": sections,
+		"minified_env_saved_bytes": saved,
+		"minified_env_saved_share": saved / total if total else 0.0,
+	}
+	row.update((fit or _Regression()).result())
+	return row
+
+
+def prompt_attribution(conn: sqlite3.Connection) -> Dict[str, object]:
+	"""Where prompt bytes go, per LLM and per LLM + NPC.
+
+	Each row splits the prompt into its sections (bytes, estimated tokens,
+	share of the prompt), the bytes a minified environment JSON would save
+	compared to the plugin's ``JSON.stringify(env, null, 2)``, and how call
+	duration tracks prompt size for interactions linked to their
+	``llm_calls`` row (Pearson r and the fitted ms per extra KB).
+	"""
+	per_llm_fit, per_situation_fit = _size_duration_fits(conn)
+	by_llm = [_attribution_row(r, per_llm_fit.get(r["llm_name"])) for r in db.fetch_prompt_section_totals(conn, by_situation=False)]
+	by_situation = [
+		_attribution_row(r, per_situation_fit.get((r["llm_name"], r["situation_id"])))
+		for r in db.fetch_prompt_section_totals(conn, by_situation=True)
+	]
+	return {
+		"bytes_per_token": BYTES_PER_TOKEN,
+		"env_header_bytes": len(prompts.ENV_HEADER.encode("utf-8")),
+		"by_llm": by_llm,
+		"by_situation": by_situation,
+	}
+
+
+class _CacheTotals:
+	def __init__(self, orderings) -> None:
+		self.prompts = 0
+		self.tokens = 0.0
+		self.cached = {name: 0.0 for name in orderings}
+
+	def result(self) -> Dict[str, object]:
+		return {
+			"prompts": self.prompts,
+			"prompt_tokens": self.tokens,
+			"cacheable": {
+				name: {"tokens": cached, "fraction": cached / self.tokens if self.tokens else 0.0}
+				for name, cached in self.cached.items()
+			},
+		}
+
+
+def prefix_cache_simulation(conn: sqlite3.Connection, orderings: Optional[Dict[str, Optional[Tuple[str, ...]]]] = None) -> Dict[str, object]:
+	"""Share of prompt tokens a provider-side prefix cache could reuse.
+
+	Replays every session's prompts per NPC in order. Under each section
+	ordering, a prompt's cacheable part is its longest common prefix with
+	any earlier prompt of the same NPC in the session, found with a
+	:class:`prefixcache.PrefixTrie`. This assumes the cache keeps those
+	earlier prompts (an upper bound for providers with short TTLs). Tokens
+	come from the counts stored at import; the cached share of a prompt's
+	tokens is taken to equal its cached share of characters.
+	"""
+	orderings = orderings or prefixcache.ORDERINGS
+	per_llm: Dict[str, _CacheTotals] = {}
+	per_situation: Dict[Tuple[str, str], _CacheTotals] = {}
+	group: Optional[Tuple[int, str]] = None
+	tries: Dict[str, prefixcache.PrefixTrie] = {}
+	for batch in db.iter_prompts_in_session_order(conn):
+		for r in batch:
+			key = (r["session_id"], r["situation_id"])
+			if key != group:
+				group = key
+				tries = {name: prefixcache.PrefixTrie() for name in orderings}
+			prompt = r["prompt"] or ""
+			if not prompt:
+				continue
+			n_tokens = float(r["prompt_tokens"] if r["prompt_tokens"] is not None else tokens.count(prompt))
+			totals = (
+				per_llm.setdefault(r["llm_name"], _CacheTotals(orderings)),
+				per_situation.setdefault((r["llm_name"], r["situation_id"]), _CacheTotals(orderings)),
+			)
+			for t in totals:
+				t.prompts += 1
+				t.tokens += n_tokens
+			parts = prompts.split_sections(prompt)
+			for name, order in orderings.items():
+				text = prompt if order is None else prefixcache.reorder(parts, order)
+				cached = n_tokens * tries[name].insert(text) / len(text)
+				for t in totals:
+					t.cached[name] += cached
+	return {
+		"orderings": {name: list(order) if order else None for name, order in orderings.items()},
+		"by_llm": [dict(llm_name=llm, situation_id=None, **t.result()) for llm, t in sorted(per_llm.items())],
+		"by_situation": [
+			dict(llm_name=llm, situation_id=sit, **t.result()) for (llm, sit), t in sorted(per_situation.items())
+		],
+	}
+
+
+def _action_rows(rows) -> List[Dict[str, object]]:
+	merged: Dict[Tuple[str, Optional[str]], Dict[str, object]] = {}
+	for r in rows:
+		key = (r["llm_name"], r["situation_id"])
+		m = merged.get(key)
+		if m is None:
+			m = merged[key] = {
+				"llm_name": r["llm_name"],
+				"situation_id": r["situation_id"],
+				"responses": 0,
+				"parse_errors": 0,
+				"lenient": 0,
+				"actions": {},
+				"goal_status": {},
+			}
+		n = int(r["responses"])
+		m["responses"] += n
+		m["parse_errors"] += int(r["parse_errors"] or 0)
+		m["lenient"] += int(r["lenient"] or 0)
+		if r["action_type"] is not None:
+			m["actions"][r["action_type"]] = m["actions"].get(r["action_type"], 0) + n
+		if r["goal_status"] is not None:
+			m["goal_status"][r["goal_status"]] = m["goal_status"].get(r["goal_status"], 0) + n
+	for m in merged.values():
+		total = m["responses"]
+		m["parse_error_rate"] = m["parse_errors"] / total if total else 0.0
+		m["lenient_rate"] = m["lenient"] / total if total else 0.0
+	return list(merged.values())
+
+
+def action_summary(conn: sqlite3.Connection) -> Dict[str, object]:
+	"""Action types, goal statuses and invalid-JSON rates per LLM and per LLM + NPC."""
+	return {
+		"by_llm": _action_rows(db.fetch_action_distribution(conn, by_situation=False)),
+		"by_situation": _action_rows(db.fetch_action_distribution(conn, by_situation=True)),
+	}
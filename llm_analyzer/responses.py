@@ -0,0 +1,164 @@
+"""Parse LLM responses the way the plugin does.
+
+``callLlmForAction`` expects one action object and ``callLlmForGoal`` an
+``{action, goal}`` object. Both run the text through
+``cleanLlmTextToJsonString`` before ``JSON.parse`` and then
+``sanitizeAction``/``sanitizeGoalStatus``. :func:`parse` repeats those
+steps so the stored fields match what the game actually did.
+"""
+from __future__ import annotations
+
+import json
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+_FENCE = "```"
+_LANGUAGE_TAG = re.compile(r"^[a-zA-Z0-9_-]+\r?\n")
+
+
+@dataclass
+class ParsedResponse:
+	action_type: Optional[str] = None
+	goal_status: Optional[str] = None
+	# 1 when JSON.parse would have failed; the game then falls back or skips
+	parse_error: int = 0
+	# 1 when the text only parsed after fence stripping / brace slicing
+	lenient: int = 0
+	target_x: Optional[int] = None
+	target_y: Optional[int] = None
+	item_id: Optional[int] = None
+	coins: Optional[int] = None
+	wait_ms: Optional[int] = None
+	switch_id: Optional[int] = None
+
+	def as_row(self) -> Dict[str, object]:
+		return dict(vars(self))
+
+
+def clean_llm_text_to_json_string(text: Optional[str]) -> str:
+	"""Port of the plugin's ``cleanLlmTextToJsonString``."""
+	t = str(text if text is not None else "")
+	if not t:
+		return t
+	t = t.strip()
+	# If there's a fenced block anywhere, prefer its inner content
+	first = t.find(_FENCE)
+	if first != -1:
+		second = t.find(_FENCE, first + 3)
+		if second > first:
+			inner = _LANGUAGE_TAG.sub("", t[first + 3:second], count=1)
+			t = inner.strip()
+	# Fallback: slice to the outermost braces if present
+	first_brace = t.find("{")
+	last_brace = t.rfind("}")
+	if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
+		return t[first_brace:last_brace + 1].strip()
+	return t
+
+
+def _number(value: object) -> Optional[float]:
+	"""JavaScript ``Number(value)`` for JSON values; None for NaN.
+
+	A missing value (None here) is ``undefined`` in the plugin, hence NaN.
+	"""
+	if isinstance(value, bool):
+		return float(value)
+	if isinstance(value, (int, float)):
+		return float(value)
+	if isinstance(value, str):
+		s = value.strip()
+		if not s:
+			return 0.0
+		try:
+			return float(s)
+		except ValueError:
+			return None
+	return None
+
+
+def _floor(value: object) -> Optional[int]:
+	n = _number(value)
+	if n is None or math.isinf(n) or math.isnan(n):
+		return None
+	return math.floor(n)
+
+
+def _first_present(data: dict, *keys: str) -> object:
+	for key in keys:
+		if data.get(key) is not None:
+			return data[key]
+	return None
+
+
+def _sanitize_goal_status(status: object) -> str:
+	s = str(status if status is not None else "").strip().lower()
+	if s in {"achieved", "success", "done"}:
+		return "achieved"
+	if s in {"failed", "failure", "impossible"}:
+		return "failed"
+	return "continue"
+
+
+def _apply_action(result: ParsedResponse, action: dict) -> None:
+	"""Fill the action fields like ``sanitizeAction``."""
+	if isinstance(action.get("action"), dict):
+		action = action["action"]
+	result.action_type = str(action.get("type") or "wait")
+	if result.action_type == "move":
+		target = action.get("target")
+		if isinstance(target, dict):
+			x, y = _first_present(target, "x", "X"), _first_present(target, "y", "Y")
+		else:
+			x = _first_present(action, "targetX", "x", "X")
+			y = _first_present(action, "targetY", "y", "Y")
+		x, y = _floor(x), _floor(y)
+		if x is not None and y is not None:
+			result.target_x, result.target_y = x, y
+	elif result.action_type == "give":
+		result.item_id = _floor(action.get("itemId") or 1)
+	elif result.action_type == "giveCoins":
+		coins = _floor(_first_present(action, "coins", "amount"))
+		result.coins = max(0, coins) if coins is not None else 0
+	elif result.action_type == "setSwitch":
+		switch_id = _floor(action["switchId"] if action.get("switchId") is not None else (action.get("id") or 0))
+		result.switch_id = max(1, switch_id or 0)
+	elif result.action_type == "wait":
+		ms = _number(action.get("ms") or 200)
+		result.wait_ms = int(max(50, min(1000, ms))) if ms is not None else None
+
+
+def parse(response: Optional[str], prompt_kind: Optional[str] = None) -> ParsedResponse:
+	"""Parse a response to an ``"action"`` or ``"goal"`` prompt.
+
+	Without a kind, ``{action, goal}``-shaped objects are read as goal
+	responses. Text that is not a JSON object counts as a parse error.
+	"""
+	result = ParsedResponse()
+	text = str(response or "")
+	cleaned = clean_llm_text_to_json_string(text)
+	try:
+		obj = json.loads(cleaned)
+	except ValueError:
+		result.parse_error = 1
+		return result
+	if cleaned != text.strip():
+		result.lenient = 1
+	if not isinstance(obj, dict):
+		result.parse_error = 1
+		return result
+	if prompt_kind is None:
+		prompt_kind = "goal" if any(k in obj for k in ("goal", "Goal")) else "action"
+	if prompt_kind != "goal":
+		_apply_action(result, obj)
+		return result
+	raw_action = obj.get("action") or obj.get("Action")
+	raw_goal = obj.get("goal") or obj.get("Goal") or {}
+	result.goal_status = _sanitize_goal_status(raw_goal.get("status") if isinstance(raw_goal, dict) else None)
+	if isinstance(raw_action, dict):
+		_apply_action(result, raw_action)
+	else:
+		result.action_type = "wait"
+		result.wait_ms = 200
+	return result
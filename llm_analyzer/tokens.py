@@ -0,0 +1,107 @@
+"""Token counts for prompts and responses.
+
+The default counter is an offline estimate that mimics how BPE tokenizers
+pre-split text: a word with its leading space, a group of up to three
+digits, a run of punctuation or a run of whitespace is roughly one token.
+That is close enough to compare models and prompts; use an exact tokenizer
+for absolute numbers.
+
+An exact tokenizer can be plugged in with :func:`register_tokenizer`;
+``tiktoken`` is registered out of the box and used when selected with
+:func:`configure` and installed.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough average for when only a byte count is known
+BYTES_PER_TOKEN = 4.0
+DEFAULT_TOKENIZER = "estimate"
+
+_PIECE = re.compile(r"(?P<word> ?[^\W\d_]+)|(?P<num> ?\d+)|(?P<punct> ?(?:[^\w\s]|_)+)|(?P<space>\s+)")
+# Prompts repeat most of their lines (history entries, environment keys),
+# so line counts are cached; BPE pieces never span a newline anyway.
+_MAX_CACHED_LINES = 100_000
+_line_cache: Dict[str, int] = {}
+
+
+def _estimate_line(line: str) -> int:
+	n = 0
+	for m in _PIECE.finditer(line):
+		kind = m.lastgroup
+		size = len(m.group().lstrip(" ")) or 1
+		if kind == "word":
+			if m.group().isascii():
+				# Common words are one token; long ones split every ~10 letters
+				n += (size + 9) // 10
+			else:
+				n += (len(m.group().encode("utf-8")) + 3) // 4
+		elif kind == "num":
+			n += (size + 2) // 3
+		elif kind == "punct":
+			n += (size + 1) // 2
+		else:
+			n += 1
+	return n
+
+
+def estimate_tokens(text: str) -> int:
+	if len(_line_cache) > _MAX_CACHED_LINES:
+		_line_cache.clear()
+	lines = text.split("\n")
+	n = len(lines) - 1
+	for line in lines:
+		c = _line_cache.get(line)
+		if c is None:
+			c = _line_cache[line] = _estimate_line(line)
+		n += c
+	return n
+
+
+def _tiktoken_factory() -> Callable[[str], int]:
+	import tiktoken
+
+	encoding = tiktoken.get_encoding("o200k_base")
+	return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+_factories: Dict[str, Callable[[], Callable[[str], int]]] = {
+	"estimate": lambda: estimate_tokens,
+	"tiktoken": _tiktoken_factory,
+}
+_active_name = DEFAULT_TOKENIZER
+_active: Callable[[str], int] = estimate_tokens
+
+
+def register_tokenizer(name: str, factory: Callable[[], Callable[[str], int]]) -> None:
+	"""Make ``name`` selectable; ``factory`` returns a ``text -> token count`` function."""
+	_factories[name] = factory
+
+
+def configure(name: Optional[str]) -> str:
+	"""Select the tokenizer used by :func:`count`; returns the name in effect.
+
+	Falls back to the estimate when the tokenizer is unknown or cannot be
+	loaded (missing package, no network for its vocabulary, ...).
+	"""
+	global _active, _active_name
+	name = name or DEFAULT_TOKENIZER
+	try:
+		counter = _factories[name]()
+	except Exception as e:
+		logger.warning("Tokenizer %r unavailable (%s); using the built-in estimate", name, e or type(e).__name__)
+		name, counter = DEFAULT_TOKENIZER, estimate_tokens
+	_active_name, _active = name, counter
+	return name
+
+
+def active_tokenizer() -> str:
+	return _active_name
+
+
+def count(text: Optional[str]) -> int:
+	return _active(text) if text else 0
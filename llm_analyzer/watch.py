@@ -0,0 +1,193 @@
+"""Follow the plugin's log directory while the game runs.
+
+The plugin appends every call to ``performance.csv`` and rewrites
+``session_<guid>.json`` after every interaction. :class:`LogWatcher` polls
+the directory and imports only what is new: the complete lines appended to
+a performance log and the interactions added to a session file. A poll
+stats a handful of files, cheap enough to repeat several times a second,
+and works the same on every platform (the standard library has no inotify).
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+from bisect import insort
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import db, importers
+
+logger = logging.getLogger(__name__)
+
+PERFORMANCE_FILES = ("performance.csv", "performance.jsonl")
+POLL_INTERVAL_S = 0.25
+
+
+@dataclass
+class WatchResult:
+	"""What one poll imported."""
+	# (llm_name, duration_ms) of every new call
+	calls: List[Tuple[str, int]] = field(default_factory=list)
+	interactions: int = 0
+	new_sessions: int = 0
+
+	def __bool__(self) -> bool:
+		return bool(self.calls or self.interactions or self.new_sessions)
+
+
+def _is_session_file(name: str) -> bool:
+	return name.startswith("session_") and name.endswith(".json")
+
+
+class LogWatcher:
+	"""Imports what was added to a log directory since the previous poll."""
+
+	def __init__(self, conn: sqlite3.Connection, directory: Path) -> None:
+		self.conn = conn
+		self.directory = Path(directory)
+		# Everything one watch imports is one batch
+		self.batch = db.ImportBatch("watch", str(self.directory))
+		self.tails: Dict[str, importers.LogTail] = {}
+		# Size and mtime of each session file as last imported
+		self.seen: Dict[str, Tuple[int, int]] = {}
+
+	def poll(self) -> WatchResult:
+		result = WatchResult()
+		try:
+			entries = [e for e in os.scandir(self.directory) if e.is_file()]
+		except FileNotFoundError:
+			# The plugin creates the directory with its first log line
+			return result
+		for entry in sorted(entries, key=lambda e: e.name):
+			if entry.name in PERFORMANCE_FILES:
+				self._poll_performance(Path(entry.path), result)
+			elif _is_session_file(entry.name):
+				self._poll_session(entry, result)
+		if not result:
+			# Nothing new: group a few of the imported responses meanwhile
+			db.backfill_step(self.conn, "clusters", db.CLUSTER_STEP_ROWS)
+		return result
+
+	def _poll_performance(self, path: Path, result: WatchResult) -> None:
+		tail = self.tails.get(path.name)
+		if tail is None:
+			tail = self.tails[path.name] = importers.open_log_tail(self.conn, path)
+		res = importers.import_performance_log_tail(self.conn, path, tail, batch=self.batch)
+		result.calls.extend(res["calls"])
+
+	def _poll_session(self, entry: os.DirEntry, result: WatchResult) -> None:
+		st = entry.stat()
+		stamp = (st.st_size, st.st_mtime_ns)
+		if self.seen.get(entry.name) == stamp:
+			return
+		try:
+			res = importers.import_session_json_file(self.conn, Path(entry.path), batch=self.batch)
+		except ValueError as e:
+			# Also raised for a file caught halfway through being rewritten;
+			# it is read again on the next poll if it changed
+			logger.debug("Skipping %s for now: %s", entry.name, e)
+			return
+		finally:
+			self.seen[entry.name] = stamp
+		result.interactions += res["inserted_interactions"]
+		result.new_sessions += res["inserted_sessions"]
+
+
+class RunningStats:
+	"""Per-LLM call duration stats that are updated call by call."""
+
+	def __init__(self) -> None:
+		# Sorted durations per LLM, for the percentiles
+		self.durations: Dict[str, List[int]] = {}
+		self.totals: Dict[str, int] = {}
+
+	@classmethod
+	def from_db(cls, conn: sqlite3.Connection) -> "RunningStats":
+		stats = cls()
+		for llm_name, values in db.fetch_durations_grouped(conn).items():
+			stats.durations[llm_name] = sorted(values)
+			stats.totals[llm_name] = sum(values)
+		return stats
+
+	def add(self, llm_name: str, duration_ms: int) -> None:
+		insort(self.durations.setdefault(llm_name, []), duration_ms)
+		self.totals[llm_name] = self.totals.get(llm_name, 0) + duration_ms
+
+	def summary(self, llm_name: str) -> Tuple[int, int, float, int, int]:
+		"""(count, min, avg, p90, max) in ms; p90 is the nearest-rank percentile."""
+		values = self.durations[llm_name]
+		n = len(values)
+		return n, values[0], self.totals[llm_name] / n, values[max(0, math.ceil(0.9 * n) - 1)], values[-1]
+
+	def llm_names(self) -> List[str]:
+		return sorted(name for name, values in self.durations.items() if values)
+
+
+class WatchThread(threading.Thread):
+	"""Runs a :class:`LogWatcher` on its own connection until stopped.
+
+	Results of polls that imported something are queued for the GUI, which
+	picks them up with :meth:`drain`.
+	"""
+
+	def __init__(self, db_path: Path, directory: Path, interval_s: float = POLL_INTERVAL_S) -> None:
+		super().__init__(name="log-watcher", daemon=True)
+		self.db_path = db_path
+		self.directory = Path(directory)
+		self.interval_s = interval_s
+		self.results: "queue.Queue[WatchResult]" = queue.Queue()
+		self._stopping = threading.Event()
+
+	def run(self) -> None:
+		conn = db.get_connection(self.db_path)
+		try:
+			watcher = LogWatcher(conn, self.directory)
+			while True:
+				try:
+					result = watcher.poll()
+				except Exception:
+					logger.exception("Watching %s failed", self.directory)
+				else:
+					if result:
+						self.results.put(result)
+				if self._stopping.wait(self.interval_s):
+					break
+		finally:
+			conn.close()
+
+	def stop(self) -> None:
+		self._stopping.set()
+
+	def drain(self) -> List[WatchResult]:
+		results: List[WatchResult] = []
+		while True:
+			try:
+				results.append(self.results.get_nowait())
+			except queue.Empty:
+				return results
+
+
+def watch(conn: sqlite3.Connection, directory: Path, interval_s: float = POLL_INTERVAL_S, stop: Optional[threading.Event] = None) -> None:
+	"""Import from ``directory`` until interrupted, logging each new batch."""
+	watcher = LogWatcher(conn, directory)
+	stats = RunningStats.from_db(conn)
+	stop = stop or threading.Event()
+	logger.info("Watching %s", directory)
+	try:
+		while not stop.is_set():
+			result = watcher.poll()
+			for llm_name, duration_ms in result.calls:
+				stats.add(llm_name, duration_ms)
+			if result.interactions or result.new_sessions:
+				logger.info("Imported %d interactions (%d new sessions)", result.interactions, result.new_sessions)
+			for llm_name in sorted({name for name, _ in result.calls}):
+				n, _, avg, p90, mx = stats.summary(llm_name)
+				logger.info("%s: %d calls, avg %.0f ms, p90 %d ms, max %d ms", llm_name, n, avg, p90, mx)
+			stop.wait(interval_s)
+	except KeyboardInterrupt:
+		pass